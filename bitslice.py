@@ -0,0 +1,204 @@
+"""
+位元切片 (bit-sliced) 篩選引擎
+把全部 C(39,5) 組合存成位元平面：每個平面是 575,757 個位元壓縮成的 uint64 陣列
+(約 72 KB)，位置組使用每個 (位置, 號碼) 一個平面，號碼組使用每個號碼一個平面。
+命中數以多個位元平面表示的二進位計數器累加 (位元切片加法器)，範圍與二次限定
+檢查、組別彙總都是整個 uint64 陣列的位元運算，工作集合可放進快取
+"""
+
+from functools import lru_cache
+from typing import List, Union
+
+import numpy as np
+from filters_function import BuildLimitTable
+from utils import AllCombinations
+
+COMBINATION_COUNT = 575757
+WORDS = -(-COMBINATION_COUNT // 64)  # 每個平面的 uint64 個數
+
+
+@lru_cache(maxsize=1)
+def BitPlanes() -> tuple:
+    """
+    建立全部組合的位元平面，結果會被快取且為唯讀
+
+    Returns:
+        (位置平面 (5, 40, WORDS)，第 [i, x] 個平面表示第 i 個位置是否為號碼 x,
+         號碼平面 (40, WORDS)，第 x 個平面表示組合是否包含號碼 x)
+    """
+    all_combinations = AllCombinations()
+    position_planes = np.zeros((5, 40, WORDS), dtype=np.uint64)
+    for i in range(5):
+        # (N, 40) 的 one-hot 沿組合方向壓縮成位元，補齊到整數個 uint64
+        one_hot = np.zeros((WORDS * 64, 40), dtype=bool)
+        one_hot[np.arange(COMBINATION_COUNT), all_combinations[:, i]] = True
+        packed = np.packbits(one_hot, axis=0, bitorder="little")
+        position_planes[i] = np.ascontiguousarray(packed.T).view(np.uint64)
+
+    # 組合內號碼不重複，各位置平面的聯集即為號碼平面
+    number_planes = np.bitwise_or.reduce(position_planes, axis=0)
+    position_planes.setflags(write=False)
+    number_planes.setflags(write=False)
+    return position_planes, number_planes
+
+
+def _Ones() -> np.ndarray:
+    """全部為 1 的平面"""
+    return np.full(WORDS, np.iinfo(np.uint64).max, dtype=np.uint64)
+
+
+def _Increment(counter: List[np.ndarray], bit: np.ndarray) -> None:
+    """
+    位元切片加法：對計數器的每個位元同時加上 bit (0 或 1)
+
+    Args:
+        counter: 由低位到高位的位元平面列表，寬度需足以容納最大值，會直接修改
+        bit: 要加上的位元平面
+    """
+    carry = bit
+    for k in range(len(counter)):
+        counter[k], carry = counter[k] ^ carry, counter[k] & carry
+
+
+def _Counter(max_value: int) -> List[np.ndarray]:
+    """可容納 0~max_value 的歸零計數器"""
+    return [np.zeros(WORDS, dtype=np.uint64) for _ in range(max(max_value, 1).bit_length())]
+
+
+def _InTable(counter: List[np.ndarray], table: np.ndarray) -> np.ndarray:
+    """
+    計數器的值是否落在查表允許的集合，等同於逐一組合計算 table[count]
+
+    Args:
+        counter: 由低位到高位的位元平面列表
+        table: 布林查表，長度為計數器可能的最大值 + 1
+
+    Returns:
+        位元平面，1 表示允許
+    """
+    # 超過最大值的計數不會出現，只需列舉 0~最大值中較少的一邊，另一邊取補數
+    allowed = [v for v in range(len(table)) if table[v]]
+    rejected = [v for v in range(len(table)) if not table[v]]
+    negate = len(rejected) < len(allowed)
+    result = np.zeros(WORDS, dtype=np.uint64)
+    for v in (rejected if negate else allowed):
+        term = _Ones()
+        for k, plane in enumerate(counter):
+            term &= plane if v >> k & 1 else ~plane
+        result |= term
+    return ~result if negate else result
+
+
+def _ActiveGroups(filters_set: list, second_limit_set: list) -> list:
+    """與 OuterLayerFilter 相同：以 zip 對齊，略過沒有內層二次限定的組別"""
+    return [
+        (filters, inner_2lim)
+        for filters, inner_2lim in zip(filters_set, second_limit_set)
+        if inner_2lim
+    ]
+
+
+def PositionalPlane(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int], None]
+) -> np.ndarray:
+    """
+    位置組階段的通過平面，結果與 OuterLayerFilter 搭配 FilterByPositions 相同
+
+    Args:
+        filters_set: 位置篩選器集合列表
+        second_limit_set: 內部位置二次限定值列表
+        second_limit: 外層二次限定值
+
+    Returns:
+        位元平面，1 表示通過
+    """
+    position_planes, _ = BitPlanes()
+    groups = _ActiveGroups(filters_set, second_limit_set)
+    outer_counter = _Counter(len(groups))
+
+    for filters, inner_2lim in groups:
+        hits = _Counter(5)
+        for i in range(5):
+            numbers = sorted({x for x in filters[i] if 1 <= x <= 39})
+            if numbers:
+                # 同一位置只會有一個號碼，允許號碼的平面取聯集即為該位置是否命中
+                _Increment(hits, np.bitwise_or.reduce(position_planes[i, numbers], axis=0))
+        _Increment(outer_counter, _InTable(hits, BuildLimitTable(inner_2lim, 5)))
+
+    return _InTable(outer_counter, BuildLimitTable(second_limit, len(groups)))
+
+
+def CriteriaPlane(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int], None]
+) -> np.ndarray:
+    """
+    號碼組階段的通過平面，結果與 OuterLayerFilter 搭配 FilterByCriteria 相同
+
+    Args:
+        filters_set: 條件篩選器集合列表
+        second_limit_set: 內部條件二次限定值列表
+        second_limit: 外層二次限定值
+
+    Returns:
+        位元平面，1 表示通過
+    """
+    _, number_planes = BitPlanes()
+    groups = _ActiveGroups(filters_set, second_limit_set)
+    outer_counter = _Counter(len(groups))
+    pool_cache = {}
+
+    for filters, inner_2lim in groups:
+        line_counter = _Counter(len(filters))
+        for (start, end), match_pool in filters:
+            pool_key = frozenset(x for x in match_pool if 1 <= x <= 39)
+            if pool_key not in pool_cache:
+                # 每個組合最多包含 5 個池內號碼，3 個位元即可
+                match_count = _Counter(5)
+                for x in sorted(pool_key):
+                    _Increment(match_count, number_planes[x])
+                pool_cache[pool_key] = match_count
+            line_pass = _InTable(pool_cache[pool_key], BuildLimitTable(list(range(start, end + 1)), 5))
+            _Increment(line_counter, line_pass)
+        _Increment(outer_counter, _InTable(line_counter, BuildLimitTable(inner_2lim, len(filters))))
+
+    return _InTable(outer_counter, BuildLimitTable(second_limit, len(groups)))
+
+
+def BitSlicedFilterMask(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int], None],
+    criteria_second_limit: Union[int, range, List[int], None],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list
+) -> np.ndarray:
+    """
+    以位元平面計算兩階段篩選的通過遮罩，結果與依序套用 OuterLayerFilter 完全相同
+
+    Args:
+        use_position_filter: 是否使用位置篩選器
+        use_criteria_filter: 是否使用條件篩選器
+        positional_second_limit: 位置篩選器二次限定值
+        criteria_second_limit: 條件篩選器二次限定值
+        inner_positional_2lim: 內部位置二次限定值列表
+        inner_criteria_2lim: 內部條件二次限定值列表
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+
+    Returns:
+        全部組合的布林遮罩陣列，True表示通過篩選的組合
+    """
+    # 兩個階段互相獨立，通過平面取交集即可
+    valid_plane = _Ones()
+    if use_position_filter:
+        valid_plane &= PositionalPlane(positional_filter_data, inner_positional_2lim, positional_second_limit)
+    if use_criteria_filter:
+        valid_plane &= CriteriaPlane(criteria_filter_data, inner_criteria_2lim, criteria_second_limit)
+
+    return np.unpackbits(valid_plane.view(np.uint8), count=COMBINATION_COUNT, bitorder="little").view(bool)
@@ -1,22 +1,36 @@
-from itertools import combinations
-from typing import List, Union
-from filters_function import FilterByPositions, FilterByCriteria, OuterLayerFilter
-from utils import CountElement, CalculatePrize
+import time
+from collections.abc import Mapping
+from functools import cached_property
+from typing import List, Optional, Union
+import numpy as np
+from filters_function import FilterByPositions, OuterLayerMask, BatchedCriteriaMask
+from number_index import IndexedFilterByCriteria
+from utils import AllCombinations, CalculatePrize, SortElementCounts
+from jit_backend import FusedFilterMask
+from bitslice import BitSlicedFilterMask
+from generation import GeneratedFilterCombinations
+from expression import FilterPlan, ParseFilterExpression
+from result_store import ConfigurationKey, ResultStore
 
+# 可用的計算方式
+BACKENDS = ("numpy", "jit", "batched", "generate", "bitslice")
 
-def CoreFunction(
+
+def FilterCombinationsArray(
     use_position_filter: bool,
     use_criteria_filter: bool,
     positional_second_limit: Union[int, range, List[int]],
     criteria_second_limit: Union[int, range, List[int]],
     inner_positional_2lim: list,
-    inner_criteria_2lim: list, 
+    inner_criteria_2lim: list,
     positional_filter_data: list,
     criteria_filter_data: list,
-    winning_numbers: list
-) -> dict:
+    backend: str = "numpy",
+    filter_expression: Optional[str] = None,
+    diagnostics: Optional[dict] = None
+) -> np.ndarray:
     """
-    樂透篩選系統核心功能
+    依序套用位置組與號碼組篩選器
     
     Args:
         use_position_filter: 是否使用位置篩選器
@@ -27,56 +41,183 @@ def CoreFunction(
         inner_criteria_2lim: 內部條件二次限定值列表
         positional_filter_data: 位置篩選器資料
         criteria_filter_data: 條件篩選器資料
-        winning_numbers: 中獎號碼列表
+        backend: 計算方式，"numpy"、"jit" (未安裝 Numba 時自動改用 NumPy)、
+            "batched" (號碼組以分段矩陣乘法一次計算所有號碼池) 或
+            "generate" (條件嚴格時直接產生符合的組合，寬鬆時改為掃描) 或
+            "bitslice" (全部組合存成位元平面，以位元切片加法器計算命中數)
+        filter_expression: 篩選式，有值時取代原本的兩階段流程，語法見 expression.py
+        diagnostics: 診斷模式，若提供字典會填入 "position" 與 "criteria" 兩階段在其輸入組合上的
+            命中數直方圖 (格式見 OuterLayerMask)；jit、generate 與 bitslice 在診斷模式下改以 batched 計算，
+            篩選式不提供
         
     Returns:
-        包含篩選結果的字典
+        依字典序排列的 (N, 5) 通過組合陣列
+        
+    Raises:
+        ValueError: 當計算方式不支援或篩選式格式錯誤時
     """
-    # 產生所有 C(39,5) 組合
-    combinations_all = list(combinations(range(1, 40), 5))
-    filtered = combinations_all
+    if filter_expression and filter_expression.strip():
+        root = ParseFilterExpression(
+            text=filter_expression,
+            positional_filter_data=positional_filter_data,
+            criteria_filter_data=criteria_filter_data,
+            inner_positional_2lim=inner_positional_2lim,
+            inner_criteria_2lim=inner_criteria_2lim
+        )
+        valid_mask = FilterPlan(root).evaluate()
+        return AllCombinations()[valid_mask]
 
-    # 依序應用兩種篩選器邏輯
+    if backend == "jit" and diagnostics is None:
+        valid_mask = FusedFilterMask(
+            use_position_filter=use_position_filter,
+            use_criteria_filter=use_criteria_filter,
+            positional_second_limit=positional_second_limit,
+            criteria_second_limit=criteria_second_limit,
+            inner_positional_2lim=inner_positional_2lim,
+            inner_criteria_2lim=inner_criteria_2lim,
+            positional_filter_data=positional_filter_data,
+            criteria_filter_data=criteria_filter_data
+        )
+        return AllCombinations()[valid_mask]
+    if backend == "bitslice" and diagnostics is None:
+        valid_mask = BitSlicedFilterMask(
+            use_position_filter=use_position_filter,
+            use_criteria_filter=use_criteria_filter,
+            positional_second_limit=positional_second_limit,
+            criteria_second_limit=criteria_second_limit,
+            inner_positional_2lim=inner_positional_2lim,
+            inner_criteria_2lim=inner_criteria_2lim,
+            positional_filter_data=positional_filter_data,
+            criteria_filter_data=criteria_filter_data
+        )
+        return AllCombinations()[valid_mask]
+    if backend == "generate" and diagnostics is None:
+        return GeneratedFilterCombinations(
+            use_position_filter=use_position_filter,
+            use_criteria_filter=use_criteria_filter,
+            positional_second_limit=positional_second_limit,
+            criteria_second_limit=criteria_second_limit,
+            inner_positional_2lim=inner_positional_2lim,
+            inner_criteria_2lim=inner_criteria_2lim,
+            positional_filter_data=positional_filter_data,
+            criteria_filter_data=criteria_filter_data
+        )
+    if backend not in BACKENDS:
+        raise ValueError(f"不支援的計算方式: {backend}")
+
+    # 依序應用兩種篩選器邏輯；融合迴圈、直接產生與位元切片都不保留全部命中數，
+    # 診斷模式下改用結果相同的 batched
+    filtered = AllCombinations()
     if use_position_filter:
-        filtered = OuterLayerFilter(
+        filtered = filtered[OuterLayerMask(
             filters_set=positional_filter_data,
             second_limit_set=inner_positional_2lim,
             second_limit=positional_second_limit,
             input_combinations=filtered,
-            InnerLayerFilter=FilterByPositions
-        )
-    
-    if use_criteria_filter:
-        filtered = OuterLayerFilter(
+            InnerLayerFilter=FilterByPositions,
+            diagnostics=_StageDiagnostics(diagnostics, "position")
+        )]
+    if use_criteria_filter and backend == "numpy":
+        filtered = filtered[OuterLayerMask(
             filters_set=criteria_filter_data,
             second_limit_set=inner_criteria_2lim,
             second_limit=criteria_second_limit,
             input_combinations=filtered,
-            InnerLayerFilter=FilterByCriteria
-        )
+            InnerLayerFilter=IndexedFilterByCriteria,
+            diagnostics=_StageDiagnostics(diagnostics, "criteria")
+        )]
+    elif use_criteria_filter:
+        filtered = filtered[BatchedCriteriaMask(
+            filters_set=criteria_filter_data,
+            second_limit_set=inner_criteria_2lim,
+            second_limit=criteria_second_limit,
+            input_combinations=filtered,
+            diagnostics=_StageDiagnostics(diagnostics, "criteria")
+        )]
+    return filtered
 
-    # 統計篩選結果
-    result_crit = {
-        "valid_combinations": filtered, 
-        "valid_count": len(filtered), 
-        "filtered_count": 575757 - len(filtered)
-    }
 
-    # 統計元素出現次數
-    element_counts = CountElement(filtered)
+def FilterCombinations(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int]],
+    criteria_second_limit: Union[int, range, List[int]],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    backend: str = "numpy",
+    filter_expression: Optional[str] = None,
+    diagnostics: Optional[dict] = None
+) -> list:
+    """
+    依序套用位置組與號碼組篩選器 (列表版本)，參數見 FilterCombinationsArray
+        
+    Returns:
+        通過篩選的組合列表
+    """
+    return FilterCombinationsArray(
+        use_position_filter=use_position_filter,
+        use_criteria_filter=use_criteria_filter,
+        positional_second_limit=positional_second_limit,
+        criteria_second_limit=criteria_second_limit,
+        inner_positional_2lim=inner_positional_2lim,
+        inner_criteria_2lim=inner_criteria_2lim,
+        positional_filter_data=positional_filter_data,
+        criteria_filter_data=criteria_filter_data,
+        backend=backend,
+        filter_expression=filter_expression,
+        diagnostics=diagnostics
+    ).tolist()
+
+
+def _StageDiagnostics(diagnostics: Optional[dict], stage: str) -> Optional[dict]:
+    """取得單一階段的診斷字典，未啟用診斷模式時為None"""
+    return None if diagnostics is None else diagnostics.setdefault(stage, {})
 
-    # 計算獎金（比對中獎號碼）
-    prize_info = None
-    if winning_numbers:
-        prize_info = CalculatePrize(
-            winning_number=winning_numbers,
-            my_number=filtered
-        )
 
-    # 準備主要視窗輸出內容
+def FormatDiagnostics(diagnostics: dict) -> str:
+    """
+    準備命中數直方圖輸出內容
+    
+    Args:
+        diagnostics: FilterCombinations 填入的診斷字典
+        
+    Returns:
+        每階段的外層命中分布與各組命中分布文字
+    """
+    output_lines = []
+    for stage, stage_name in (("position", "位置組"), ("criteria", "號碼組")):
+        if stage not in diagnostics:
+            continue
+        outer = diagnostics[stage]["outer"]
+        output_lines.append(f"{stage_name}外層命中組數分布 (輸入 {int(outer.sum())} 組合):")
+        output_lines.append("  " + "  ".join(f"{h}: {int(count)}" for h, count in enumerate(outer)))
+        for g, histogram in enumerate(diagnostics[stage]["groups"]):
+            if histogram is None:
+                continue
+            output_lines.append(
+                f"  第 {g + 1} 組命中數分布: " + "  ".join(f"{h}: {int(count)}" for h, count in enumerate(histogram))
+            )
+        output_lines.append("")
+
+    return "\n".join(output_lines).rstrip()
+
+
+def FormatMainOutput(valid_count: int, prize_info: Optional[dict]) -> str:
+    """
+    準備主要視窗輸出內容
+    
+    Args:
+        valid_count: 通過組合數
+        prize_info: CalculatePrize 的結果，沒有中獎號碼時為None
+        
+    Returns:
+        主要視窗輸出文字
+    """
     main_window_output_lines = [
-        f"通過組合數: {result_crit['valid_count']}",
-        f"被篩掉組合數: {result_crit['filtered_count']}"
+        f"通過組合數: {valid_count}",
+        f"被篩掉組合數: {575757 - valid_count}"
     ]
     
     if prize_info:
@@ -86,22 +227,202 @@ def CoreFunction(
             f"{k}: {v}" for k, v in prize_info['detail_number'].items()
         ])
 
-    # 準備通過號碼輸出內容
-    valid_combinations_output_lines = [
-        ", ".join(str(num) for num in combination) 
-        for combination in result_crit['valid_combinations']
-    ]
-    
-    # 準備熱門號碼輸出內容
-    hot_numbers_output_lines = [
-        f"號碼 {k:<4}-> {v:>3} 次" 
-        for k, v in element_counts.items()
-    ]
+    return "\n".join(main_window_output_lines)
 
-    return {
-        "main window output lines": "\n".join(main_window_output_lines), 
-        "valid combinations output lines": "\n".join(valid_combinations_output_lines), 
-        "hot numbers output lines": "\n".join(hot_numbers_output_lines)
+
+class FilterResult(Mapping):
+    """
+    CoreFunction 的篩選結果
+
+    以陣列保存通過組合與號碼出現次數，輸出文字只在第一次讀取時產生並快取；
+    同時可當作原本的結果字典使用 (鍵值見 LEGACY_KEYS)，讀取哪個鍵才產生哪段文字
+    """
+
+    # 原本結果字典的鍵值與對應的屬性
+    LEGACY_KEYS = {
+        "main window output lines": "main_output",
+        "valid combinations output lines": "valid_combinations_text",
+        "hot numbers output lines": "hot_numbers_text",
+        "valid combinations": "valid_combinations_list",
+        "diagnostics output lines": "diagnostics_text",
     }
 
-    
\ No newline at end of file
+    def __init__(
+        self,
+        valid_combinations: np.ndarray,
+        prize_info: Optional[dict] = None,
+        timings: Optional[dict] = None,
+        diagnostics: Optional[dict] = None
+    ):
+        """
+        Args:
+            valid_combinations: 形狀為 (N, 5) 的通過組合陣列
+            prize_info: CalculatePrize 的結果，沒有中獎號碼時為None
+            timings: 各步驟耗時 (秒)
+            diagnostics: FilterCombinationsArray 填入的診斷字典，未啟用時為None
+        """
+        self.valid_combinations = np.asarray(valid_combinations, dtype=np.uint8).reshape(-1, 5).view()
+        self.valid_combinations.setflags(write=False)
+        self.number_counts = np.bincount(self.valid_combinations.ravel(), minlength=40)
+        self.prize_info = prize_info
+        self.timings = dict(timings or {})
+        self.diagnostics = diagnostics
+
+    @property
+    def valid_count(self) -> int:
+        """通過組合數"""
+        return int(self.valid_combinations.shape[0])
+
+    @property
+    def filtered_count(self) -> int:
+        """被篩掉組合數"""
+        return 575757 - self.valid_count
+
+    @cached_property
+    def hot_numbers(self) -> dict:
+        """號碼出現次數，格式同 CountElement"""
+        return SortElementCounts(self.number_counts) if self.valid_count else {}
+
+    @cached_property
+    def main_output(self) -> str:
+        """主要視窗輸出文字"""
+        return FormatMainOutput(self.valid_count, self.prize_info)
+
+    @cached_property
+    def valid_combinations_text(self) -> str:
+        """通過號碼輸出文字，每行一個組合"""
+        return "\n".join(
+            ", ".join(str(num) for num in combination)
+            for combination in self.valid_combinations.tolist()
+        )
+
+    @cached_property
+    def hot_numbers_text(self) -> str:
+        """熱門號碼輸出文字"""
+        return "\n".join(f"號碼 {k:<4}-> {v:>3} 次" for k, v in self.hot_numbers.items())
+
+    @cached_property
+    def diagnostics_text(self) -> str:
+        """命中數直方圖輸出文字，未啟用診斷模式時為空字串"""
+        return FormatDiagnostics(self.diagnostics) if self.diagnostics is not None else ""
+
+    @cached_property
+    def valid_combinations_list(self) -> list:
+        """通過組合列表 (相容原本結果字典)"""
+        return self.valid_combinations.tolist()
+
+    def __getitem__(self, key: str):
+        if key not in self.LEGACY_KEYS:
+            raise KeyError(key)
+        return getattr(self, self.LEGACY_KEYS[key])
+
+    def __iter__(self):
+        return iter(self.LEGACY_KEYS)
+
+    def __len__(self) -> int:
+        return len(self.LEGACY_KEYS)
+
+
+def CoreFunction(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int]],
+    criteria_second_limit: Union[int, range, List[int]],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list, 
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    winning_numbers: list,
+    backend: str = "numpy",
+    filter_expression: Optional[str] = None,
+    result_store: Optional[ResultStore] = None,
+    diagnostics: bool = False
+) -> FilterResult:
+    """
+    樂透篩選系統核心功能
+    
+    Args:
+        use_position_filter: 是否使用位置篩選器
+        use_criteria_filter: 是否使用條件篩選器
+        positional_second_limit: 位置篩選器二次限定值
+        criteria_second_limit: 條件篩選器二次限定值
+        inner_positional_2lim: 內部位置二次限定值列表
+        inner_criteria_2lim: 內部條件二次限定值列表
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+        winning_numbers: 中獎號碼列表
+        backend: 計算方式，見 FilterCombinations
+        filter_expression: 篩選式，見 FilterCombinations
+        result_store: 結果快取，相同設定再次執行時直接讀取
+        diagnostics: 是否輸出各組與兩階段的命中數直方圖 (會略過快取讀取)
+        
+    Returns:
+        FilterResult，可當作原本的結果字典使用
+    """
+    settings = dict(
+        use_position_filter=use_position_filter,
+        use_criteria_filter=use_criteria_filter,
+        positional_second_limit=positional_second_limit,
+        criteria_second_limit=criteria_second_limit,
+        inner_positional_2lim=inner_positional_2lim,
+        inner_criteria_2lim=inner_criteria_2lim,
+        positional_filter_data=positional_filter_data,
+        criteria_filter_data=criteria_filter_data,
+        filter_expression=filter_expression
+    )
+    stored = None
+    stage_histograms = {} if diagnostics else None
+    timings = {}
+    if result_store is not None:
+        store_key = ConfigurationKey(**settings)
+        if not diagnostics:
+            started = time.perf_counter()
+            stored = result_store.get(store_key)
+            timings["store"] = time.perf_counter() - started
+
+    if stored is not None:
+        result = FilterResult(stored["valid combinations"], timings=timings)
+        if winning_numbers:
+            started = time.perf_counter()
+            result.prize_info = result_store.prize(stored, winning_numbers)
+            if result.prize_info is None:
+                result.prize_info = CalculatePrize(
+                    winning_number=winning_numbers,
+                    my_number=result.valid_combinations
+                )
+                try:
+                    result_store.put_prize(store_key, winning_numbers, result.prize_info)
+                except OSError:
+                    # 快取只是加速，寫入失敗不影響結果
+                    pass
+            result.timings["prize"] = time.perf_counter() - started
+        return result
+
+    started = time.perf_counter()
+    filtered = FilterCombinationsArray(**settings, backend=backend, diagnostics=stage_histograms)
+    timings["filter"] = time.perf_counter() - started
+
+    # 統計元素出現次數 (建構時以 bincount 計算)
+    started = time.perf_counter()
+    result = FilterResult(filtered, timings=timings, diagnostics=stage_histograms)
+    result.timings["count"] = time.perf_counter() - started
+
+    # 計算獎金（比對中獎號碼）
+    if winning_numbers:
+        started = time.perf_counter()
+        result.prize_info = CalculatePrize(
+            winning_number=winning_numbers,
+            my_number=result.valid_combinations
+        )
+        result.timings["prize"] = time.perf_counter() - started
+
+    if result_store is not None:
+        started = time.perf_counter()
+        try:
+            result_store.put(store_key, result.valid_combinations, winning_numbers, result.prize_info)
+        except OSError:
+            # 快取只是加速 (磁碟已滿、權限或同時寫入等)，寫入失敗時仍回傳剛計算的結果
+            pass
+        result.timings["store"] = time.perf_counter() - started
+
+    return result
@@ -0,0 +1,200 @@
+"""
+子集合涵蓋分析
+以 t 號子集合的字典序排名為索引，用位元圖記錄涵蓋狀態；涵蓋分析使用布林陣列以便整批查表，
+選號則使用壓縮成 uint64 的位元集合，每次只讀寫候選組合所在的幾個字組
+"""
+
+import heapq
+import numpy as np
+from itertools import combinations
+from math import comb
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils import AllCombinations, CombinationRank
+
+
+# 選號目標：各子集合大小與權重
+# "prize" 以對應獎項金額乘上該子集合被開出的機率 (已乘上 C(39,5) 化為整數) 作為權重
+SELECTION_OBJECTIVES = {
+    "pair": {2: 1},
+    "triple": {3: 1},
+    "prize": {
+        2: 50 * comb(37, 3),
+        3: 300 * comb(36, 2),
+        4: 200000 * comb(35, 1),
+    },
+}
+
+
+def SubsetRanks(passed_combinations: np.ndarray, t: int) -> np.ndarray:
+    """
+    計算每個組合所有 t 號子集合的排名
+
+    Args:
+        passed_combinations: 形狀為 (N, 5) 的組合陣列
+        t: 子集合大小
+
+    Returns:
+        形狀為 (N, C(5, t)) 的排名陣列
+    """
+    passed_combinations = np.asarray(passed_combinations).reshape(-1, 5)
+    columns = list(combinations(range(5), t))
+    subsets = passed_combinations[:, columns]  # (N, C(5, t), t)
+    return CombinationRank(subsets)
+
+
+def AllSubsets(t: int) -> np.ndarray:
+    """
+    產生 1~39 所有 t 號子集合，列索引即為排名
+
+    Args:
+        t: 子集合大小
+
+    Returns:
+        形狀為 (C(39, t), t) 的陣列
+    """
+    if t == 5:
+        return AllCombinations()
+    return np.array(list(combinations(range(1, 40), t)), dtype=np.uint8).reshape(-1, t)
+
+
+def CoveredSubsets(passed_combinations: np.ndarray, t: int) -> np.ndarray:
+    """
+    標記被任一通過組合涵蓋的 t 號子集合
+
+    Args:
+        passed_combinations: 通過篩選的組合
+        t: 子集合大小
+
+    Returns:
+        長度為 C(39, t) 的布林位元圖，True 表示該子集合被涵蓋
+    """
+    covered = np.zeros(comb(39, t), dtype=bool)
+    if len(passed_combinations):
+        covered[SubsetRanks(passed_combinations, t).ravel()] = True
+    return covered
+
+
+def _PackedRanks(ranks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把子集合排名轉成壓縮位元集合中的 (字組索引, 位元遮罩)
+
+    Args:
+        ranks: 子集合排名陣列
+
+    Returns:
+        (字組索引陣列, uint64 位元遮罩陣列)，形狀皆與 ranks 相同
+    """
+    ranks = np.asarray(ranks, dtype=np.int64)
+    return (ranks >> 6).astype(np.intp), np.left_shift(np.uint64(1), (ranks & 63).astype(np.uint64))
+
+
+def CoverageReport(
+    passed_combinations: np.ndarray,
+    t_values: Iterable[int] = range(2, 6),
+    list_uncovered: Iterable[int] = ()
+) -> Dict[int, dict]:
+    """
+    計算通過組合對 t 號子集合的涵蓋率
+
+    若 t 號子集合全部被涵蓋，則開出任何號碼時都保證至少一注中 t 碼
+
+    Args:
+        passed_combinations: 通過篩選的組合
+        t_values: 要分析的子集合大小
+        list_uncovered: 需要列出未涵蓋子集合的 t 值
+
+    Returns:
+        {t: {"covered": 已涵蓋數, "total": 子集合總數, "ratio": 涵蓋率,
+             "draw_ratio": 開獎號碼中至少一注中 t 碼以上的比例,
+             "uncovered": 未涵蓋子集合陣列或None}}
+    """
+    passed_combinations = np.asarray(passed_combinations).reshape(-1, 5)
+    list_uncovered = set(list_uncovered)
+    all_draws = AllCombinations()
+
+    report = {}
+    for t in t_values:
+        covered = CoveredSubsets(passed_combinations, t)
+        covered_count = int(np.count_nonzero(covered))
+
+        # 每一種開獎號碼只要有任一 t 號子集合被涵蓋，就至少有一注中 t 碼
+        draw_hit = covered[SubsetRanks(all_draws, t)].any(axis=1)
+
+        uncovered: Optional[np.ndarray] = None
+        if t in list_uncovered:
+            uncovered = AllSubsets(t)[~covered]
+
+        report[t] = {
+            "covered": covered_count,
+            "total": covered.size,
+            "ratio": covered_count / covered.size,
+            "draw_ratio": float(np.count_nonzero(draw_hit)) / all_draws.shape[0],
+            "uncovered": uncovered,
+        }
+    return report
+
+
+def SelectTickets(
+    passed_combinations: np.ndarray,
+    ticket_count: int,
+    objective: str = "pair",
+    seed: int = 0
+) -> Tuple[np.ndarray, Dict[int, Tuple[int, int]]]:
+    """
+    以貪婪集合涵蓋從通過組合中挑選 K 注，使被涵蓋的 t 號子集合最多
+
+    採用 lazy greedy：堆積中保存各組合的增益上限，只有取出時才重新計算，
+    因為涵蓋函數是次模函數，增益只會遞減，重新計算後仍不小於堆頂即可直接選入
+
+    Args:
+        passed_combinations: 通過篩選的組合
+        ticket_count: 要挑選的注數 K
+        objective: 選號目標 ("pair"、"triple" 或 "prize")
+        seed: 亂數種子，決定同分時的挑選順序
+
+    Returns:
+        (挑選出的組合陣列, {t: (已涵蓋子集合數, 子集合總數)})
+
+    Raises:
+        ValueError: 當選號目標不支援時
+    """
+    if objective not in SELECTION_OBJECTIVES:
+        raise ValueError(f"不支援的選號目標: {objective}")
+
+    passed_combinations = np.asarray(passed_combinations).reshape(-1, 5)
+    weights = SELECTION_OBJECTIVES[objective]
+    covered = {t: np.zeros(-(-comb(39, t) // 64), dtype=np.uint64) for t in weights}
+    # 每個子集合大小: (權重, 子集合數, 涵蓋位元集合, 字組索引, 位元遮罩)
+    terms = [
+        (weight, comb(5, t), covered[t], *_PackedRanks(SubsetRanks(passed_combinations, t)))
+        for t, weight in weights.items()
+    ]
+
+    def gain(i: int) -> int:
+        # 同一組合的子集合排名不重複，增益為所在字組中對應位元尚未設定的個數
+        return sum(
+            weight * (subset_count - int(np.count_nonzero(bitset[words[i]] & bits[i])))
+            for weight, subset_count, bitset, words, bits in terms
+        )
+
+    # 初始增益皆相同，同分時依亂數排列決定順序
+    tie_order = np.random.default_rng(seed).permutation(passed_combinations.shape[0])
+    initial_gain = sum(weight * comb(5, t) for t, weight in weights.items())
+    heap = [(-initial_gain, order, i) for order, i in enumerate(tie_order.tolist())]
+    heapq.heapify(heap)
+
+    selected: List[int] = []
+    while heap and len(selected) < ticket_count:
+        _, order, i = heapq.heappop(heap)
+        current_gain = gain(i)
+        if heap and current_gain < -heap[0][0]:
+            heapq.heappush(heap, (-current_gain, order, i))
+            continue
+
+        selected.append(i)
+        for _, _, bitset, words, bits in terms:
+            # 不同子集合可能落在同一字組，需以 bitwise_or.at 累加
+            np.bitwise_or.at(bitset, words[i], bits[i])
+
+    coverage_info = {t: (int(np.bitwise_count(covered[t]).sum()), comb(39, t)) for t in weights}
+    return passed_combinations[selected], coverage_info
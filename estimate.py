@@ -0,0 +1,274 @@
+"""
+以抽樣快速估算篩選結果
+每個組合預先分配一個均勻亂數鍵值，樣本為鍵值小於門檻 q 的組合；逐步提高門檻即可
+擴大樣本而不重複計算。依第一個號碼分層 (35 層) 做分層估計，回傳通過組合數、
+各號碼出現次數與各獎項中獎注數的估計值及 95% 信賴區間；全部組合都抽到時即為精確值
+"""
+
+from functools import lru_cache
+from math import comb
+from typing import Iterator, List, Optional, Union
+
+import numpy as np
+from filters_function import FilterByPositions, OuterLayerMask, BatchedCriteriaMask
+from expression import FilterPlan, ParseFilterExpression
+from utils import AllCombinations
+
+_Z = 1.96  # 95% 信賴區間
+_STRATA = 35  # 第一個號碼為 1~35
+_STRATUM_SIZES = np.array([comb(39 - x, 4) for x in range(1, _STRATA + 1)], dtype=np.float64)
+_PRIZE_TIERS = ((5, "壹等獎", 8000000), (4, "貳等獎", 200000), (3, "參等獎", 300), (2, "肆等獎", 50))
+# 累計項目：通過數、號碼 0~39 出現次數、四個獎項中獎注數、總獎金
+_PASS, _NUMBERS, _TIERS, _PRIZE = 0, slice(1, 41), slice(41, 45), 45
+_QUANTITIES = 46
+
+
+@lru_cache(maxsize=4)
+def SampleKeys(seed: int) -> np.ndarray:
+    """每個組合的抽樣鍵值，同一種子共用"""
+    keys = np.random.default_rng(seed).random(AllCombinations().shape[0])
+    keys.setflags(write=False)
+    return keys
+
+
+class ProgressiveEstimator:
+    """逐步擴大樣本的估算器，每次 refine 只計算新加入的組合"""
+
+    def __init__(
+        self,
+        use_position_filter: bool,
+        use_criteria_filter: bool,
+        positional_second_limit: Union[int, range, List[int], None],
+        criteria_second_limit: Union[int, range, List[int], None],
+        inner_positional_2lim: list,
+        inner_criteria_2lim: list,
+        positional_filter_data: list,
+        criteria_filter_data: list,
+        winning_numbers: Optional[list] = None,
+        filter_expression: Optional[str] = None,
+        seed: int = 0
+    ):
+        """
+        Args:
+            參數同 CoreFunction (篩選式與中獎號碼可省略)
+            seed: 抽樣亂數種子
+        """
+        self.use_position_filter = use_position_filter
+        self.use_criteria_filter = use_criteria_filter
+        self.positional_second_limit = positional_second_limit
+        self.criteria_second_limit = criteria_second_limit
+        self.inner_positional_2lim = inner_positional_2lim
+        self.inner_criteria_2lim = inner_criteria_2lim
+        self.positional_filter_data = positional_filter_data
+        self.criteria_filter_data = criteria_filter_data
+        self.winning_numbers = list(winning_numbers or [])
+        self.expression_root = None
+        if filter_expression and filter_expression.strip():
+            self.expression_root = ParseFilterExpression(
+                text=filter_expression,
+                positional_filter_data=positional_filter_data,
+                criteria_filter_data=criteria_filter_data,
+                inner_positional_2lim=inner_positional_2lim,
+                inner_criteria_2lim=inner_criteria_2lim
+            )
+
+        self.keys = SampleKeys(seed)
+        self.threshold = 0.0
+        self.sample_counts = np.zeros(_STRATA, dtype=np.float64)
+        self.sums = np.zeros((_STRATA, _QUANTITIES), dtype=np.float64)
+        self.square_sums = np.zeros((_STRATA, _QUANTITIES), dtype=np.float64)
+
+    @property
+    def sample_size(self) -> int:
+        """目前樣本數"""
+        return int(self.sample_counts.sum())
+
+    @property
+    def exact(self) -> bool:
+        """是否已抽到全部組合"""
+        return self.threshold >= 1.0
+
+    def _pass_mask(self, combinations_array: np.ndarray) -> np.ndarray:
+        """對樣本組合套用與 CoreFunction 相同的篩選"""
+        if self.expression_root is not None:
+            return FilterPlan(self.expression_root, input_combinations=combinations_array).evaluate()
+
+        valid_mask = np.ones(combinations_array.shape[0], dtype=bool)
+        if self.use_position_filter:
+            valid_mask &= OuterLayerMask(
+                filters_set=self.positional_filter_data,
+                second_limit_set=self.inner_positional_2lim,
+                second_limit=self.positional_second_limit,
+                input_combinations=combinations_array,
+                InnerLayerFilter=FilterByPositions
+            )
+        if self.use_criteria_filter:
+            valid_mask &= BatchedCriteriaMask(
+                filters_set=self.criteria_filter_data,
+                second_limit_set=self.inner_criteria_2lim,
+                second_limit=self.criteria_second_limit,
+                input_combinations=combinations_array
+            )
+        return valid_mask
+
+    def refine(self, target_size: int) -> dict:
+        """
+        把樣本擴大到約 target_size 個組合並回傳最新估計
+
+        Args:
+            target_size: 目標樣本數，大於等於全部組合數時計算精確值
+
+        Returns:
+            見 estimate
+        """
+        # 鍵值小於 1，門檻為 1 時包含全部組合
+        new_threshold = min(1.0, target_size / AllCombinations().shape[0])
+        if new_threshold > self.threshold:
+            index = np.flatnonzero((self.keys >= self.threshold) & (self.keys < new_threshold))
+            self.threshold = new_threshold
+            self._accumulate(AllCombinations()[index])
+        return self.estimate()
+
+    def _accumulate(self, sample: np.ndarray) -> None:
+        """累計新樣本在各層的總和與平方和"""
+        strata = sample[:, 0].astype(np.intp) - 1
+        self.sample_counts += np.bincount(strata, minlength=_STRATA)
+
+        valid_mask = self._pass_mask(sample)
+        passed = sample[valid_mask]
+        passed_strata = strata[valid_mask]
+
+        values = np.zeros((_STRATA, _QUANTITIES), dtype=np.float64)
+        values[:, _PASS] = np.bincount(passed_strata, minlength=_STRATA)
+        values[:, _NUMBERS] = np.bincount(
+            (passed_strata[:, None] * 40 + passed).ravel(), minlength=_STRATA * 40
+        ).reshape(_STRATA, 40)
+
+        prize_squares = np.zeros(_STRATA, dtype=np.float64)
+        if self.winning_numbers:
+            match_count = np.isin(passed, self.winning_numbers).sum(axis=1)
+            prize_table = np.zeros(6, dtype=np.float64)
+            for tier, (matches, _, prize) in enumerate(_PRIZE_TIERS):
+                values[:, _TIERS.start + tier] = np.bincount(
+                    passed_strata[match_count == matches], minlength=_STRATA
+                )
+                prize_table[matches] = prize
+            prizes = prize_table[match_count]
+            values[:, _PRIZE] = np.bincount(passed_strata, weights=prizes, minlength=_STRATA)
+            prize_squares = np.bincount(passed_strata, weights=prizes ** 2, minlength=_STRATA)
+
+        # 除總獎金外都是 0/1 指標，平方和等於總和
+        self.sums += values
+        self.square_sums += values
+        self.square_sums[:, _PRIZE] += prize_squares - values[:, _PRIZE]
+
+    def estimate(self) -> dict:
+        """
+        以目前樣本計算分層估計
+
+        Returns:
+            {
+                "sample_size": 樣本數, "exact": 是否為精確值,
+                "pass_count": (估計值, 下限, 上限),
+                "hot_numbers": {號碼: (估計次數, 下限, 上限)} 依估計次數排序,
+                "prize": {獎項: (估計注數, 下限, 上限)},
+                "total_prize": (估計總獎金, 下限, 上限)  (沒有中獎號碼時為None)
+            }
+        """
+        n = self.sample_counts
+        sampled = n > 0
+        mean = np.zeros_like(self.sums)
+        mean[sampled] = self.sums[sampled] / n[sampled, None]
+        estimate = (_STRATUM_SIZES[:, None] * mean).sum(axis=0)
+
+        # 分層抽樣變異數 sum(N_s^2 (1 - n_s / N_s) s_s^2 / n_s)，樣本不足 2 的層不計
+        usable = n > 1
+        variance_terms = np.zeros_like(self.sums)
+        sample_variance = (
+            self.square_sums[usable] - n[usable, None] * mean[usable] ** 2
+        ) / (n[usable, None] - 1)
+        correction = (1 - n[usable] / _STRATUM_SIZES[usable]) / n[usable]
+        variance_terms[usable] = (
+            _STRATUM_SIZES[usable, None] ** 2 * correction[:, None] * np.maximum(sample_variance, 0)
+        )
+        margin = _Z * np.sqrt(variance_terms.sum(axis=0))
+
+        total = _STRATUM_SIZES.sum()
+        sample_size = n.sum()
+        low = np.maximum(estimate - margin, 0)
+        high = estimate + margin
+        # 樣本中完全沒出現時以 rule of three 給出上限
+        unseen = (self.sums.sum(axis=0) == 0) & (sample_size < total)
+        if sample_size:
+            high[unseen] = np.maximum(high[unseen], 3 * total / sample_size * (1 - sample_size / total))
+        high[:_PRIZE] = np.minimum(high[:_PRIZE], total)
+        if unseen[_PRIZE]:
+            # 總獎金不是 0/1 指標，改以各獎項注數上限乘上獎金
+            high[_PRIZE] = sum(high[_TIERS.start + tier] * prize for tier, (_, _, prize) in enumerate(_PRIZE_TIERS))
+
+        def Interval(q: int) -> tuple:
+            return (float(estimate[q]), float(low[q]), float(high[q]))
+
+        number_order = np.argsort(-estimate[_NUMBERS][1:], kind="stable") + 1
+        return {
+            "sample_size": int(sample_size),
+            "exact": self.exact,
+            "pass_count": Interval(_PASS),
+            "hot_numbers": {
+                int(number): Interval(_NUMBERS.start + number)
+                for number in number_order
+                if estimate[_NUMBERS.start + number] > 0
+            },
+            "prize": {
+                name: Interval(_TIERS.start + tier)
+                for tier, (_, name, _) in enumerate(_PRIZE_TIERS)
+            } if self.winning_numbers else {},
+            "total_prize": Interval(_PRIZE) if self.winning_numbers else None,
+        }
+
+    def progressive(self, initial_size: int = 4096, growth: int = 2) -> Iterator[dict]:
+        """
+        逐步加倍樣本並產生估計，直到精確為止；呼叫端停止迭代即可取消
+
+        Args:
+            initial_size: 第一次估計的樣本數
+            growth: 每次樣本數的倍率
+
+        Yields:
+            見 estimate
+        """
+        target_size = initial_size
+        while True:
+            result = self.refine(target_size)
+            yield result
+            if result["exact"]:
+                return
+            target_size *= growth
+
+
+def FormatEstimate(result: dict) -> str:
+    """
+    準備估算輸出內容
+
+    Args:
+        result: ProgressiveEstimator.estimate 的結果
+
+    Returns:
+        估算結果文字
+    """
+    def Interval(values: tuple) -> str:
+        value, low, high = values
+        if result["exact"]:
+            return f"{value:,.0f}"
+        return f"約 {value:,.0f} (95% 區間 {low:,.0f} ~ {high:,.0f})"
+
+    title = "精確值" if result["exact"] else f"估算 (樣本 {result['sample_size']:,} 組合)"
+    output_lines = [title, f"通過組合數: {Interval(result['pass_count'])}"]
+    if result["total_prize"] is not None:
+        output_lines.append(f"總獎金: {Interval(result['total_prize'])}")
+        output_lines.extend(f"{name}: {Interval(values)}" for name, values in result["prize"].items())
+    output_lines.append("\n熱門號碼出現次數:")
+    output_lines.extend(
+        f"號碼 {number:<4}-> {Interval(values)}" for number, values in result["hot_numbers"].items()
+    )
+    return "\n".join(output_lines)
@@ -0,0 +1,135 @@
+"""
+通過組合匯出
+以分段方式把組合轉為位元組矩陣 (每個號碼兩位數字加分隔符號) 後直接寫入緩衝檔案，
+支援 CSV、TSV、固定寬度的投注單格式、排序、跨次匯出去除重複與 gzip 壓縮
+"""
+
+import gzip
+import os
+from typing import Optional
+
+import numpy as np
+from utils import AllCombinations, CombinationRank
+
+EXPORT_FORMATS = ("csv", "tsv", "ticket")
+SORT_ORDERS = (None, "lex", "sum")
+DEFAULT_SEEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".exported_ranks.npy")
+
+# 各格式的分隔符號、是否補零到固定寬度、標題列
+_FORMATS = {
+    "csv": (b",", False, b"n1,n2,n3,n4,n5\n"),
+    "tsv": (b"\t", False, b"n1\tn2\tn3\tn4\tn5\n"),
+    "ticket": (b" ", True, b""),
+}
+
+
+def FormatRows(block: np.ndarray, export_format: str = "csv") -> bytes:
+    """
+    把一段組合轉為文字位元組
+
+    每列先排成固定寬度 (號碼兩位數、分隔符號、換行)，非固定寬度格式再去掉
+    個位數號碼的十位數 0
+
+    Args:
+        block: 形狀為 (B, 5) 的組合陣列
+        export_format: "csv"、"tsv" 或 "ticket" (兩位數補零、空白分隔)
+
+    Returns:
+        該段的文字位元組
+    """
+    separator, fixed_width, _ = _FORMATS[export_format]
+    block = np.asarray(block, dtype=np.uint8).reshape(-1, 5)
+
+    # 每列 15 個位元組：5 個號碼 x 2 位數 + 4 個分隔符號 + 換行
+    line = np.empty((block.shape[0], 15), dtype=np.uint8)
+    line[:, 0:15:3] = block // 10 + ord("0")
+    line[:, 1:15:3] = block % 10 + ord("0")
+    line[:, 2:14:3] = ord(separator)
+    line[:, 14] = ord("\n")
+
+    if fixed_width:
+        return line.tobytes()
+    keep = np.ones(line.shape, dtype=bool)
+    keep[:, 0:15:3] = block >= 10
+    return line[keep].tobytes()
+
+
+def _ReadSeen(seen_path: str) -> np.ndarray:
+    """讀取已匯出組合的位元圖，不存在時全部視為未匯出"""
+    total = AllCombinations().shape[0]
+    if os.path.exists(seen_path):
+        return np.unpackbits(np.load(seen_path), count=total).astype(bool)
+    return np.zeros(total, dtype=bool)
+
+
+def ExportCombinations(
+    passed_combinations,
+    path: str,
+    export_format: str = "csv",
+    sort: Optional[str] = None,
+    seen_path: Optional[str] = None,
+    compress: Optional[bool] = None,
+    header: bool = True,
+    chunk_rows: int = 65536
+) -> int:
+    """
+    分段串流匯出通過組合
+
+    Args:
+        passed_combinations: 通過篩選的組合列表或陣列
+        path: 輸出檔案路徑
+        export_format: "csv"、"tsv" 或 "ticket"
+        sort: 排序方式，None (維持原順序)、"lex" (字典序) 或 "sum" (號碼和，同和依字典序)
+        seen_path: 已匯出組合的位元圖檔案，提供時略過先前匯出過的組合並在完成後更新
+        compress: 是否以 gzip 壓縮，None 表示依副檔名 .gz 判斷
+        header: CSV 與 TSV 是否輸出標題列
+        chunk_rows: 每段處理的列數
+
+    Returns:
+        實際寫出的組合數
+
+    Raises:
+        ValueError: 當格式或排序方式不支援時
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支援的匯出格式: {export_format}")
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"不支援的排序方式: {sort}")
+
+    passed = np.asarray(passed_combinations, dtype=np.uint8).reshape(-1, 5)
+    ranks = CombinationRank(passed) if sort == "lex" or seen_path else None
+
+    if seen_path:
+        seen = _ReadSeen(seen_path)
+        fresh = ~seen[ranks]
+        passed, ranks = passed[fresh], ranks[fresh]
+        seen[ranks] = True  # 同時去除本次輸入中的重複組合
+        _, first = np.unique(ranks, return_index=True)
+        if first.size != ranks.size:
+            first.sort()
+            passed, ranks = passed[first], ranks[first]
+
+    if sort == "lex":
+        passed = passed[np.argsort(ranks, kind="stable")]
+    elif sort == "sum":
+        # lexsort 以最後一個鍵為主：先比號碼和，再依第 1~5 個號碼
+        passed = passed[np.lexsort((*passed.T[::-1], passed.sum(axis=1, dtype=np.int64)))]
+
+    if compress is None:
+        compress = path.endswith(".gz")
+    with open(path, "wb", buffering=1024 * 1024) as raw:
+        output = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) if compress else raw
+        try:
+            if header:
+                output.write(_FORMATS[export_format][2])
+            for first_row in range(0, passed.shape[0], chunk_rows):
+                output.write(FormatRows(passed[first_row:first_row + chunk_rows], export_format))
+        finally:
+            if compress:
+                output.close()
+
+    if seen_path:
+        # 以檔案物件寫入，避免 np.save 自動補上 .npy 副檔名
+        with open(seen_path, "wb") as f:
+            np.save(f, np.packbits(seen))
+    return int(passed.shape[0])
@@ -0,0 +1,484 @@
+"""
+篩選式語言與最佳化執行計畫
+
+語法 (空白會被忽略)：
+    運算式   := 或式
+    或式     := 且式 ('|' 且式)*
+    且式     := 單元 ('&' 單元)*
+    單元     := '!' 單元 | '(' 運算式 ')' | 階段
+    階段     := ('P' | 'C') ['[' 組別 (',' 組別)* ']'] ':' 二次限定
+    組別     := 編號 ['-' 編號] ['*' 權重]
+
+P 為位置組、C 為號碼組，組別編號從 1 開始，省略中括號表示全部組別；各組使用目前
+設定的內層二次限定，外層二次限定格式與介面相同 (例如 3、1-5、1,3、a)。
+例如 "(P:3 | C[1-5]:a) & !C[6*2,7]:2-3"
+"""
+
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Union
+from utils import AllCombinations, ParseTextToList
+
+
+class FilterNode(ABC):
+    """篩選式節點基底類別"""
+
+    @abstractmethod
+    def key(self) -> tuple:
+        """結構鍵值，相同鍵值的節點結果必定相同；只由字串、整數、None 與 tuple 組成，repr 在不同執行間一致"""
+
+
+class StageNode(FilterNode):
+    """外層篩選節點，語意與 OuterLayerFilter 相同，另支援各組權重"""
+
+    def __init__(self, kind: str, groups: List[Tuple[list, list, int]],
+                 second_limit: Union[int, range, List[int], None]):
+        """
+        Args:
+            kind: "position" 或 "criteria"
+            groups: (篩選器資料, 內層二次限定, 權重) 列表，內層二次限定為空的組別會被略過
+            second_limit: 外層二次限定值，比對對象為各組通過與否乘上權重的總和
+        """
+        self.kind = kind
+        self.groups = [(filters, inner_2lim, weight) for filters, inner_2lim, weight in groups if inner_2lim]
+        self.second_limit = second_limit
+
+    def key(self) -> tuple:
+        second_limit = self.second_limit
+        if second_limit is not None and not isinstance(second_limit, int):
+            second_limit = tuple(second_limit)
+        return (
+            "stage", self.kind,
+            tuple((_GroupKey(self.kind, filters), tuple(inner_2lim), weight)
+                  for filters, inner_2lim, weight in self.groups),
+            second_limit,
+        )
+
+
+class NotNode(FilterNode):
+    """否定節點"""
+
+    def __init__(self, child: FilterNode):
+        self.child = child
+
+    def key(self) -> tuple:
+        return ("not", self.child.key())
+
+
+class AndNode(FilterNode):
+    """且節點"""
+
+    def __init__(self, children: List[FilterNode]):
+        self.children = children
+
+    def key(self) -> tuple:
+        # 子節點順序不影響結果，以 repr 排序 (鍵值內容固定，repr 可作為排序依據)
+        return ("and", tuple(sorted((child.key() for child in self.children), key=repr)))
+
+
+class OrNode(FilterNode):
+    """或節點"""
+
+    def __init__(self, children: List[FilterNode]):
+        self.children = children
+
+    def key(self) -> tuple:
+        # 子節點順序不影響結果，以 repr 排序 (鍵值內容固定，repr 可作為排序依據)
+        return ("or", tuple(sorted((child.key() for child in self.children), key=repr)))
+
+
+def _PoolKey(numbers: list) -> tuple:
+    """號碼池鍵值，忽略順序與重複 (排序後的 tuple，不用 frozenset 以免 repr 順序隨執行改變)"""
+    return tuple(sorted({int(x) for x in numbers}))
+
+
+def _NumberTable(numbers: tuple) -> np.ndarray:
+    """號碼池轉為長度40的查表"""
+    table = np.zeros(40, dtype=bool)
+    table[[x for x in numbers if 0 <= x < 40]] = True
+    return table
+
+
+def _GroupKey(kind: str, filters: list) -> tuple:
+    """篩選器組別鍵值"""
+    if kind == "position":
+        return ("position", tuple(_PoolKey(filters[i]) for i in range(5)))
+    return ("criteria", tuple((tuple(match_range), _PoolKey(match_pool)) for match_range, match_pool in filters))
+
+
+def PipelineExpression(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int], None],
+    criteria_second_limit: Union[int, range, List[int], None],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list
+) -> FilterNode:
+    """
+    建立與 CoreFunction 原本兩階段流程相同的篩選式
+
+    Args:
+        use_position_filter: 是否使用位置篩選器
+        use_criteria_filter: 是否使用條件篩選器
+        positional_second_limit: 位置篩選器二次限定值
+        criteria_second_limit: 條件篩選器二次限定值
+        inner_positional_2lim: 內部位置二次限定值列表
+        inner_criteria_2lim: 內部條件二次限定值列表
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+
+    Returns:
+        篩選式根節點
+    """
+    children = []
+    if use_position_filter:
+        children.append(StageNode(
+            "position",
+            [(filters, inner_2lim, 1) for filters, inner_2lim in zip(positional_filter_data, inner_positional_2lim)],
+            positional_second_limit
+        ))
+    if use_criteria_filter:
+        children.append(StageNode(
+            "criteria",
+            [(filters, inner_2lim, 1) for filters, inner_2lim in zip(criteria_filter_data, inner_criteria_2lim)],
+            criteria_second_limit
+        ))
+    return AndNode(children)
+
+
+class _ExpressionParser:
+    """篩選式遞迴下降解析器"""
+
+    def __init__(self, text: str, stages: Dict[str, Tuple[str, list, list]]):
+        self.text = "".join(text.split())
+        self.pos = 0
+        self.stages = stages
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"篩選式格式錯誤 (第 {self.pos + 1} 個字元): {message}")
+
+    def peek(self) -> str:
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise self.error(f"預期 '{char}'")
+        self.pos += 1
+
+    def parse(self) -> FilterNode:
+        if not self.text:
+            raise self.error("篩選式為空")
+        node = self.parse_or()
+        if self.pos != len(self.text):
+            raise self.error(f"無法解析 '{self.text[self.pos:]}'")
+        return node
+
+    def parse_or(self) -> FilterNode:
+        children = [self.parse_and()]
+        while self.peek() == "|":
+            self.pos += 1
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else OrNode(children)
+
+    def parse_and(self) -> FilterNode:
+        children = [self.parse_unary()]
+        while self.peek() == "&":
+            self.pos += 1
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else AndNode(children)
+
+    def parse_unary(self) -> FilterNode:
+        char = self.peek()
+        if char == "!":
+            self.pos += 1
+            return NotNode(self.parse_unary())
+        if char == "(":
+            self.pos += 1
+            node = self.parse_or()
+            self.expect(")")
+            return node
+        if char.upper() in self.stages:
+            self.pos += 1
+            return self.parse_stage(char.upper())
+        raise self.error("預期 '!'、'(' 、'P' 或 'C'")
+
+    def parse_int(self) -> int:
+        start = self.pos
+        while self.peek().isdigit():
+            self.pos += 1
+        if start == self.pos:
+            raise self.error("預期整數")
+        return int(self.text[start:self.pos])
+
+    def parse_stage(self, letter: str) -> StageNode:
+        kind, filters_set, second_limit_set = self.stages[letter]
+        group_count = len(filters_set)
+
+        selected: List[Tuple[int, int]] = []
+        if self.peek() == "[":
+            self.pos += 1
+            while True:
+                first = last = self.parse_int()
+                if self.peek() == "-":
+                    self.pos += 1
+                    last = self.parse_int()
+                weight = 1
+                if self.peek() == "*":
+                    self.pos += 1
+                    weight = self.parse_int()
+                if not 1 <= first <= last <= group_count:
+                    raise self.error(f"組別 {first}-{last} 超出範圍 1-{group_count}")
+                selected.extend((index, weight) for index in range(first - 1, last))
+                if self.peek() != ",":
+                    break
+                self.pos += 1
+            self.expect("]")
+        else:
+            selected = [(index, 1) for index in range(group_count)]
+
+        self.expect(":")
+        start = self.pos
+        while self.peek() and self.peek() not in "&|)":
+            self.pos += 1
+        limit_text = self.text[start:self.pos]
+
+        # 與介面相同：'a' 代表選取組別中有篩選器內容的權重總和
+        filled = [None] * sum(weight for index, weight in selected if filters_set[index])
+        try:
+            second_limit = ParseTextToList(limit_text, filled)
+        except ValueError as e:
+            raise self.error(str(e))
+        if second_limit is None:
+            raise self.error("缺少外層二次限定值")
+
+        groups = [
+            (filters_set[index],
+             second_limit_set[index] if index < len(second_limit_set) else None,
+             weight)
+            for index, weight in selected
+        ]
+        return StageNode(kind, groups, second_limit)
+
+
+def ParseFilterExpression(
+    text: str,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list
+) -> FilterNode:
+    """
+    解析篩選式文字
+
+    Args:
+        text: 篩選式文字
+        positional_filter_data: 已解析的位置篩選器資料
+        criteria_filter_data: 已解析的條件篩選器資料
+        inner_positional_2lim: 已解析的內部位置二次限定值列表
+        inner_criteria_2lim: 已解析的內部條件二次限定值列表
+
+    Returns:
+        篩選式根節點
+
+    Raises:
+        ValueError: 當篩選式格式錯誤時
+    """
+    stages = {
+        "P": ("position", positional_filter_data, inner_positional_2lim),
+        "C": ("criteria", criteria_filter_data, inner_criteria_2lim),
+    }
+    return _ExpressionParser(text, stages).parse()
+
+
+class _Memo:
+    """以全部組合為長度、只計算尚未得知部分的快取陣列"""
+
+    def __init__(self, size: int, dtype):
+        self.values = np.zeros(size, dtype=dtype)
+        self.known = np.zeros(size, dtype=bool)
+
+    def get(self, rows: np.ndarray, compute) -> np.ndarray:
+        if rows.size == self.values.size:
+            # rows 為全部組合，直接整段讀寫避免花式索引
+            if not self.known.all():
+                missing = np.flatnonzero(~self.known)
+                self.values[missing] = compute(missing)
+                self.known[:] = True
+            return self.values
+
+        missing = rows[~self.known[rows]]
+        if missing.size:
+            self.values[missing] = compute(missing)
+            self.known[missing] = True
+        return self.values[rows]
+
+
+class FilterPlan:
+    """
+    篩選式執行計畫
+
+    - 相同的號碼池、篩選器組別與子運算式只建立一份快取，跨節點共用
+    - 且/或節點先以固定樣本估計每個子節點的通過率，再依成本與選擇性排序，
+      後面的子節點只計算前面尚未決定的組合
+    """
+
+    SAMPLE_SIZE = 4096
+
+    def __init__(self, root: FilterNode, input_combinations: Optional[np.ndarray] = None, seed: int = 0):
+        """
+        Args:
+            root: 篩選式根節點
+            input_combinations: 輸入的組合陣列，預設為全部 C(39,5) 組合
+            seed: 估計通過率的抽樣種子
+        """
+        if input_combinations is None:
+            input_combinations = AllCombinations()
+        self.combinations = np.asarray(input_combinations).reshape(-1, 5)
+        self.size = self.combinations.shape[0]
+
+        self._pool_memos: Dict[tuple, _Memo] = {}
+        self._group_memos: Dict[tuple, _Memo] = {}
+        self._node_memos: Dict[tuple, _Memo] = {}
+        self._nodes: Dict[tuple, FilterNode] = {}
+        self._costs: Dict[tuple, int] = {}
+        self._pass_rates: Dict[tuple, float] = {}
+
+        self.root = self._intern(root)
+        rng = np.random.default_rng(seed)
+        sample_size = min(self.SAMPLE_SIZE, self.size)
+        self._sample = np.sort(rng.choice(self.size, size=sample_size, replace=False))
+
+    def _intern(self, node: FilterNode) -> FilterNode:
+        """合併結構相同的節點"""
+        key = node.key()
+        if key in self._nodes:
+            return self._nodes[key]
+        if isinstance(node, NotNode):
+            node = NotNode(self._intern(node.child))
+        elif isinstance(node, (AndNode, OrNode)):
+            node = type(node)([self._intern(child) for child in node.children])
+        self._nodes[key] = node
+        return node
+
+    @property
+    def stats(self) -> dict:
+        """計畫統計：不重複節點、組別與號碼池數量"""
+        return {
+            "nodes": len(self._nodes),
+            "groups": len(self._group_memos),
+            "pools": len(self._pool_memos),
+        }
+
+    def evaluate(self) -> np.ndarray:
+        """
+        執行篩選式
+
+        Returns:
+            布林遮罩陣列，True表示通過篩選的組合
+        """
+        return self._evaluate(self.root, np.arange(self.size))
+
+    def _cost(self, node: FilterNode) -> int:
+        """估計節點成本：需要掃描的號碼池數量"""
+        key = node.key()
+        if key not in self._costs:
+            if isinstance(node, StageNode):
+                cost = sum(5 if node.kind == "position" else len(filters) for filters, _, _ in node.groups)
+            elif isinstance(node, NotNode):
+                cost = self._cost(node.child)
+            else:
+                cost = sum(self._cost(child) for child in node.children)
+            self._costs[key] = max(cost, 1)
+        return self._costs[key]
+
+    def _pass_rate(self, node: FilterNode) -> float:
+        """以樣本估計節點通過率，樣本結果同時寫入快取"""
+        key = node.key()
+        if key not in self._pass_rates:
+            self._pass_rates[key] = float(self._evaluate(node, self._sample).mean()) if self._sample.size else 0.5
+        return self._pass_rates[key]
+
+    def _ordered(self, children: List[FilterNode], want_pass: bool) -> List[FilterNode]:
+        """
+        且節點依 成本 / 淘汰率 排序，或節點依 成本 / 通過率 排序，
+        讓便宜且能提早決定結果的子節點先執行
+        """
+        def rank(child: FilterNode) -> float:
+            rate = self._pass_rate(child)
+            decisive = rate if want_pass else 1.0 - rate
+            return self._cost(child) / max(decisive, 1e-6)
+        return sorted(children, key=rank)
+
+    def _evaluate(self, node: FilterNode, rows: np.ndarray) -> np.ndarray:
+        key = node.key()
+        if key not in self._node_memos:
+            self._node_memos[key] = _Memo(self.size, bool)
+        return self._node_memos[key].get(rows, lambda missing: self._compute(node, missing))
+
+    def _compute(self, node: FilterNode, rows: np.ndarray) -> np.ndarray:
+        if isinstance(node, StageNode):
+            return self._compute_stage(node, rows)
+
+        if isinstance(node, NotNode):
+            return ~self._evaluate(node.child, rows)
+
+        is_and = isinstance(node, AndNode)
+        result = np.full(rows.size, is_and, dtype=bool)
+        # undecided 為尚未確定結果的列位置
+        undecided = np.arange(rows.size)
+        for child in self._ordered(node.children, want_pass=not is_and):
+            if undecided.size == 0:
+                break
+            child_mask = self._evaluate(child, rows[undecided])
+            if is_and:
+                result[undecided[~child_mask]] = False
+                undecided = undecided[child_mask]
+            else:
+                result[undecided[child_mask]] = True
+                undecided = undecided[~child_mask]
+        return result
+
+    def _compute_stage(self, node: StageNode, rows: np.ndarray) -> np.ndarray:
+        hits = np.zeros(rows.size, dtype=np.int64)
+        for filters, inner_2lim, weight in node.groups:
+            group_hits = self._group_hits(node.kind, filters, rows)
+            hits += weight * np.isin(group_hits, inner_2lim)
+        return np.isin(hits, node.second_limit)
+
+    def _group_hits(self, kind: str, filters: list, rows: np.ndarray) -> np.ndarray:
+        key = _GroupKey(kind, filters)
+        if key not in self._group_memos:
+            self._group_memos[key] = _Memo(self.size, np.int32)
+
+        def compute(missing: np.ndarray) -> np.ndarray:
+            hits = np.zeros(missing.size, dtype=np.int32)
+            if kind == "position":
+                for i in range(5):
+                    hits += self._position_mask(i, filters[i], missing)
+            else:
+                for (start, end), match_pool in filters:
+                    match_count = self._pool_count(match_pool, missing)
+                    hits += (match_count >= start) & (match_count <= end)
+            return hits
+
+        return self._group_memos[key].get(rows, compute)
+
+    def _position_mask(self, i: int, numbers: list, rows: np.ndarray) -> np.ndarray:
+        key = ("position", i, _PoolKey(numbers))
+        if key not in self._pool_memos:
+            self._pool_memos[key] = _Memo(self.size, bool)
+        table = _NumberTable(key[2])
+        return self._pool_memos[key].get(
+            rows, lambda missing: table[self.combinations[missing, i]]
+        )
+
+    def _pool_count(self, numbers: list, rows: np.ndarray) -> np.ndarray:
+        key = ("criteria", _PoolKey(numbers))
+        if key not in self._pool_memos:
+            self._pool_memos[key] = _Memo(self.size, np.uint8)
+        table = _NumberTable(key[1]).astype(np.uint8)
+        return self._pool_memos[key].get(
+            rows, lambda missing: table[self.combinations[missing]].sum(axis=1, dtype=np.uint8)
+        )
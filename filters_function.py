@@ -1,22 +1,34 @@
-from typing import List, Union, Callable
+from typing import List, Union, Callable, Optional
 import numpy as np
 
 
-def FilterByPositions(
-    filters: list,
-    second_limit: Union[int, range, List[int]],
-    input_combinations: np.ndarray
+def BuildLimitTable(
+    second_limit: Optional[Union[int, range, List[int]]],
+    max_hits: int
 ) -> np.ndarray:
     """
-    位置組合過濾
+    建立二次限定查表陣列，table[h] 等同於 np.isin(h, second_limit)
+    
+    Args:
+        second_limit: 二次限定值，可以是整數、範圍、列表或None
+        max_hits: 命中數可能的最大值
+        
+    Returns:
+        長度為 max_hits + 1 的布林陣列
+    """
+    return np.isin(np.arange(max_hits + 1), second_limit)
+
+
+def PositionHits(filters: list, input_combinations: np.ndarray) -> np.ndarray:
+    """
+    計算位置組命中數
     
     Args:
         filters: 位置篩選器資料，每個位置包含允許的號碼列表
-        second_limit: 二次限定值，可以是整數、範圍或列表
         input_combinations: 輸入的組合陣列
         
     Returns:
-        布林遮罩陣列，True表示通過篩選的組合
+        每個組合命中的位置數 (0~5)
     """
     input_combinations = np.atleast_2d(input_combinations)
     hits = np.zeros(input_combinations.shape[0], dtype=int)
@@ -27,26 +39,20 @@ def FilterByPositions(
         # 檢查每個組合該位置的數是否存在於filter中，並回傳T或F陣列
         mask = np.isin(column_values, filters[i])
         hits += mask.astype(int)
-    
-    valid_mask = np.isin(hits, second_limit)
-    return valid_mask
 
+    return hits
 
-def FilterByCriteria(
-    filters: list,
-    second_limit: Union[int, range, List[int]],
-    input_combinations: np.ndarray
-) -> np.ndarray:
+
+def CriteriaHits(filters: list, input_combinations: np.ndarray) -> np.ndarray:
     """
-    號碼組合過濾
+    計算號碼組命中數
     
     Args:
         filters: 條件篩選器資料，包含(範圍, 號碼池)的元組列表
-        second_limit: 二次限定值，可以是整數、範圍或列表
         input_combinations: 輸入的組合陣列
         
     Returns:
-        布林遮罩陣列，True表示通過篩選的組合
+        每個組合符合的條件行數
     """
     input_combinations = np.atleast_2d(input_combinations)
     hits = np.zeros(input_combinations.shape[0], dtype=int)
@@ -62,48 +68,240 @@ def FilterByCriteria(
         # 看是否符合match_range
         pass_mask = np.isin(match_count, match_range)
         hits += pass_mask.astype(int)
+
+    return hits
+
+
+def FilterByPositions(
+    filters: list,
+    second_limit: Union[int, range, List[int]],
+    input_combinations: np.ndarray,
+    hit_counts: Optional[list] = None
+) -> np.ndarray:
+    """
+    位置組合過濾
     
+    Args:
+        filters: 位置篩選器資料，每個位置包含允許的號碼列表
+        second_limit: 二次限定值，可以是整數、範圍或列表
+        input_combinations: 輸入的組合陣列
+        hit_counts: 若提供列表，會附加本組命中數 (0~5) 的直方圖
+        
+    Returns:
+        布林遮罩陣列，True表示通過篩選的組合
+    """
+    hits = PositionHits(filters, input_combinations)
+    if hit_counts is not None:
+        hit_counts.append(np.bincount(hits, minlength=6))
     valid_mask = np.isin(hits, second_limit)
     return valid_mask
 
 
-def OuterLayerFilter(
+def FilterByCriteria(
+    filters: list,
+    second_limit: Union[int, range, List[int]],
+    input_combinations: np.ndarray,
+    hit_counts: Optional[list] = None
+) -> np.ndarray:
+    """
+    號碼組合過濾
+    
+    Args:
+        filters: 條件篩選器資料，包含(範圍, 號碼池)的元組列表
+        second_limit: 二次限定值，可以是整數、範圍或列表
+        input_combinations: 輸入的組合陣列
+        hit_counts: 若提供列表，會附加本組命中數 (0~條件行數) 的直方圖
+        
+    Returns:
+        布林遮罩陣列，True表示通過篩選的組合
+    """
+    hits = CriteriaHits(filters, input_combinations)
+    if hit_counts is not None:
+        hit_counts.append(np.bincount(hits, minlength=len(filters) + 1))
+    valid_mask = np.isin(hits, second_limit)
+    return valid_mask
+
+
+def OuterLayerMask(
     filters_set: list,
     second_limit_set: list,
     second_limit: Union[int, range, List[int]],
-    input_combinations: list,
-    InnerLayerFilter: Callable
-) -> list:
+    input_combinations: np.ndarray,
+    InnerLayerFilter: Callable,
+    diagnostics: Optional[dict] = None
+) -> np.ndarray:
     """
-    外層篩選過濾
+    外層篩選遮罩
     
     Args:
         filters_set: 篩選器集合列表
         second_limit_set: 二次限定值集合列表
         second_limit: 外層二次限定值
-        input_combinations: 輸入的組合列表
+        input_combinations: 輸入的組合陣列
         InnerLayerFilter: 內層篩選函數
+        diagnostics: 診斷模式，若提供字典會填入 "groups" (各組命中數直方圖，略過的組別為None)
+            與 "outer" (外層命中數直方圖)
         
     Returns:
-        通過篩選的組合列表
+        布林遮罩陣列，True表示通過篩選的組合
     """
-    input_combinations = np.array(input_combinations)
+    input_combinations = np.asarray(input_combinations)
     hits = np.zeros(input_combinations.shape[0], dtype=int)
+    group_histograms = [None] * len(filters_set)
+    active_count = 0
     
-    for filters, inner_2lim in zip(filters_set, second_limit_set):
+    for g, (filters, inner_2lim) in enumerate(zip(filters_set, second_limit_set)):
         if not inner_2lim:
             continue
             
+        hit_counts = [] if diagnostics is not None else None
+        extra = {"hit_counts": hit_counts} if hit_counts is not None else {}
         mask = InnerLayerFilter(
             filters=filters,
             second_limit=inner_2lim,
-            input_combinations=input_combinations
+            input_combinations=input_combinations,
+            **extra
         )
         hits += mask.astype(int)  # 把T或F陣列轉01
+        active_count += 1
+        if hit_counts:
+            group_histograms[g] = hit_counts[0]
+
+    if diagnostics is not None:
+        diagnostics["groups"] = group_histograms
+        diagnostics["outer"] = np.bincount(hits, minlength=active_count + 1)
     
-    valid_mask = np.isin(hits, second_limit)
+    return np.isin(hits, second_limit)
+
+
+def OuterLayerFilter(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int]],
+    input_combinations: list,
+    InnerLayerFilter: Callable,
+    diagnostics: Optional[dict] = None
+) -> list:
+    """
+    外層篩選過濾
+    
+    Args:
+        filters_set: 篩選器集合列表
+        second_limit_set: 二次限定值集合列表
+        second_limit: 外層二次限定值
+        input_combinations: 輸入的組合列表
+        InnerLayerFilter: 內層篩選函數
+        diagnostics: 診斷模式，見 OuterLayerMask
+        
+    Returns:
+        通過篩選的組合列表
+    """
+    input_combinations = np.array(input_combinations)
+    valid_mask = OuterLayerMask(
+        filters_set=filters_set,
+        second_limit_set=second_limit_set,
+        second_limit=second_limit,
+        input_combinations=input_combinations,
+        InnerLayerFilter=InnerLayerFilter,
+        diagnostics=diagnostics
+    )
     passed_combinations = input_combinations[valid_mask]
     
     return passed_combinations.tolist()
 
 
+def BatchedCriteriaMask(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int]],
+    input_combinations: np.ndarray,
+    block_bytes: int = 32 * 1024 * 1024,
+    diagnostics: Optional[dict] = None
+) -> np.ndarray:
+    """
+    號碼組外層篩選遮罩 (矩陣乘法批次版)，結果與 OuterLayerMask 搭配 FilterByCriteria 相同
+    
+    把每一列組合轉為 39 個號碼的 one-hot 列向量，所有組別的號碼池 (去除重複) 疊成
+    39 x P 的指示矩陣，一次 float32 矩陣乘法即可得到所有號碼池的命中數；
+    分段處理以限制記憶體用量
+    
+    Args:
+        filters_set: 條件篩選器集合列表
+        second_limit_set: 內部條件二次限定值列表
+        second_limit: 外層二次限定值
+        input_combinations: 輸入的組合陣列
+        block_bytes: 每段命中數矩陣的記憶體上限 (位元組)
+        diagnostics: 診斷模式，見 OuterLayerMask
+        
+    Returns:
+        布林遮罩陣列，True表示通過篩選的組合
+    """
+    input_combinations = np.asarray(input_combinations).reshape(-1, 5)
+    row_count = input_combinations.shape[0]
+    group_ids = [
+        g for g, (_, inner_2lim) in enumerate(zip(filters_set, second_limit_set))
+        if inner_2lim
+    ]
+    groups = [(filters_set[g], second_limit_set[g]) for g in group_ids]
+
+    # 去除重複號碼池，每條條件行對應到一個號碼池欄位
+    pool_columns = {}
+    line_pools, line_starts, line_ends, line_groups = [], [], [], []
+    for g, (filters, _) in enumerate(groups):
+        for (start, end), match_pool in filters:
+            pool_key = frozenset(x for x in match_pool if 1 <= x <= 39)
+            line_pools.append(pool_columns.setdefault(pool_key, len(pool_columns)))
+            line_starts.append(start)
+            line_ends.append(end)
+            line_groups.append(g)
+
+    pool_matrix = np.zeros((40, len(pool_columns)), dtype=np.float32)
+    for pool_key, column in pool_columns.items():
+        pool_matrix[list(pool_key), column] = 1
+    group_matrix = np.zeros((len(line_pools), len(groups)), dtype=np.float32)
+    group_matrix[np.arange(len(line_pools)), line_groups] = 1
+
+    line_pools = np.array(line_pools, dtype=np.intp)
+    line_starts = np.array(line_starts)
+    line_ends = np.array(line_ends)
+    max_lines = max((len(filters) for filters, _ in groups), default=0)
+    inner_tables = np.array(
+        [BuildLimitTable(inner_2lim, max_lines) for _, inner_2lim in groups], dtype=bool
+    ).reshape(len(groups), max_lines + 1)
+    outer_table = BuildLimitTable(second_limit, len(groups))
+
+    block_rows = max(1024, block_bytes // (4 * max(len(pool_columns), len(line_pools), 1)))
+    valid_mask = np.empty(row_count, dtype=bool)
+    group_index = np.arange(len(groups))
+    group_histograms = np.zeros(len(groups) * (max_lines + 1), dtype=np.int64)
+    outer_histogram = np.zeros(len(groups) + 1, dtype=np.int64)
+
+    for first in range(0, row_count, block_rows):
+        block = input_combinations[first:first + block_rows]
+        one_hot = np.zeros((block.shape[0], 40), dtype=np.float32)
+        np.put_along_axis(one_hot, block.astype(np.intp), 1, axis=1)
+
+        # 所有號碼池的命中數：(B, 40) @ (40, P)
+        match_count = (one_hot @ pool_matrix)[:, line_pools]
+        line_pass = (match_count >= line_starts) & (match_count <= line_ends)
+        # 各組通過的條件行數：(B, L) @ (L, G)
+        group_hits = (line_pass.astype(np.float32) @ group_matrix).astype(np.intp)
+        outer_hits = inner_tables[group_index, group_hits].sum(axis=1)
+        valid_mask[first:first + block_rows] = outer_table[outer_hits]
+
+        if diagnostics is not None:
+            # 各組命中數攤平成 組別 * (最大行數 + 1) + 命中數 後一次統計
+            group_histograms += np.bincount(
+                (group_hits + group_index * (max_lines + 1)).ravel(),
+                minlength=group_histograms.size
+            )
+            outer_histogram += np.bincount(outer_hits, minlength=outer_histogram.size)
+
+    if diagnostics is not None:
+        group_histograms = group_histograms.reshape(len(groups), max_lines + 1)
+        diagnostics["groups"] = [None] * len(filters_set)
+        for row, g in enumerate(group_ids):
+            diagnostics["groups"][g] = group_histograms[row, :len(filters_set[g]) + 1]
+        diagnostics["outer"] = outer_histogram
+
+    return valid_mask
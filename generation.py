@@ -0,0 +1,214 @@
+"""
+依限制條件直接產生組合
+外層二次限定要求所有組別都通過時，每一組都是必要條件：位置組的命中數、以及
+必須全部成立的號碼組各條件行的命中數，都可以寫成「各位置號碼查表的累計值需落在
+某個集合」。依號碼遞增逐位擴展部分組合 (以陣列一次處理整層)，累計值超過上限或
+剩餘位置不足以達到下限時即剪枝，因此嚴格的設定只需與輸出量成正比的時間；
+條件寬鬆、候選數過多時改回掃描全部組合
+"""
+
+from typing import List, Optional, Union
+
+import numpy as np
+from filters_function import BuildLimitTable, FilterByPositions, OuterLayerMask, BatchedCriteriaMask
+from utils import AllCombinations
+
+
+def _NumberTable(numbers: list) -> np.ndarray:
+    """號碼列表轉為長度40的查表"""
+    table = np.zeros(40, dtype=np.uint8)
+    table[[x for x in numbers if 1 <= x <= 39]] = 1
+    return table
+
+
+def _RequiredGroups(filters_set: list, second_limit_set: list, second_limit) -> Optional[list]:
+    """
+    外層限定只允許「全部組別通過」時回傳各組 (篩選器, 內層限定)，否則為None
+    (與 OuterLayerFilter 相同以 zip 對齊，略過沒有內層限定的組別)
+    """
+    groups = [
+        (filters, inner_2lim)
+        for filters, inner_2lim in zip(filters_set, second_limit_set)
+        if inner_2lim
+    ]
+    outer_table = BuildLimitTable(second_limit, len(groups))
+    if not groups or not outer_table[-1] or outer_table[:-1].any():
+        return None
+    return groups
+
+
+def PositionalConstraints(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int], None]
+) -> Optional[list]:
+    """
+    位置組階段的限制條件
+
+    Returns:
+        [(查表 (5, 40), 允許的命中數查表 (6,))]，外層限定不是「全部通過」時為None
+    """
+    groups = _RequiredGroups(filters_set, second_limit_set, second_limit)
+    if groups is None:
+        return None
+    return [
+        (np.array([_NumberTable(filters[i]) for i in range(5)]), BuildLimitTable(inner_2lim, 5))
+        for filters, inner_2lim in groups
+    ]
+
+
+def CriteriaConstraints(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int], None]
+) -> tuple:
+    """
+    號碼組階段的限制條件，只有內層限定要求全部條件行成立的組別可以轉換
+
+    Returns:
+        (條件列表，格式同 PositionalConstraints, 是否所有組別都已轉換)；
+        外層限定不是「全部通過」時為 ([], False)
+    """
+    groups = _RequiredGroups(filters_set, second_limit_set, second_limit)
+    if groups is None:
+        return [], False
+
+    constraints = []
+    complete = True
+    for filters, inner_2lim in groups:
+        inner_table = BuildLimitTable(inner_2lim, len(filters))
+        if not inner_table[-1] or inner_table[:-1].any():
+            complete = False
+            continue
+        for (start, end), match_pool in filters:
+            pool_table = _NumberTable(match_pool)
+            constraints.append((
+                np.broadcast_to(pool_table, (5, 40)),
+                BuildLimitTable(list(range(start, end + 1)), 5)
+            ))
+    return constraints, complete
+
+
+def GenerateCombinations(
+    constraints: list,
+    max_rows: int = 100_000,
+    chunk_rows: int = 8192
+) -> Optional[np.ndarray]:
+    """
+    逐位擴展並剪枝，產生滿足所有限制條件的組合
+
+    Args:
+        constraints: [(查表 (5, 40), 允許的累計值查表 (6,))]
+        max_rows: 任一層部分組合數超過此值時視為條件寬鬆並放棄
+        chunk_rows: 每次擴展的部分組合數，用來限制記憶體
+
+    Returns:
+        依字典序排列的 (N, 5) 組合陣列，放棄時為None
+    """
+    tables = np.array([table for table, _ in constraints], dtype=np.int8).reshape(-1, 5, 40)
+    allowed = np.array([allowed for _, allowed in constraints], dtype=bool).reshape(-1, 6)
+    # 允許值不存在時下限大於上限，所有部分組合都會被剪掉
+    lows = np.array([np.flatnonzero(row).min() if row.any() else 6 for row in allowed], dtype=np.int8)
+    highs = np.array([np.flatnonzero(row).max() if row.any() else -1 for row in allowed], dtype=np.int8)
+
+    prefixes = np.zeros((1, 0), dtype=np.uint8)
+    counts = np.zeros((1, len(constraints)), dtype=np.int8)
+    for k in range(5):
+        remaining = 4 - k
+        level_prefixes, level_counts = [], []
+        for first in range(0, prefixes.shape[0], chunk_rows):
+            block = prefixes[first:first + chunk_rows]
+            block_counts = counts[first:first + chunk_rows]
+
+            # 每個部分組合的下一個號碼：大於前一個號碼，且保留剩餘位置所需的號碼
+            last = block[:, -1].astype(np.intp) if k else np.zeros(block.shape[0], dtype=np.intp)
+            candidate_count = np.maximum(39 - remaining - last, 0)
+            rows = np.repeat(np.arange(block.shape[0]), candidate_count)
+            offsets = np.arange(rows.shape[0]) - np.repeat(np.cumsum(candidate_count) - candidate_count, candidate_count)
+            numbers = last[rows] + 1 + offsets
+
+            new_counts = block_counts[rows] + tables[:, k, numbers].T
+            feasible = ((new_counts <= highs) & (new_counts + remaining >= lows)).all(axis=1)
+            level_prefixes.append(np.column_stack((block[rows[feasible]], numbers[feasible].astype(np.uint8))))
+            level_counts.append(new_counts[feasible])
+
+        prefixes = np.concatenate(level_prefixes) if level_prefixes else np.zeros((0, k + 1), dtype=np.uint8)
+        counts = np.concatenate(level_counts) if level_counts else np.zeros((0, len(constraints)), dtype=np.int8)
+        if prefixes.shape[0] > max_rows:
+            return None
+
+    # 最後確認累計值落在允許集合 (非連續集合只靠上下限無法排除)
+    valid = allowed[np.arange(len(constraints)), counts.astype(np.intp)].all(axis=1)
+    return prefixes[valid].reshape(-1, 5)
+
+
+def GeneratedFilterCombinations(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int], None],
+    criteria_second_limit: Union[int, range, List[int], None],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    max_rows: int = 100_000
+) -> np.ndarray:
+    """
+    兩階段篩選，結果與依序套用 OuterLayerFilter 相同
+
+    可轉換為限制條件的組別先直接產生候選組合，未完全轉換的階段再對候選組合掃描；
+    沒有可用條件或條件寬鬆時掃描全部組合
+
+    Args:
+        use_position_filter: 是否使用位置篩選器
+        use_criteria_filter: 是否使用條件篩選器
+        positional_second_limit: 位置篩選器二次限定值
+        criteria_second_limit: 條件篩選器二次限定值
+        inner_positional_2lim: 內部位置二次限定值列表
+        inner_criteria_2lim: 內部條件二次限定值列表
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+        max_rows: 見 GenerateCombinations
+
+    Returns:
+        依字典序排列的 (N, 5) 通過組合陣列
+    """
+    constraints = []
+    scan_position = use_position_filter
+    scan_criteria = use_criteria_filter
+
+    if use_position_filter:
+        positional_constraints = PositionalConstraints(
+            positional_filter_data, inner_positional_2lim, positional_second_limit
+        )
+        if positional_constraints is not None:
+            constraints += positional_constraints
+            scan_position = False
+    if use_criteria_filter:
+        criteria_constraints, complete = CriteriaConstraints(
+            criteria_filter_data, inner_criteria_2lim, criteria_second_limit
+        )
+        constraints += criteria_constraints
+        scan_criteria = not complete
+
+    candidates = GenerateCombinations(constraints, max_rows=max_rows) if constraints else None
+    if candidates is None:
+        candidates = AllCombinations()
+        scan_position, scan_criteria = use_position_filter, use_criteria_filter
+
+    if scan_position:
+        candidates = candidates[OuterLayerMask(
+            filters_set=positional_filter_data,
+            second_limit_set=inner_positional_2lim,
+            second_limit=positional_second_limit,
+            input_combinations=candidates,
+            InnerLayerFilter=FilterByPositions
+        )]
+    if scan_criteria:
+        candidates = candidates[BatchedCriteriaMask(
+            filters_set=criteria_filter_data,
+            second_limit_set=inner_criteria_2lim,
+            second_limit=criteria_second_limit,
+            input_combinations=candidates
+        )]
+    return candidates
@@ -1,9 +1,56 @@
 import PySide6.QtWidgets as qtw
+from PySide6 import QtCore
 from filters_data import positional_filters, criteria_filters, inner_positional_2lim, inner_criteria_2lim
 from utils import Parse2LimitInput, ParseFiltertstrToList
-from core import CoreFunction
+from core import BACKENDS, CoreFunction
 from gui_helpers import show_result_popup, MainEditorDialog
+from preview import LimitPreview
+from expression import ParseFilterExpression
+from coverage_analysis import SELECTION_OBJECTIVES, SelectTickets, CoverageReport
+from result_store import ResultStore
+from export import DEFAULT_SEEN_PATH, ExportCombinations
+from sampling import SAMPLE_WEIGHTINGS, SampleTickets, HotWeights, HitScores
+from ranking import ParseGroupWeights, TopKCombinations
+from estimate import ProgressiveEstimator, FormatEstimate, SampleKeys
+from simulation import DEFAULT_TICKET_COST, ParsePrizeTable, SimulateReturns, SimulationCancelled, FormatSimulation
+import numpy as np
 import sys
+import threading
+
+
+class SimulationWorker(QtCore.QThread):
+    """在背景執行緒執行報酬模擬，避免阻塞視窗"""
+
+    progressed = QtCore.Signal(int, int)
+    succeeded = QtCore.Signal(object)
+    failed = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+
+    def __init__(self, parent: qtw.QWidget, **simulation_args):
+        """
+        Args:
+            parent: 父視窗
+            simulation_args: SimulateReturns 的參數
+        """
+        super().__init__(parent)
+        self.simulation_args = simulation_args
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        """執行模擬，結果以訊號傳回主執行緒"""
+        try:
+            result = SimulateReturns(**self.simulation_args, progress=self.progressed.emit, cancel=self.cancel_event)
+        except SimulationCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.succeeded.emit(result)
+
+    def cancel(self):
+        """要求停止模擬 (目前的工作完成後停止)"""
+        self.cancel_event.set()
 
 
 class LotteryApp(qtw.QWidget):
@@ -19,10 +66,26 @@ class LotteryApp(qtw.QWidget):
         self.inner_positional_2lim = inner_positional_2lim
         self.inner_criteria_2lim = inner_criteria_2lim
 
-        # 初始化輸出內容
-        self.main_window_output_lines = ""
-        self.valid_combinations_output_lines = ""
-        self.hot_numbers_output_lines = ""
+        # 初始化輸出內容 (輸出文字由 FilterResult 在查看時才產生)
+        self.result = None
+        self.valid_combinations = np.zeros((0, 5), dtype=np.uint8)
+        self.sampled_tickets = np.zeros((0, 5), dtype=np.uint8)
+
+        # 初始化二次限定預覽 (基準在第一次需要時才建立)
+        self.limit_preview = None
+        self.preview_filter_data = None
+        self.preview_filters_snapshot = None
+        self.preview_inner_override = {}
+
+        # 初始化快速估算
+        self.estimate_steps = None
+        self.latest_estimate = None
+
+        # 背景執行中的報酬模擬
+        self.simulation_worker = None
+
+        # 相同設定再次執行時直接讀取先前的結果
+        self.result_store = ResultStore()
 
         self.setup_ui()
 
@@ -36,7 +99,16 @@ class LotteryApp(qtw.QWidget):
         
         # 外層二次限定值
         self._setup_second_limit_section(layout)
+
+        # 篩選式
+        self._setup_expression_section(layout)
+
+        # 二次限定預覽
+        self._setup_preview_section(layout)
         
+        # 快速估算
+        self._setup_estimate_section(layout)
+
         # 編輯條件按鈕
         self._setup_edit_buttons_section(layout)
         
@@ -49,6 +121,21 @@ class LotteryApp(qtw.QWidget):
         # 查看結果按鈕
         self._setup_view_buttons_section(layout)
 
+        # 匯出通過號碼
+        self._setup_export_section(layout)
+
+        # 隨機抽樣
+        self._setup_sampling_section(layout)
+
+        # 評分排名
+        self._setup_ranking_section(layout)
+
+        # 報酬模擬
+        self._setup_simulation_section(layout)
+
+        # 涵蓋選號
+        self._setup_selection_section(layout)
+
     def _setup_filter_type_section(self, layout):
         """設置篩選器類型選擇區域"""
         row1 = qtw.QHBoxLayout()
@@ -57,6 +144,12 @@ class LotteryApp(qtw.QWidget):
         self.use_criteria_filter = qtw.QCheckBox(" 號碼組")
         row1.addWidget(self.use_position_filter)
         row1.addWidget(self.use_criteria_filter)
+        row1.addWidget(qtw.QLabel(" 計算方式:"))
+        self.backend_combo = qtw.QComboBox()
+        self.backend_combo.addItems(BACKENDS)
+        row1.addWidget(self.backend_combo)
+        self.diagnostics_check = qtw.QCheckBox(" 診斷模式")
+        row1.addWidget(self.diagnostics_check)
         layout.addLayout(row1)
 
     def _setup_second_limit_section(self, layout):
@@ -69,16 +162,85 @@ class LotteryApp(qtw.QWidget):
         row2.addWidget(self.criteria_second_limit_entry)
         layout.addLayout(row2)
 
+    def _setup_expression_section(self, layout):
+        """設置篩選式輸入區域"""
+        row_expression = qtw.QHBoxLayout()
+        row_expression.addWidget(qtw.QLabel(" 篩選式 (選填):"))
+        self.expression_entry = qtw.QLineEdit()
+        self.expression_entry.setPlaceholderText("例如 (P:3 | C[1]:1) & !C[2]:0，留白則使用上方設定")
+        row_expression.addWidget(self.expression_entry)
+        layout.addLayout(row_expression)
+
+    def _setup_preview_section(self, layout):
+        """設置二次限定預覽區域"""
+        row_preview = qtw.QHBoxLayout()
+        self.preview_label = qtw.QLabel("預覽通過組合數: 請先執行分析")
+        row_preview.addWidget(self.preview_label)
+        row_preview.addStretch()
+
+        sensitivity_button = qtw.QPushButton(" 敏感度分析")
+        sensitivity_button.clicked.connect(self.run_sensitivity)
+        row_preview.addWidget(sensitivity_button)
+        layout.addLayout(row_preview)
+
+        # 輸入停止一段時間後才重新計算
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(80)
+        self.preview_timer.timeout.connect(self.update_preview)
+
+        self.positional_second_limit_entry.textChanged.connect(self.schedule_preview)
+        self.criteria_second_limit_entry.textChanged.connect(self.schedule_preview)
+        self.use_position_filter.toggled.connect(self.schedule_preview)
+        self.use_criteria_filter.toggled.connect(self.schedule_preview)
+        self.expression_entry.textChanged.connect(self.schedule_preview)
+
+    def _setup_estimate_section(self, layout):
+        """設置快速估算區域"""
+        row_estimate = qtw.QHBoxLayout()
+        self.estimate_label = qtw.QLabel("估算通過組合數: -")
+        row_estimate.addWidget(self.estimate_label)
+        row_estimate.addStretch()
+
+        estimate_button = qtw.QPushButton(" 快速估算")
+        estimate_button.clicked.connect(self.start_estimate)
+        stop_button = qtw.QPushButton(" 停止")
+        stop_button.clicked.connect(self.stop_estimate)
+        detail_button = qtw.QPushButton(" 估算明細")
+        detail_button.clicked.connect(
+            lambda: show_result_popup(
+                parent=self,
+                title=" 估算明細",
+                output=FormatEstimate(self.latest_estimate) if self.latest_estimate else "請先執行快速估算"
+            )
+        )
+        row_estimate.addWidget(estimate_button)
+        row_estimate.addWidget(stop_button)
+        row_estimate.addWidget(detail_button)
+        layout.addLayout(row_estimate)
+
+        # 每次計時器觸發時擴大一次樣本，期間介面仍可操作
+        self.estimate_timer = QtCore.QTimer(self)
+        self.estimate_timer.setInterval(0)
+        self.estimate_timer.timeout.connect(self.refine_estimate)
+
+        # 啟動後先產生全部組合與抽樣鍵值，讓第一次估算只需數十毫秒
+        QtCore.QTimer.singleShot(0, lambda: SampleKeys(0))
+
     def _setup_edit_buttons_section(self, layout):
         """設置編輯條件按鈕區域"""
         row3 = qtw.QHBoxLayout()
         edit_position_button = qtw.QPushButton(" 編輯位置組條件")
         edit_position_button.clicked.connect(
-            lambda: self.open_editor(" 編輯位置組條件", self.positional_filters, self.inner_positional_2lim)
+            lambda: self.open_editor(
+                " 編輯位置組條件", self.positional_filters, self.inner_positional_2lim, "position"
+            )
         )
         edit_criteria_button = qtw.QPushButton(" 編輯號碼組條件")
         edit_criteria_button.clicked.connect(
-            lambda: self.open_editor(" 編輯號碼組條件", self.criteria_filters, self.inner_criteria_2lim)
+            lambda: self.open_editor(
+                " 編輯號碼組條件", self.criteria_filters, self.inner_criteria_2lim, "criteria"
+            )
         )
         row3.addWidget(edit_position_button)
         row3.addWidget(edit_criteria_button)
@@ -111,7 +273,7 @@ class LotteryApp(qtw.QWidget):
             lambda: show_result_popup(
                 parent=self,
                 title=" 通過號碼", 
-                output=self.valid_combinations_output_lines
+                output=self.result.valid_combinations_text if self.result else ""
             )
         )
         view_hot_button = qtw.QPushButton(" 查看熱門號碼")
@@ -119,77 +281,663 @@ class LotteryApp(qtw.QWidget):
             lambda: show_result_popup(
                 parent=self,
                 title=" 熱門號碼", 
-                output=self.hot_numbers_output_lines
+                output=self.result.hot_numbers_text if self.result else ""
+            )
+        )
+        view_diagnostics_button = qtw.QPushButton(" 查看命中分布")
+        view_diagnostics_button.clicked.connect(
+            lambda: show_result_popup(
+                parent=self,
+                title=" 命中分布",
+                output=(self.result and self.result.diagnostics_text) or "請勾選診斷模式後執行分析 (篩選式不提供)"
             )
         )
         row6.addWidget(view_valid_button)
         row6.addWidget(view_hot_button)
+        row6.addWidget(view_diagnostics_button)
         layout.addLayout(row6)
 
+    def _setup_export_section(self, layout):
+        """設置匯出區域"""
+        row_export = qtw.QHBoxLayout()
+        row_export.addWidget(qtw.QLabel(" 匯出排序:"))
+        self.export_sort_combo = qtw.QComboBox()
+        for label, sort in (("原順序", None), ("字典序", "lex"), ("號碼和", "sum")):
+            self.export_sort_combo.addItem(label, sort)
+        row_export.addWidget(self.export_sort_combo)
+
+        self.export_skip_seen = qtw.QCheckBox(" 略過已匯出組合")
+        row_export.addWidget(self.export_skip_seen)
+
+        export_button = qtw.QPushButton(" 匯出通過號碼")
+        export_button.clicked.connect(self.run_export)
+        row_export.addWidget(export_button)
+        layout.addLayout(row_export)
+
+    def _setup_sampling_section(self, layout):
+        """設置隨機抽樣區域"""
+        row_sample = qtw.QHBoxLayout()
+        row_sample.addWidget(qtw.QLabel(" 抽樣注數:"))
+        self.sample_size_entry = qtw.QLineEdit()
+        self.sample_size_entry.setFixedWidth(60)
+        row_sample.addWidget(self.sample_size_entry)
+
+        row_sample.addWidget(qtw.QLabel(" 權重:"))
+        self.sample_weighting_combo = qtw.QComboBox()
+        for label, weighting in zip(("均勻", "熱門號碼", "命中分數"), SAMPLE_WEIGHTINGS):
+            self.sample_weighting_combo.addItem(label, weighting)
+        row_sample.addWidget(self.sample_weighting_combo)
+
+        row_sample.addWidget(qtw.QLabel(" 種子:"))
+        self.sample_seed_entry = qtw.QLineEdit("0")
+        self.sample_seed_entry.setFixedWidth(60)
+        row_sample.addWidget(self.sample_seed_entry)
+
+        sample_button = qtw.QPushButton(" 隨機抽樣")
+        sample_button.clicked.connect(self.run_sampling)
+        row_sample.addWidget(sample_button)
+        layout.addLayout(row_sample)
+
+    def _setup_ranking_section(self, layout):
+        """設置評分排名區域"""
+        row_rank = qtw.QHBoxLayout()
+        row_rank.addWidget(qtw.QLabel(" 組別權重 位置組:"))
+        self.positional_weights_entry = qtw.QLineEdit()
+        self.positional_weights_entry.setPlaceholderText("例如 2, 1, 1")
+        row_rank.addWidget(self.positional_weights_entry)
+
+        row_rank.addWidget(qtw.QLabel(" 號碼組:"))
+        self.criteria_weights_entry = qtw.QLineEdit()
+        row_rank.addWidget(self.criteria_weights_entry)
+
+        row_rank.addWidget(qtw.QLabel(" 前:"))
+        self.top_k_entry = qtw.QLineEdit("100")
+        self.top_k_entry.setFixedWidth(60)
+        row_rank.addWidget(self.top_k_entry)
+
+        rank_button = qtw.QPushButton(" 評分排名")
+        rank_button.clicked.connect(self.run_ranking)
+        row_rank.addWidget(rank_button)
+        layout.addLayout(row_rank)
+
+    def _setup_simulation_section(self, layout):
+        """設置報酬模擬區域"""
+        row_simulation = qtw.QHBoxLayout()
+        row_simulation.addWidget(qtw.QLabel(" 模擬路徑數:"))
+        self.simulate_paths_entry = qtw.QLineEdit("1000")
+        self.simulate_paths_entry.setFixedWidth(60)
+        row_simulation.addWidget(self.simulate_paths_entry)
+
+        row_simulation.addWidget(qtw.QLabel(" 每條期數:"))
+        self.simulate_horizon_entry = qtw.QLineEdit("10000")
+        self.simulate_horizon_entry.setFixedWidth(60)
+        row_simulation.addWidget(self.simulate_horizon_entry)
+
+        row_simulation.addWidget(qtw.QLabel(" 每注成本:"))
+        self.ticket_cost_entry = qtw.QLineEdit(str(DEFAULT_TICKET_COST))
+        self.ticket_cost_entry.setFixedWidth(50)
+        row_simulation.addWidget(self.ticket_cost_entry)
+
+        row_simulation.addWidget(qtw.QLabel(" 本金:"))
+        self.bankroll_entry = qtw.QLineEdit()
+        self.bankroll_entry.setPlaceholderText("留白不限")
+        self.bankroll_entry.setFixedWidth(80)
+        row_simulation.addWidget(self.bankroll_entry)
+
+        row_simulation.addWidget(qtw.QLabel(" 獎金表:"))
+        self.prize_table_entry = qtw.QLineEdit()
+        self.prize_table_entry.setPlaceholderText("2:50, 3:300, 4:200000, 5:8000000")
+        row_simulation.addWidget(self.prize_table_entry)
+
+        row_simulation.addWidget(qtw.QLabel(" 頭獎平分人數:"))
+        self.jackpot_others_entry = qtw.QLineEdit()
+        self.jackpot_others_entry.setPlaceholderText("留白不平分")
+        self.jackpot_others_entry.setFixedWidth(70)
+        row_simulation.addWidget(self.jackpot_others_entry)
+
+        row_simulation.addWidget(qtw.QLabel(" 模擬種子:"))
+        self.simulate_seed_entry = qtw.QLineEdit("0")
+        self.simulate_seed_entry.setFixedWidth(60)
+        row_simulation.addWidget(self.simulate_seed_entry)
+
+        self.simulate_sampled_check = qtw.QCheckBox(" 只模擬抽樣結果")
+        row_simulation.addWidget(self.simulate_sampled_check)
+
+        self.simulate_button = qtw.QPushButton(" 模擬報酬")
+        self.simulate_button.clicked.connect(self.run_simulation)
+        row_simulation.addWidget(self.simulate_button)
+
+        self.cancel_simulation_button = qtw.QPushButton(" 取消模擬")
+        self.cancel_simulation_button.setEnabled(False)
+        self.cancel_simulation_button.clicked.connect(self.cancel_simulation)
+        row_simulation.addWidget(self.cancel_simulation_button)
+
+        self.simulation_label = qtw.QLabel("")
+        row_simulation.addWidget(self.simulation_label)
+        layout.addLayout(row_simulation)
+
+    def _setup_selection_section(self, layout):
+        """設置涵蓋選號區域"""
+        row7 = qtw.QHBoxLayout()
+        row7.addWidget(qtw.QLabel(" 選號注數:"))
+        self.ticket_count_entry = qtw.QLineEdit()
+        self.ticket_count_entry.setFixedWidth(60)
+        row7.addWidget(self.ticket_count_entry)
+
+        row7.addWidget(qtw.QLabel(" 目標:"))
+        self.objective_combo = qtw.QComboBox()
+        for label, objective in zip(("兩碼涵蓋", "三碼涵蓋", "獎金加權"), SELECTION_OBJECTIVES):
+            self.objective_combo.addItem(label, objective)
+        row7.addWidget(self.objective_combo)
+
+        row7.addWidget(qtw.QLabel(" 種子:"))
+        self.seed_entry = qtw.QLineEdit("0")
+        self.seed_entry.setFixedWidth(60)
+        row7.addWidget(self.seed_entry)
+
+        select_button = qtw.QPushButton(" 涵蓋選號")
+        select_button.clicked.connect(self.run_selection)
+        row7.addWidget(select_button)
+        layout.addLayout(row7)
+
+        row8 = qtw.QHBoxLayout()
+        row8.addWidget(qtw.QLabel(" 列出未涵蓋子集合:"))
+        self.uncovered_combo = qtw.QComboBox()
+        self.uncovered_combo.addItem("不列出", None)
+        for t in range(2, 6):
+            self.uncovered_combo.addItem(f"{t} 碼", t)
+        row8.addWidget(self.uncovered_combo)
+
+        coverage_button = qtw.QPushButton(" 涵蓋分析")
+        coverage_button.clicked.connect(self.run_coverage_report)
+        row8.addWidget(coverage_button)
+        layout.addLayout(row8)
+
+    def _parse_run_inputs(self) -> dict:
+        """
+        解析篩選器與畫面上的設定
+
+        Returns:
+            CoreFunction 所需的篩選參數 (不含計算方式與快取)
+
+        Raises:
+            ValueError: 當格式錯誤時
+        """
+        # 格式轉換
+        parsed_positional_filters = ParseFiltertstrToList(
+            mode="position", 
+            filters_set_str=self.positional_filters
+        )
+        parsed_criteria_filters = ParseFiltertstrToList(
+            mode="criteria", 
+            filters_set_str=self.criteria_filters
+        )
+        
+        # 解析輸入參數
+        (
+            positional_second_limit,
+            criteria_second_limit,
+            inner_positional_2lim,
+            inner_criteria_2lim,
+            winning_numbers
+        ) = Parse2LimitInput(
+            positional_second_limit_str=self.positional_second_limit_entry.text(),
+            criteria_second_limit_str=self.criteria_second_limit_entry.text(),
+            inner_positional_2lim_str=self.inner_positional_2lim,
+            inner_criteria_2lim_str=self.inner_criteria_2lim,
+            positional_filters=parsed_positional_filters,
+            criteria_filters=parsed_criteria_filters,
+            winning_numbers_str=self.winning_entry.text()
+        )
+
+        # 先檢查篩選式格式
+        filter_expression = self.expression_entry.text().strip()
+        if filter_expression:
+            ParseFilterExpression(
+                text=filter_expression,
+                positional_filter_data=parsed_positional_filters,
+                criteria_filter_data=parsed_criteria_filters,
+                inner_positional_2lim=inner_positional_2lim,
+                inner_criteria_2lim=inner_criteria_2lim
+            )
+
+        return {
+            "use_position_filter": self.use_position_filter.isChecked(),
+            "use_criteria_filter": self.use_criteria_filter.isChecked(),
+            "positional_second_limit": positional_second_limit,
+            "criteria_second_limit": criteria_second_limit,
+            "inner_positional_2lim": inner_positional_2lim,
+            "inner_criteria_2lim": inner_criteria_2lim,
+            "positional_filter_data": parsed_positional_filters,
+            "criteria_filter_data": parsed_criteria_filters,
+            "winning_numbers": winning_numbers,
+            "filter_expression": filter_expression,
+        }
+
     def run_logic(self):
         """執行篩選邏輯"""
+        # 要求精確結果時停止估算
+        self.stop_estimate()
+        try:
+            run_inputs = self._parse_run_inputs()
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return
+
+        # 執行核心功能
+        self.result = CoreFunction(
+            **run_inputs,
+            backend=self.backend_combo.currentText(),
+            result_store=self.result_store,
+            diagnostics=self.diagnostics_check.isChecked()
+        )
+
+        # 更新輸出內容
+        self.valid_combinations = self.result.valid_combinations
+
+        # 顯示主要輸出
+        self.output.setPlainText(self.result.main_output)
+
+        # 篩選器變更時才需要新的二次限定預覽基準，只調整限定值或勾選時沿用；
+        # 新基準延後到第一次需要時才計算，讀取快取的結果不必等待
+        filters_snapshot = self._filters_snapshot()
+        if self.preview_filter_data is None or filters_snapshot != self.preview_filters_snapshot:
+            self.limit_preview = None
+            self.preview_filter_data = (run_inputs["positional_filter_data"], run_inputs["criteria_filter_data"])
+            self.preview_filters_snapshot = filters_snapshot
+
+        if self.limit_preview is None and not run_inputs["filter_expression"] and not self.preview_inner_override:
+            # 預覽與本次執行的設定相同，通過組合數就是本次結果
+            self.preview_label.setText(f"預覽通過組合數: {self.result.valid_count}")
+        else:
+            self.update_preview()
+
+    def run_export(self):
+        """將通過組合匯出為 CSV、TSV 或投注單文字檔"""
+        if len(self.valid_combinations) == 0:
+            qtw.QMessageBox.critical(self, "錯誤", "沒有通過組合，請先執行分析")
+            return
+
+        name_filters = {
+            "CSV (*.csv *.csv.gz)": "csv",
+            "TSV (*.tsv *.tsv.gz)": "tsv",
+            "投注單 (*.txt *.txt.gz)": "ticket",
+        }
+        path, selected_filter = qtw.QFileDialog.getSaveFileName(
+            self, "匯出通過號碼", "", ";;".join(name_filters)
+        )
+        if not path:
+            return
+
+        try:
+            count = ExportCombinations(
+                passed_combinations=self.valid_combinations,
+                path=path,
+                export_format=name_filters.get(selected_filter, "csv"),
+                sort=self.export_sort_combo.currentData(),
+                seen_path=DEFAULT_SEEN_PATH if self.export_skip_seen.isChecked() else None
+            )
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"匯出失敗: {e}")
+            return
+        qtw.QMessageBox.information(self, "匯出完成", f"已匯出 {count} 組合至 {path}")
+
+    def run_sampling(self):
+        """從通過組合中依權重不放回抽出指定注數"""
+        try:
+            sample_size = int(self.sample_size_entry.text().strip())
+            seed = int(self.sample_seed_entry.text().strip() or 0)
+            if sample_size <= 0:
+                raise ValueError("請輸入正整數")
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return
+        if len(self.valid_combinations) == 0:
+            qtw.QMessageBox.critical(self, "錯誤", "沒有通過組合，請先執行分析")
+            return
+
+        passed = np.asarray(self.valid_combinations, dtype=np.uint8).reshape(-1, 5)
+        weighting = self.sample_weighting_combo.currentData()
+        weights = None
+        if weighting == "hot":
+            weights = HotWeights(passed)
+        elif weighting == "score":
+            try:
+                weights = HitScores(self._ensure_limit_preview(), passed)
+            except Exception as e:
+                qtw.QMessageBox.critical(self, "錯誤", f"無法計算命中分數: {e}")
+                return
+
+        sampled = SampleTickets(passed_combinations=passed, sample_size=sample_size, weights=weights, seed=seed)
+        self.sampled_tickets = sampled
+        output_lines = [", ".join(str(num) for num in combination) for combination in sampled.tolist()]
+        show_result_popup(parent=self, title=f" 隨機抽樣 ({len(output_lines)} 注)", output="\n".join(output_lines))
+
+    def run_ranking(self):
+        """依各組命中數的加權總和列出通過組合中分數最高的 K 注"""
+        if len(self.valid_combinations) == 0 or self.preview_filter_data is None:
+            qtw.QMessageBox.critical(self, "錯誤", "沒有通過組合，請先執行分析")
+            return
+        positional_filter_data, criteria_filter_data = self.preview_filter_data
+        try:
+            top_k = int(self.top_k_entry.text().strip())
+            if top_k <= 0:
+                raise ValueError("請輸入正整數")
+            positional_weights = ParseGroupWeights(self.positional_weights_entry.text(), len(positional_filter_data))
+            criteria_weights = ParseGroupWeights(self.criteria_weights_entry.text(), len(criteria_filter_data))
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return
+
+        ranked, scores = TopKCombinations(
+            input_combinations=self.valid_combinations,
+            top_k=top_k,
+            positional_filter_data=positional_filter_data,
+            criteria_filter_data=criteria_filter_data,
+            positional_weights=positional_weights,
+            criteria_weights=criteria_weights
+        )
+        output_lines = [
+            f"分數 {score:g}: " + ", ".join(str(num) for num in combination)
+            for combination, score in zip(ranked.tolist(), scores.tolist())
+        ]
+        show_result_popup(parent=self, title=f" 評分排名 (前 {len(output_lines)} 注)", output="\n".join(output_lines))
+
+    def run_simulation(self):
+        """在背景模擬每期投注通過組合 (或抽樣結果) 的長期報酬"""
+        if self.simulation_worker is not None:
+            return
+        try:
+            paths = int(self.simulate_paths_entry.text().strip())
+            horizon = int(self.simulate_horizon_entry.text().strip())
+            if paths <= 0 or horizon <= 0:
+                raise ValueError("路徑數與期數須為正整數")
+            ticket_cost = float(self.ticket_cost_entry.text().strip() or DEFAULT_TICKET_COST)
+            bankroll_text = self.bankroll_entry.text().strip()
+            bankroll = float(bankroll_text) if bankroll_text else None
+            jackpot_others_text = self.jackpot_others_entry.text().strip()
+            jackpot_others_mean = float(jackpot_others_text) if jackpot_others_text else None
+            prize_table = ParsePrizeTable(self.prize_table_entry.text())
+            seed = int(self.simulate_seed_entry.text().strip() or 0)
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return
+
+        tickets = self.sampled_tickets if self.simulate_sampled_check.isChecked() else self.valid_combinations
+        if len(tickets) == 0:
+            message = "請先執行隨機抽樣" if self.simulate_sampled_check.isChecked() else "沒有通過組合，請先執行分析"
+            qtw.QMessageBox.critical(self, "錯誤", message)
+            return
+
+        worker = SimulationWorker(
+            self,
+            tickets=tickets,
+            paths=paths,
+            horizon=horizon,
+            prize_table=prize_table,
+            ticket_cost=ticket_cost,
+            bankroll=bankroll,
+            jackpot_others_mean=jackpot_others_mean,
+            seed=seed
+        )
+        worker.progressed.connect(
+            lambda done, total: self.simulation_label.setText(f"模擬中 {done}/{total}")
+        )
+        worker.succeeded.connect(self._show_simulation)
+        worker.failed.connect(lambda message: qtw.QMessageBox.critical(self, "錯誤", f"模擬失敗: {message}"))
+        worker.cancelled.connect(lambda: self.simulation_label.setText("模擬已取消"))
+        worker.finished.connect(self._simulation_finished)
+
+        self.simulation_worker = worker
+        self.simulate_button.setEnabled(False)
+        self.cancel_simulation_button.setEnabled(True)
+        self.simulation_label.setText("模擬中")
+        worker.start()
+
+    def _show_simulation(self, result: dict):
+        """顯示模擬結果"""
+        self.simulation_label.setText("模擬完成")
+        show_result_popup(parent=self, title=" 報酬模擬", output=FormatSimulation(result))
+
+    def _simulation_finished(self):
+        """模擬執行緒結束後恢復按鈕狀態"""
+        if self.simulation_worker is not None:
+            self.simulation_worker.deleteLater()
+        self.simulation_worker = None
+        self.simulate_button.setEnabled(True)
+        self.cancel_simulation_button.setEnabled(False)
+
+    def cancel_simulation(self):
+        """取消背景模擬"""
+        if self.simulation_worker is not None:
+            self.simulation_worker.cancel()
+            self.simulation_label.setText("取消中")
+
+    def closeEvent(self, event):
+        """關閉視窗前停止背景模擬"""
+        if self.simulation_worker is not None:
+            self.simulation_worker.cancel()
+            self.simulation_worker.wait()
+        super().closeEvent(event)
+
+    def start_estimate(self):
+        """以目前設定開始逐步抽樣估算"""
+        self.stop_estimate()
+        try:
+            run_inputs = self._parse_run_inputs()
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return
+        self.estimate_steps = ProgressiveEstimator(**run_inputs).progressive()
+        self.refine_estimate()
+        self.estimate_timer.start()
+
+    def refine_estimate(self):
+        """擴大一次樣本並更新估算結果"""
+        if self.estimate_steps is None:
+            return
+        result = next(self.estimate_steps, None)
+        if result is None:
+            self.stop_estimate()
+            return
+
+        self.latest_estimate = result
+        value, low, high = result["pass_count"]
+        if result["exact"]:
+            self.estimate_label.setText(f"估算通過組合數: {value:,.0f} (已抽完全部組合)")
+            self.stop_estimate()
+        else:
+            self.estimate_label.setText(
+                f"估算通過組合數: 約 {value:,.0f} (95% 區間 {low:,.0f} ~ {high:,.0f}，"
+                f"樣本 {result['sample_size']:,})"
+            )
+
+    def stop_estimate(self):
+        """停止估算"""
+        self.estimate_timer.stop()
+        self.estimate_steps = None
+
+    def run_selection(self):
+        """從通過組合中挑選涵蓋最佳的 K 注"""
         try:
-            # 格式轉換
-            parsed_positional_filters = ParseFiltertstrToList(
-                mode="position", 
-                filters_set_str=self.positional_filters
+            ticket_count = int(self.ticket_count_entry.text().strip())
+            seed = int(self.seed_entry.text().strip() or 0)
+            if ticket_count <= 0:
+                raise ValueError("請輸入正整數")
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return
+        if len(self.valid_combinations) == 0:
+            qtw.QMessageBox.critical(self, "錯誤", "沒有通過組合，請先執行分析")
+            return
+
+        selected, coverage_info = SelectTickets(
+            passed_combinations=self.valid_combinations,
+            ticket_count=ticket_count,
+            objective=self.objective_combo.currentData(),
+            seed=seed
+        )
+
+        output_lines = [
+            f"{t} 碼涵蓋: {covered} / {total} ({covered / total:.2%})"
+            for t, (covered, total) in coverage_info.items()
+        ]
+        output_lines.append("")
+        output_lines.extend(", ".join(str(num) for num in combination) for combination in selected.tolist())
+        show_result_popup(parent=self, title=" 涵蓋選號", output="\n".join(output_lines))
+
+    def run_coverage_report(self):
+        """顯示通過組合對 2~5 碼子集合的涵蓋率"""
+        if len(self.valid_combinations) == 0:
+            qtw.QMessageBox.critical(self, "錯誤", "沒有通過組合，請先執行分析")
+            return
+
+        list_t = self.uncovered_combo.currentData()
+        report = CoverageReport(
+            passed_combinations=self.valid_combinations,
+            list_uncovered=() if list_t is None else (list_t,)
+        )
+
+        output_lines = []
+        for t, info in report.items():
+            guarantee = "保證" if info["covered"] == info["total"] else "不保證"
+            output_lines.append(
+                f"{t} 碼子集合涵蓋: {info['covered']} / {info['total']} ({info['ratio']:.2%})，"
+                f"{guarantee}開出的 {t} 碼必有一注全中；"
+                f"任一開獎號碼至少一注中 {t} 碼的比例: {info['draw_ratio']:.2%}"
+            )
+        if list_t is not None:
+            output_lines.append(f"\n未涵蓋的 {list_t} 碼子集合:")
+            output_lines.extend(
+                ", ".join(str(num) for num in subset) for subset in report[list_t]["uncovered"].tolist()
             )
-            parsed_criteria_filters = ParseFiltertstrToList(
-                mode="criteria", 
-                filters_set_str=self.criteria_filters
+        show_result_popup(parent=self, title=" 涵蓋分析", output="\n".join(output_lines))
+
+    def _filters_snapshot(self) -> tuple:
+        """取得目前篩選器內容，用來判斷預覽基準是否過期"""
+        return (tuple(self.positional_filters), tuple(self.criteria_filters))
+
+    def schedule_preview(self, *args):
+        """重新啟動預覽計時器"""
+        if self.preview_filter_data is not None:
+            self.preview_timer.start()
+
+    def _ensure_limit_preview(self) -> LimitPreview:
+        """取得二次限定預覽基準，尚未建立時以上次執行的篩選器計算"""
+        if self.limit_preview is None:
+            positional_filter_data, criteria_filter_data = self.preview_filter_data
+            self.limit_preview = LimitPreview(
+                positional_filter_data=positional_filter_data,
+                criteria_filter_data=criteria_filter_data
             )
-            
-            # 解析輸入參數
+        return self.limit_preview
+
+    def _preview_settings(self) -> tuple:
+        """
+        依目前畫面設定解析預覽所需參數
+
+        Returns:
+            (pass_count 的參數字典, 無法預覽時的說明文字)
+        """
+        if self.preview_filter_data is None:
+            return None, "請先執行分析"
+        if self.expression_entry.text().strip():
+            return None, "使用篩選式時不提供預覽"
+        if self._filters_snapshot() != self.preview_filters_snapshot:
+            return None, "篩選器已變更，請重新執行分析"
+
+        try:
             (
                 positional_second_limit,
                 criteria_second_limit,
                 inner_positional_2lim,
                 inner_criteria_2lim,
-                winning_numbers
+                _
             ) = Parse2LimitInput(
                 positional_second_limit_str=self.positional_second_limit_entry.text(),
                 criteria_second_limit_str=self.criteria_second_limit_entry.text(),
-                inner_positional_2lim_str=self.inner_positional_2lim,
-                inner_criteria_2lim_str=self.inner_criteria_2lim,
-                positional_filters=parsed_positional_filters,
-                criteria_filters=parsed_criteria_filters,
-                winning_numbers_str=self.winning_entry.text()
+                inner_positional_2lim_str=self.preview_inner_override.get(
+                    "position", self.inner_positional_2lim
+                ),
+                inner_criteria_2lim_str=self.preview_inner_override.get(
+                    "criteria", self.inner_criteria_2lim
+                ),
+                positional_filters=self.preview_filter_data[0],
+                criteria_filters=self.preview_filter_data[1],
+                winning_numbers_str=""
             )
         except Exception as e:
-            qtw.QMessageBox.critical(self, "錯誤", f"格式錯誤: {e}")
+            return None, f"格式錯誤 ({e})"
+
+        settings = {
+            "use_position_filter": self.use_position_filter.isChecked(),
+            "use_criteria_filter": self.use_criteria_filter.isChecked(),
+            "positional_second_limit": positional_second_limit,
+            "criteria_second_limit": criteria_second_limit,
+            "inner_positional_2lim": inner_positional_2lim,
+            "inner_criteria_2lim": inner_criteria_2lim,
+        }
+        return settings, ""
+
+    def update_preview(self):
+        """依目前二次限定值更新預覽通過組合數"""
+        if self.preview_filter_data is None:
+            return
+        settings, message = self._preview_settings()
+        if settings is None:
+            self.preview_label.setText(f"預覽通過組合數: {message}")
             return
 
-        # 執行核心功能
-        result = CoreFunction(
-            use_position_filter=self.use_position_filter.isChecked(),
-            use_criteria_filter=self.use_criteria_filter.isChecked(),
-            positional_second_limit=positional_second_limit,
-            criteria_second_limit=criteria_second_limit,
-            inner_positional_2lim=inner_positional_2lim,
-            inner_criteria_2lim=inner_criteria_2lim,
-            positional_filter_data=parsed_positional_filters,
-            criteria_filter_data=parsed_criteria_filters,
-            winning_numbers=winning_numbers
-        )
+        try:
+            count = self._ensure_limit_preview().pass_count(**settings)
+        except Exception as e:
+            # 由計時器呼叫，例外不能往外拋；篩選器不完整時 (例如位置組不足 5 行) 顯示原因
+            self.preview_label.setText(f"預覽通過組合數: 無法計算 ({e})")
+            return
+        self.preview_label.setText(f"預覽通過組合數: {count}")
 
-        # 更新輸出內容
-        self.main_window_output_lines = result["main window output lines"]
-        self.valid_combinations_output_lines = result["valid combinations output lines"]
-        self.hot_numbers_output_lines = result["hot numbers output lines"]
+    def run_sensitivity(self):
+        """顯示逐組移除或放寬內層二次限定後的通過組合數"""
+        settings, message = self._preview_settings()
+        if settings is None:
+            qtw.QMessageBox.critical(self, "錯誤", message)
+            return
 
-        # 顯示主要輸出
-        self.output.setPlainText(self.main_window_output_lines)
+        try:
+            baseline, report = self._ensure_limit_preview().sensitivity(**settings)
+        except Exception as e:
+            qtw.QMessageBox.critical(self, "錯誤", f"無法分析: {e}")
+            return
+        stage_names = {"position": "位置組", "criteria": "號碼組"}
+        output_lines = [f"目前通過組合數: {baseline}", ""]
+        output_lines.extend(
+            f"{stage_names[row['stage']]} 第 {row['group']} 組："
+            f"移除後 {row['drop_count']} ({row['drop_count'] - baseline:+d})，"
+            f"放寬一格後 {row['widen_count']} ({row['widen_count'] - baseline:+d})"
+            for row in report
+        )
+        show_result_popup(parent=self, title=" 敏感度分析", output="\n".join(output_lines))
 
-    def open_editor(self, title: str, filters_set: list, second_limit_set: list):
+    def _preview_inner_limits(self, stage: str, second_limit_texts: list):
+        """編輯器中的內層二次限定變動時暫時套用到預覽"""
+        self.preview_inner_override[stage] = second_limit_texts
+        self.schedule_preview()
+
+    def open_editor(self, title: str, filters_set: list, second_limit_set: list, stage: str):
         """開啟編輯器對話框"""
         editor = MainEditorDialog(
             title=title, 
             parent=self, 
             filters_set=filters_set, 
-            second_limit_set=second_limit_set
+            second_limit_set=second_limit_set,
+            on_second_limit_changed=lambda texts: self._preview_inner_limits(stage, texts)
         )
         editor.exec()
 
+        # 關閉編輯器後改回使用已套用的內層二次限定
+        self.preview_inner_override.pop(stage, None)
+        self.schedule_preview()
+
 
 def launch_app():
     """啟動應用程式"""
@@ -1,5 +1,6 @@
 import sys
-from typing import List, Optional
+from typing import Callable, List, Optional
+from PySide6 import QtCore, QtGui
 from PySide6 import QtWidgets as qtw
 
 
@@ -50,40 +51,143 @@ class EditorPopup(qtw.QDialog):
         return self._filters
 
 
-class ScrollableWidget(qtw.QScrollArea): 
-    """可捲動的元件容器"""
-    
-    def __init__(self, parent: Optional[qtw.QWidget] = None):
+class FilterGroupModel(QtCore.QAbstractTableModel):
+    """篩選器組別資料模型，直接操作 filters_set 與二次限定值列表"""
+
+    SECOND_LIMIT_COLUMN = 0
+    FILTERS_COLUMN = 1
+    HEADERS = ("二次限定", "篩選器內容")
+
+    def __init__(self, filters_set: List[str], second_limit_set: List[str],
+                 parent: Optional[QtCore.QObject] = None):
         super().__init__(parent)
-        self.setWidgetResizable(True)
-        self.setSizePolicy(qtw.QSizePolicy.Expanding, qtw.QSizePolicy.Expanding)
+        # filters_set 與原本相同，編輯後立即寫回；二次限定值需按「套用資料」才寫回
+        self.filters_set = filters_set
+        self.second_limits = [
+            second_limit_set[i] if i < len(second_limit_set) else ""
+            for i in range(len(filters_set))
+        ]
+        self._filled_brush = QtGui.QBrush(QtGui.QColor("green"))
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.filters_set)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+
+        if column == self.SECOND_LIMIT_COLUMN:
+            if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+                return self.second_limits[row]
+        elif column == self.FILTERS_COLUMN:
+            if role == QtCore.Qt.DisplayRole:
+                return "編輯篩選器內容"
+            if role == QtCore.Qt.BackgroundRole and self.filters_set[row].strip():
+                return self._filled_brush
+            if role == QtCore.Qt.TextAlignmentRole:
+                return QtCore.Qt.AlignCenter
+        return None
+
+    def setData(self, index: QtCore.QModelIndex, value, role: int = QtCore.Qt.EditRole) -> bool:
+        if not index.isValid() or role != QtCore.Qt.EditRole:
+            return False
+        row, column = index.row(), index.column()
+
+        if column == self.SECOND_LIMIT_COLUMN:
+            if self.second_limits[row] == value:
+                return False
+            self.second_limits[row] = value
+        elif column == self.FILTERS_COLUMN:
+            self.filters_set[row] = value
+        else:
+            return False
+
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlags:
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        if index.column() == self.SECOND_LIMIT_COLUMN:
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int = QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return f"第 {section + 1} 組"
+
+    def sync_second_limits(self, text: str):
+        """將有篩選器內容的組別同步為同一個二次限定值，空白組別清空"""
+        if not self.filters_set:
+            return
+        self.second_limits = [text if filters else "" for filters in self.filters_set]
+        self.dataChanged.emit(
+            self.index(0, self.SECOND_LIMIT_COLUMN),
+            self.index(len(self.filters_set) - 1, self.SECOND_LIMIT_COLUMN),
+            [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole]
+        )
+
+    def add_groups(self, n: int):
+        """在尾端新增 n 個空白組別"""
+        first = len(self.filters_set)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + n - 1)
+        self.filters_set.extend([""] * n)
+        self.second_limits.extend([""] * n)
+        self.endInsertRows()
+
+    def delete_groups(self, n: int):
+        """刪除尾端 n 個組別"""
+        n = min(n, len(self.filters_set))
+        if n <= 0:
+            return
+        first = len(self.filters_set) - n
+        self.beginRemoveRows(QtCore.QModelIndex(), first, len(self.filters_set) - 1)
+        del self.filters_set[first:]
+        del self.second_limits[first:]
+        self.endRemoveRows()
+
+    def reset_filters(self, filters_list: List[str]):
+        """以新的篩選器列表取代全部組別，保留既有列的二次限定值"""
+        self.beginResetModel()
+        self.filters_set[:] = filters_list
+        self.second_limits = [
+            self.second_limits[i] if i < len(self.second_limits) else ""
+            for i in range(len(filters_list))
+        ]
+        self.endResetModel()
 
-        self.inner_widget = qtw.QWidget()
-        self.inner_layout = qtw.QVBoxLayout()
-        self.inner_widget.setLayout(self.inner_layout)
-        self.setWidget(self.inner_widget)
 
-    def get_layout(self) -> qtw.QVBoxLayout:
-        """取得內部佈局"""
-        return self.inner_layout
+class LiveLineEditDelegate(qtw.QStyledItemDelegate):
+    """輸入時即寫回模型的文字編輯代理，讓預覽能跟著輸入更新"""
+
+    def createEditor(self, parent: qtw.QWidget, option, index: QtCore.QModelIndex) -> qtw.QWidget:
+        editor = qtw.QLineEdit(parent)
+        editor.textEdited.connect(lambda _text: self.commitData.emit(editor))
+        return editor
 
 
 class MainEditorDialog(qtw.QDialog):
     """主要編輯器對話框"""
     
     def __init__(self, title: str, parent: Optional[qtw.QWidget] = None, 
-                 filters_set: Optional[List] = None, second_limit_set: Optional[List] = None):
+                 filters_set: Optional[List] = None, second_limit_set: Optional[List] = None,
+                 on_second_limit_changed: Optional[Callable[[List[str]], None]] = None):
         super().__init__(parent)
         self.setWindowTitle(title)
-        self.filters_set = filters_set or []
-        self.second_limit_set = second_limit_set or []
-        
-        # 初始化元件列表
-        self.row_number_list: List[qtw.QLabel] = []
-        self.second_limit_list: List[qtw.QLineEdit] = []
-        self.edit_filters_list: List[qtw.QPushButton] = []
-        self.row_widgets_list: List[qtw.QWidget] = []
-        self.next_row = 0
+        self.filters_set = filters_set if filters_set is not None else []
+        self.second_limit_set = second_limit_set if second_limit_set is not None else []
+        self.on_second_limit_changed = on_second_limit_changed
+
+        self.model = FilterGroupModel(self.filters_set, self.second_limit_set, self)
 
         self._setup_ui()
 
@@ -92,24 +196,22 @@ class MainEditorDialog(qtw.QDialog):
         main_layout = qtw.QVBoxLayout()
         self.setLayout(main_layout)
 
-        # 設置捲動區域
-        self.scroll_area = ScrollableWidget()
-        self.scroll_layout = self.scroll_area.get_layout()
-        main_layout.addWidget(self.scroll_area)
-
         # 行數顯示和套用按鈕
-        self._setup_row_controls()
+        self._setup_row_controls(main_layout)
         
         # 同步二次限定區域
-        self._setup_sync_controls()
+        self._setup_sync_controls(main_layout)
         
         # 新增/刪除控制區域
-        self._setup_modify_controls()
+        self._setup_modify_controls(main_layout)
 
-        # 初始化編輯器內容
-        self.init_editor()
+        # 組別表格
+        self._setup_table_view(main_layout)
+
+        self._update_row_count()
+        self.resize(420, 500)
 
-    def _setup_row_controls(self):
+    def _setup_row_controls(self, layout: qtw.QVBoxLayout):
         """設置行數控制元件"""
         row1 = qtw.QHBoxLayout()
         self.row_count_label = qtw.QLabel("0")
@@ -120,12 +222,12 @@ class MainEditorDialog(qtw.QDialog):
         row1.addWidget(self.row_count_label)
         row1.addWidget(self.oneclick_btn)
         row1.addWidget(self.apply_btn)
-        self.scroll_layout.addLayout(row1)
+        layout.addLayout(row1)
 
         self.apply_btn.clicked.connect(self._apply_all_data)
         self.oneclick_btn.clicked.connect(self.oneclick_setup)
 
-    def _setup_sync_controls(self):
+    def _setup_sync_controls(self, layout: qtw.QVBoxLayout):
         """設置同步控制元件"""
         row2 = qtw.QHBoxLayout()
         row2.addWidget(qtw.QLabel("同步二次限定為:"))
@@ -137,9 +239,9 @@ class MainEditorDialog(qtw.QDialog):
         row2.addWidget(self.sync_entry)
         row2.addStretch()
         row2.addWidget(self.sync_button)
-        self.scroll_layout.addLayout(row2)
+        layout.addLayout(row2)
 
-    def _setup_modify_controls(self):
+    def _setup_modify_controls(self, layout: qtw.QVBoxLayout):
         """設置修改控制元件"""
         row3 = qtw.QHBoxLayout()
         
@@ -154,97 +256,79 @@ class MainEditorDialog(qtw.QDialog):
         row3.addWidget(self.add_btn)
         row3.addWidget(self.delete_btn)
         row3.addWidget(self.num_input)
-        self.scroll_layout.addLayout(row3)
-
-    def init_editor(self):
-        """初始化編輯器內容"""
-        if self.filters_set:
-            self._add_rows(len(self.filters_set))
-
-            for i in range(len(self.filters_set)):
-                # 設定二次限定值
-                if i < len(self.second_limit_set):
-                    self.second_limit_list[i].setText(self.second_limit_set[i])
-
-                # 設定按鈕樣式
-                if self.filters_set[i].strip():
-                    self.edit_filters_list[i].setStyleSheet("background-color: green;")
-                else:
-                    self.edit_filters_list[i].setStyleSheet("")
-
-            self._update_row_number()
-            self._update_row_count()
+        layout.addLayout(row3)
+
+    def _setup_table_view(self, layout: qtw.QVBoxLayout):
+        """設置組別表格，只繪製可見列"""
+        self.table_view = qtw.QTableView()
+        self.table_view.setModel(self.model)
+        self.table_view.setItemDelegateForColumn(
+            FilterGroupModel.SECOND_LIMIT_COLUMN, LiveLineEditDelegate(self.table_view)
+        )
+        self.table_view.setEditTriggers(
+            qtw.QAbstractItemView.DoubleClicked
+            | qtw.QAbstractItemView.SelectedClicked
+            | qtw.QAbstractItemView.AnyKeyPressed
+        )
+
+        # 固定列高，避免大量組別時逐列計算尺寸
+        vertical_header = self.table_view.verticalHeader()
+        vertical_header.setSectionResizeMode(qtw.QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(28)
+        horizontal_header = self.table_view.horizontalHeader()
+        horizontal_header.setSectionResizeMode(qtw.QHeaderView.Fixed)
+        self.table_view.setColumnWidth(FilterGroupModel.SECOND_LIMIT_COLUMN, 100)
+        self.table_view.setColumnWidth(FilterGroupModel.FILTERS_COLUMN, 160)
+
+        self.table_view.clicked.connect(self._open_filters_editor)
+        layout.addWidget(self.table_view)
+
+        self.model.dataChanged.connect(self._notify_second_limit_changed)
+        self.model.rowsInserted.connect(self._on_rows_changed)
+        self.model.rowsRemoved.connect(self._on_rows_changed)
+        self.model.modelReset.connect(self._on_rows_changed)
+
+    def _open_filters_editor(self, index: QtCore.QModelIndex):
+        """開啟單一組別的篩選器編輯視窗"""
+        if index.column() != FilterGroupModel.FILTERS_COLUMN:
+            return
+        row = index.row()
+        dialog = EditorPopup(f"編輯第 {row + 1} 組", self.filters_set[row])
+        if dialog.exec():
+            self.model.setData(index, dialog.get_result())
 
     def oneclick_setup(self):
         """一鍵設置功能"""
         filters_text = "\n-\n".join(filter.strip() for filter in self.filters_set)
         dialog = EditorPopup("快速編輯資料", filters_text)
         if dialog.exec():
-            self._delete_rows(len(self.row_widgets_list))
-            self.filters_set.clear()
-            self.filters_set.extend(
+            self.model.reset_filters(
                 [filters_str.strip() for filters_str in dialog.get_result().strip().split("-")]
             )
-            self.init_editor()
 
     def _apply_all_data(self):
         """套用所有資料"""
         self.second_limit_set.clear()
-        for entry in self.second_limit_list:
-            self.second_limit_set.append(entry.text())
+        self.second_limit_set.extend(self.model.second_limits)
         self.accept()
 
     def _sync_second_limit(self):
         """同步二次限定值"""
-        text = self.sync_entry.text().strip()
-        for filters, entry in zip(self.filters_set, self.second_limit_list):
-            entry.setText(text if filters else "")
+        self.model.sync_second_limits(self.sync_entry.text().strip())
 
-    def _update_row_number(self):
-        """更新行號標籤"""
-        for i, label in enumerate(self.row_number_list):
-            label.setText(f"第 {i + 1} 組")
+    def _notify_second_limit_changed(self, *args):
+        """通知外部目前尚未套用的二次限定值"""
+        if self.on_second_limit_changed is not None:
+            self.on_second_limit_changed(list(self.model.second_limits))
+
+    def _on_rows_changed(self, *args):
+        """組別數量變動後更新計數並通知預覽"""
+        self._update_row_count()
+        self._notify_second_limit_changed()
 
     def _update_row_count(self):
         """更新行數計數"""
-        self.row_count_label.setText(str(len(self.second_limit_list)))
-
-    def _create_row_widget(self, row_index: int) -> tuple:
-        """創建行元件"""
-        row_widget = qtw.QWidget()
-        row_layout = qtw.QHBoxLayout(row_widget)
-        
-        # 創建標籤
-        label = qtw.QLabel()
-        label.setFixedWidth(40)
-        
-        # 創建輸入框
-        entry = qtw.QLineEdit()
-        entry.setFixedWidth(80)
-        
-        # 創建按鈕
-        button = qtw.QPushButton("編輯篩選器內容")
-        button.setFixedWidth(120)
-        
-        def editor_handler(idx: int, btn: qtw.QPushButton):
-            def handler():
-                dialog = EditorPopup(f"編輯第 {idx + 1} 組", self.filters_set[idx])
-                if dialog.exec():
-                    self.filters_set[idx] = dialog.get_result()
-                    if self.filters_set[idx].strip():
-                        btn.setStyleSheet("background-color: green;")
-                    else:
-                        btn.setStyleSheet("")
-            return handler
-        
-        button.clicked.connect(editor_handler(row_index, button))
-        
-        # 添加元件到佈局
-        row_layout.addWidget(label)
-        row_layout.addWidget(entry)
-        row_layout.addWidget(button)
-        
-        return row_widget, label, entry, button
+        self.row_count_label.setText(str(self.model.rowCount()))
 
     def _modify_rows(self, mode: str):
         """修改行數"""
@@ -257,48 +341,6 @@ class MainEditorDialog(qtw.QDialog):
             return
 
         if mode == "add":
-            self._add_rows(n)
+            self.model.add_groups(n)
         elif mode == "delete":
-            self._delete_rows(n)
-
-        self._update_row_number()
-        self._update_row_count()
-
-    def _add_rows(self, n: int):
-        """新增行"""
-        for _ in range(n):
-            row_index = len(self.row_widgets_list)
-            
-            # 確保 filters_set 有足夠的元素
-            if len(self.filters_set) <= row_index:
-                self.filters_set.append("")
-
-            # 創建行元件
-            row_widget, label, entry, button = self._create_row_widget(row_index)
-            
-            # 添加到捲動佈局
-            self.scroll_layout.addWidget(row_widget)
-            
-            # 儲存參考
-            self.row_number_list.append(label)
-            self.second_limit_list.append(entry)
-            self.edit_filters_list.append(button)
-            self.row_widgets_list.append(row_widget)
-            self.next_row += 1
-
-    def _delete_rows(self, n: int):
-        """刪除行"""
-        for _ in range(min(n, len(self.row_widgets_list))):
-            # 從列表中移除
-            label = self.row_number_list.pop()
-            entry = self.second_limit_list.pop()
-            button = self.edit_filters_list.pop()
-            row_widget = self.row_widgets_list.pop()
-            
-            # 刪除元件
-            row_widget.deleteLater()
-            self.next_row -= 1
-        
-        # 清理 filters_set
-        while len(self.filters_set) > len(self.second_limit_list):
-            self.filters_set.pop()
+            self.model.delete_groups(n)
@@ -0,0 +1,243 @@
+"""
+融合單次掃描的 JIT 篩選後端 (選用 Numba)
+把位置組與號碼組設定編譯成查表陣列，每個組合只讀取一次，所有組別的命中數都在
+迴圈內以區域變數累計，只寫出最後的通過遮罩。未安裝 Numba 時改用 NumPy 版本
+"""
+
+import numpy as np
+from typing import List, Optional, Union
+from filters_function import FilterByPositions, FilterByCriteria, BuildLimitTable
+from utils import AllCombinations
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+JIT_AVAILABLE = numba is not None
+
+
+def _NumberTable(numbers: list) -> np.ndarray:
+    """號碼列表轉為長度40的查表，table[x] 表示號碼 x 是否在列表中"""
+    table = np.zeros(40, dtype=np.uint8)
+    numbers = [x for x in numbers if 0 <= x < 40]
+    table[numbers] = 1
+    return table
+
+
+def _ActiveGroups(filters_set: list, second_limit_set: list) -> list:
+    """與 OuterLayerFilter 相同：以 zip 對齊，略過沒有內層二次限定的組別"""
+    return [
+        (filters, inner_2lim)
+        for filters, inner_2lim in zip(filters_set, second_limit_set)
+        if inner_2lim
+    ]
+
+
+def CompilePositionalStage(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int], None]
+) -> tuple:
+    """
+    編譯位置組階段為查表陣列
+
+    Args:
+        filters_set: 位置篩選器集合列表
+        second_limit_set: 內部位置二次限定值列表
+        second_limit: 外層二次限定值
+
+    Returns:
+        (位置查表 (G, 5, 40), 內層限定查表 (G, 6), 外層限定查表 (G + 1,))
+    """
+    groups = _ActiveGroups(filters_set, second_limit_set)
+    position_tables = np.zeros((len(groups), 5, 40), dtype=np.uint8)
+    inner_tables = np.zeros((len(groups), 6), dtype=np.uint8)
+
+    for g, (filters, inner_2lim) in enumerate(groups):
+        # 與 PositionHits 相同，啟用的組別不足5個位置時引發 IndexError
+        for i in range(5):
+            position_tables[g, i] = _NumberTable(filters[i])
+        inner_tables[g] = BuildLimitTable(inner_2lim, 5)
+
+    outer_table = BuildLimitTable(second_limit, len(groups)).astype(np.uint8)
+    return position_tables, inner_tables, outer_table
+
+
+def CompileCriteriaStage(
+    filters_set: list,
+    second_limit_set: list,
+    second_limit: Union[int, range, List[int], None]
+) -> tuple:
+    """
+    編譯號碼組階段為查表陣列，所有組別的條件行攤平成一維
+
+    Args:
+        filters_set: 條件篩選器集合列表
+        second_limit_set: 內部條件二次限定值列表
+        second_limit: 外層二次限定值
+
+    Returns:
+        (號碼池查表 (L, 40), 命中範圍查表 (L, 6), 各組起始行 (G + 1,),
+         內層限定查表 (G, 最大行數 + 1), 外層限定查表 (G + 1,))
+    """
+    groups = _ActiveGroups(filters_set, second_limit_set)
+    line_count = sum(len(filters) for filters, _ in groups)
+    max_lines = max((len(filters) for filters, _ in groups), default=0)
+
+    pool_tables = np.zeros((line_count, 40), dtype=np.uint8)
+    range_tables = np.zeros((line_count, 6), dtype=np.uint8)
+    line_offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    inner_tables = np.zeros((len(groups), max_lines + 1), dtype=np.uint8)
+
+    line = 0
+    for g, (filters, inner_2lim) in enumerate(groups):
+        for (start, end), match_pool in filters:
+            pool_tables[line] = _NumberTable(match_pool)
+            range_tables[line] = BuildLimitTable(list(range(start, end + 1)), 5)
+            line += 1
+        line_offsets[g + 1] = line
+        inner_tables[g] = BuildLimitTable(inner_2lim, max_lines)
+
+    outer_table = BuildLimitTable(second_limit, len(groups)).astype(np.uint8)
+    return pool_tables, range_tables, line_offsets, inner_tables, outer_table
+
+
+def _FusedKernel(
+    combinations_array,
+    use_position_filter, position_tables, position_inner_tables, position_outer_table,
+    use_criteria_filter, pool_tables, range_tables, line_offsets, criteria_inner_tables,
+    criteria_outer_table,
+    valid_mask
+):
+    """逐一組合計算兩個階段，命中數只存在區域變數"""
+    for row in prange(combinations_array.shape[0]):
+        passed = True
+
+        if use_position_filter:
+            outer_hits = 0
+            for g in range(position_tables.shape[0]):
+                hits = 0
+                for i in range(5):
+                    hits += position_tables[g, i, combinations_array[row, i]]
+                outer_hits += position_inner_tables[g, hits]
+            passed = position_outer_table[outer_hits] != 0
+
+        if passed and use_criteria_filter:
+            outer_hits = 0
+            for g in range(line_offsets.shape[0] - 1):
+                hits = 0
+                for line in range(line_offsets[g], line_offsets[g + 1]):
+                    match_count = 0
+                    for i in range(5):
+                        match_count += pool_tables[line, combinations_array[row, i]]
+                    hits += range_tables[line, match_count]
+                outer_hits += criteria_inner_tables[g, hits]
+            passed = criteria_outer_table[outer_hits] != 0
+
+        valid_mask[row] = passed
+
+
+if JIT_AVAILABLE:
+    prange = numba.prange
+    _FusedKernel = numba.njit(parallel=True, cache=True, nogil=True)(_FusedKernel)
+else:
+    prange = range
+
+
+def FusedFilterMask(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int], None],
+    criteria_second_limit: Union[int, range, List[int], None],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    input_combinations: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    以融合迴圈計算兩階段篩選的通過遮罩，結果與依序套用 OuterLayerFilter 完全相同
+
+    Args:
+        use_position_filter: 是否使用位置篩選器
+        use_criteria_filter: 是否使用條件篩選器
+        positional_second_limit: 位置篩選器二次限定值
+        criteria_second_limit: 條件篩選器二次限定值
+        inner_positional_2lim: 內部位置二次限定值列表
+        inner_criteria_2lim: 內部條件二次限定值列表
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+        input_combinations: 輸入的組合陣列，預設為全部 C(39,5) 組合
+
+    Returns:
+        布林遮罩陣列，True表示通過篩選的組合
+    """
+    if input_combinations is None:
+        input_combinations = AllCombinations()
+    input_combinations = np.ascontiguousarray(input_combinations, dtype=np.uint8).reshape(-1, 5)
+
+    if not JIT_AVAILABLE:
+        return _NumpyFilterMask(
+            use_position_filter, use_criteria_filter,
+            positional_second_limit, criteria_second_limit,
+            inner_positional_2lim, inner_criteria_2lim,
+            positional_filter_data, criteria_filter_data,
+            input_combinations
+        )
+
+    # 只編譯啟用的階段，停用的階段傳入沒有組別的空查表
+    if use_position_filter:
+        positional_stage = CompilePositionalStage(
+            positional_filter_data, inner_positional_2lim, positional_second_limit
+        )
+    else:
+        positional_stage = CompilePositionalStage([], [], None)
+    if use_criteria_filter:
+        criteria_stage = CompileCriteriaStage(criteria_filter_data, inner_criteria_2lim, criteria_second_limit)
+    else:
+        criteria_stage = CompileCriteriaStage([], [], None)
+
+    valid_mask = np.empty(input_combinations.shape[0], dtype=np.bool_)
+    _FusedKernel(
+        input_combinations,
+        use_position_filter,
+        *positional_stage,
+        use_criteria_filter,
+        *criteria_stage,
+        valid_mask
+    )
+    return valid_mask
+
+
+def _NumpyFilterMask(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int], None],
+    criteria_second_limit: Union[int, range, List[int], None],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    input_combinations: np.ndarray
+) -> np.ndarray:
+    """未安裝 Numba 時的 NumPy 版本，各階段互相獨立，遮罩取交集即可"""
+    valid_mask = np.ones(input_combinations.shape[0], dtype=bool)
+    stages = (
+        (use_position_filter, positional_filter_data, inner_positional_2lim,
+         positional_second_limit, FilterByPositions),
+        (use_criteria_filter, criteria_filter_data, inner_criteria_2lim,
+         criteria_second_limit, FilterByCriteria),
+    )
+    for use_filter, filters_set, second_limit_set, second_limit, InnerLayerFilter in stages:
+        if not use_filter:
+            continue
+        hits = np.zeros(input_combinations.shape[0], dtype=int)
+        for filters, inner_2lim in _ActiveGroups(filters_set, second_limit_set):
+            hits += InnerLayerFilter(
+                filters=filters,
+                second_limit=inner_2lim,
+                input_combinations=input_combinations
+            )
+        valid_mask &= np.isin(hits, second_limit)
+    return valid_mask
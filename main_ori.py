@@ -3,15 +3,22 @@
 此檔案包含不使用GUI的命令列版本篩選邏輯
 """
 
-from itertools import combinations
 from filters_data import (
     positional_filters, 
-    inner_positional_2lim, 
+    inner_positional_2lim as inner_positional_2lim_str, 
     criteria_filters, 
-    inner_criteria_2lim
+    inner_criteria_2lim as inner_criteria_2lim_str
 )
-from filters_function import FilterByPositions, FilterByCriteria, OuterLayerFilter
-from utils import CountElement, CalculatePrize, Parse2LimitInput, ParseFiltertstrToList
+from core import CoreFunction
+from utils import Parse2LimitInput, ParseFiltertstrToList
+from coverage_analysis import SelectTickets, CoverageReport
+from preview import LimitPreview
+from result_store import ResultStore
+from export import DEFAULT_SEEN_PATH, ExportCombinations
+from sampling import SampleTickets, HotWeights, HitScores
+from ranking import ParseGroupWeights, TopKCombinations
+from estimate import ProgressiveEstimator, FormatEstimate
+from simulation import ParsePrizeTable, SimulateReturns, FormatSimulation
 
 
 def main():
@@ -23,7 +30,36 @@ def main():
     positional_second_limit = "3"
     criteria_second_limit = "a"
     show_top_n = 10
+    backend = "numpy"            # 計算方式："numpy"、"jit" (需安裝 Numba)、"batched"、"generate" 或 "bitslice"
+    filter_expression = ""       # 篩選式，有值時取代上方兩階段設定，例如 "(P:3 | C[1]:1) & !C[2]:0"
     winning_numbers = "6, 14, 24, 37, 38"
+    select_ticket_count = 0      # 涵蓋選號注數，0 表示不選號
+    select_objective = "pair"    # "pair"、"triple" 或 "prize"
+    select_seed = 0
+    show_coverage_report = False
+    list_uncovered_t = 0         # 列出未涵蓋的 t 碼子集合，0 表示不列出
+    show_sensitivity = False     # 逐組移除或放寬內層二次限定後的通過組合數 (不適用篩選式)
+    use_result_store = True      # 相同設定再次執行時直接讀取磁碟快取
+    show_diagnostics = False     # 輸出各組與兩階段的命中數直方圖 (會略過快取讀取)
+    export_path = ""             # 匯出通過組合的檔案路徑，留白表示不匯出，.gz 結尾時以 gzip 壓縮
+    export_format = "csv"        # "csv"、"tsv" 或 "ticket"
+    export_sort = None           # None、"lex" 或 "sum"
+    export_skip_seen = False     # 略過先前匯出過的組合
+    sample_size = 0              # 隨機抽樣注數，0 表示不抽樣
+    sample_weighting = "uniform" # "uniform"、"hot" (號碼熱度) 或 "score" (各組命中數總和)
+    sample_seed = 0
+    rank_top_k = 0               # 評分排名筆數，0 表示不排名
+    positional_group_weights = ""  # 位置組各組權重，例如 "2, 1"，留白表示全部為 1
+    criteria_group_weights = ""    # 號碼組各組權重
+    simulate_paths = 0           # 報酬模擬的資金路徑數，0 表示不模擬 (有抽樣時模擬抽樣結果，否則模擬全部通過組合)
+    simulate_horizon = 10000     # 每條路徑的期數
+    simulate_prize_table = ""    # 例如 "2:50, 3:300, 4:200000, 5:8000000"，留白為預設獎金表
+    simulate_ticket_cost = 50    # 每注成本
+    simulate_bankroll = None     # 起始本金，None 表示不限
+    simulate_jackpot_others = None  # 頭獎平分時其他頭獎注數的期望值，None 表示頭獎固定獎金
+    simulate_seed = 0            # 報酬模擬的亂數種子
+    estimate_sample_size = 0     # 抽樣估算的最大樣本數，0 表示不估算
+    estimate_only = False        # 只輸出估算結果，不執行完整篩選
 
     # ===== 資料轉換區 =====
     parsed_positional_filters = ParseFiltertstrToList(
@@ -45,67 +81,176 @@ def main():
     ) = Parse2LimitInput(
         positional_second_limit_str=positional_second_limit,
         criteria_second_limit_str=criteria_second_limit,
-        inner_positional_2lim_str=inner_positional_2lim,
-        inner_criteria_2lim_str=inner_criteria_2lim,
+        inner_positional_2lim_str=inner_positional_2lim_str,
+        inner_criteria_2lim_str=inner_criteria_2lim_str,
         positional_filters=parsed_positional_filters,
         criteria_filters=parsed_criteria_filters,
         winning_numbers_str=winning_numbers
     )
 
-    # ===== 產生所有 C(39,5) 組合 =====
-    combinations_all = list(combinations(range(1, 40), 5))
-    filtered = combinations_all
+    settings = dict(
+        use_position_filter=apply_position_filter,
+        use_criteria_filter=apply_criteria_filter,
+        positional_second_limit=positional_second_limit,
+        criteria_second_limit=criteria_second_limit,
+        inner_positional_2lim=inner_positional_2lim,
+        inner_criteria_2lim=inner_criteria_2lim,
+        positional_filter_data=parsed_positional_filters,
+        criteria_filter_data=parsed_criteria_filters,
+        filter_expression=filter_expression
+    )
+    # ===== 抽樣快速估算 (樣本逐步加倍) =====
+    if estimate_sample_size:
+        print("抽樣估算:")
+        estimator = ProgressiveEstimator(**settings, winning_numbers=winning_numbers)
+        for estimate in estimator.progressive():
+            value, low, high = estimate["pass_count"]
+            print(f"  樣本 {estimate['sample_size']:>7,}: 約 {value:,.0f} (95% 區間 {low:,.0f} ~ {high:,.0f})")
+            if estimate["sample_size"] >= estimate_sample_size:
+                break
+        print(FormatEstimate(estimate))
+        if estimate_only:
+            return
+        print()
 
-    # ===== 依序應用兩種篩選器邏輯 =====
-    if apply_position_filter:
-        filtered = OuterLayerFilter(
-            filters_set=parsed_positional_filters,
-            second_limit_set=inner_positional_2lim,
-            second_limit=positional_second_limit,
-            input_combinations=filtered,
-            InnerLayerFilter=FilterByPositions
-        )
-    
-    if apply_criteria_filter:
-        filtered = OuterLayerFilter(
-            filters_set=parsed_criteria_filters,
-            second_limit_set=inner_criteria_2lim,
-            second_limit=criteria_second_limit,
-            input_combinations=filtered,
-            InnerLayerFilter=FilterByCriteria
-        )
-    
-    # 統計篩選結果
-    result_crit = {
-        "valid_combinations": filtered, 
-        "valid_count": len(filtered), 
-        "filtered_count": 575757 - len(filtered)
-    }
-
-    # ===== 統計元素出現次數 =====
-    element_count = CountElement(filtered)
-
-    # ===== 計算獎金（比對中獎號碼） =====
-    prize_result = CalculatePrize(
-        winning_number=winning_numbers,
-        my_number=filtered
+    # ===== 依序應用兩種篩選器邏輯、統計與獎金 (已快取時直接讀取) =====
+    result = CoreFunction(
+        **settings,
+        winning_numbers=winning_numbers,
+        backend=backend,
+        result_store=ResultStore() if use_result_store else None,
+        diagnostics=show_diagnostics
     )
+    filtered = result.valid_combinations
 
     # ===== 顯示輸出結果 =====
-    print("通過組合數:", result_crit["valid_count"])
-    print("被篩掉組合數:", result_crit["filtered_count"])
+    print("通過組合數:", result.valid_count)
+    print("被篩掉組合數:", result.filtered_count)
     
     print(f"\n前 {show_top_n} 筆通過組合:")
-    for combo in result_crit["valid_combinations"][:show_top_n]:
+    for combo in filtered[:show_top_n].tolist():
         print(combo)
 
+    if result.diagnostics_text:
+        print("\n命中數分布:")
+        print(result.diagnostics_text)
+
     print("\n元素出現次數 (依頻率排序):")
-    print(element_count)
+    print(result.hot_numbers)
+
+    if result.prize_info:
+        print("\n獎金統計:")
+        print("總獎金：", result.prize_info["total_prize"])
+        for k, v in result.prize_info["detail_number"].items():
+            print(k, ":", v)
+
+    print("\n各步驟耗時:")
+    for step, seconds in result.timings.items():
+        print(f"  {step}: {seconds * 1000:.1f} ms")
+
+    # ===== 匯出通過組合 =====
+    if export_path:
+        exported = ExportCombinations(
+            passed_combinations=filtered,
+            path=export_path,
+            export_format=export_format,
+            sort=export_sort,
+            seen_path=DEFAULT_SEEN_PATH if export_skip_seen else None
+        )
+        print(f"\n已匯出 {exported} 組合至 {export_path}")
 
-    print("\n獎金統計:")
-    print("總獎金：", prize_result["total_prize"])
-    for k, v in prize_result["detail_number"].items():
-        print(k, ":", v)
+    # ===== 隨機抽樣 =====
+    if sample_size > 0 and len(filtered):
+        weights = None
+        if sample_weighting == "hot":
+            weights = HotWeights(filtered)
+        elif sample_weighting == "score":
+            weights = HitScores(LimitPreview(parsed_positional_filters, parsed_criteria_filters), filtered)
+        sampled = SampleTickets(passed_combinations=filtered, sample_size=sample_size, weights=weights, seed=sample_seed)
+        print(f"\n隨機抽樣 ({sample_weighting}, {len(sampled)} 注):")
+        for combo in sampled.tolist():
+            print(combo)
+
+    # ===== 報酬模擬 =====
+    if simulate_paths > 0 and len(filtered):
+        tickets = sampled if sample_size > 0 else filtered
+        simulation_result = SimulateReturns(
+            tickets=tickets,
+            paths=simulate_paths,
+            horizon=simulate_horizon,
+            prize_table=ParsePrizeTable(simulate_prize_table),
+            ticket_cost=simulate_ticket_cost,
+            bankroll=simulate_bankroll,
+            jackpot_others_mean=simulate_jackpot_others,
+            seed=simulate_seed
+        )
+        print("\n報酬模擬:")
+        print(FormatSimulation(simulation_result))
+
+    # ===== 評分排名 =====
+    if rank_top_k > 0 and len(filtered):
+        ranked, scores = TopKCombinations(
+            input_combinations=filtered,
+            top_k=rank_top_k,
+            positional_filter_data=parsed_positional_filters,
+            criteria_filter_data=parsed_criteria_filters,
+            positional_weights=ParseGroupWeights(positional_group_weights, len(parsed_positional_filters)),
+            criteria_weights=ParseGroupWeights(criteria_group_weights, len(parsed_criteria_filters))
+        )
+        print(f"\n評分排名 (前 {len(ranked)} 注):")
+        for combo, score in zip(ranked.tolist(), scores.tolist()):
+            print(f"{score:g}", combo)
+
+    # ===== 涵蓋選號 =====
+    if select_ticket_count > 0 and len(filtered):
+        selected, coverage_info = SelectTickets(
+            passed_combinations=filtered,
+            ticket_count=select_ticket_count,
+            objective=select_objective,
+            seed=select_seed
+        )
+        print(f"\n涵蓋選號 ({select_objective}, {len(selected)} 注):")
+        for t, (covered, total) in coverage_info.items():
+            print(f"{t} 碼涵蓋: {covered} / {total}")
+        for combo in selected.tolist():
+            print(combo)
+
+    # ===== 涵蓋分析 =====
+    if show_coverage_report and len(filtered):
+        report = CoverageReport(
+            passed_combinations=filtered,
+            list_uncovered=(list_uncovered_t,) if list_uncovered_t else ()
+        )
+        print("\n涵蓋分析:")
+        for t, info in report.items():
+            print(
+                f"{t} 碼: {info['covered']} / {info['total']} ({info['ratio']:.2%})，"
+                f"開獎至少一注中 {t} 碼比例 {info['draw_ratio']:.2%}"
+            )
+        if list_uncovered_t:
+            print(f"未涵蓋的 {list_uncovered_t} 碼子集合:")
+            for subset in report[list_uncovered_t]["uncovered"].tolist():
+                print(subset)
+
+    # ===== 敏感度分析 =====
+    if show_sensitivity and not filter_expression:
+        baseline, report = LimitPreview(
+            positional_filter_data=parsed_positional_filters,
+            criteria_filter_data=parsed_criteria_filters
+        ).sensitivity(
+            use_position_filter=apply_position_filter,
+            use_criteria_filter=apply_criteria_filter,
+            positional_second_limit=positional_second_limit,
+            criteria_second_limit=criteria_second_limit,
+            inner_positional_2lim=inner_positional_2lim,
+            inner_criteria_2lim=inner_criteria_2lim
+        )
+        print(f"\n敏感度分析 (目前通過 {baseline}):")
+        for row in report:
+            print(
+                f"{row['stage']} 第 {row['group']} 組: 移除後 {row['drop_count']}，"
+                f"放寬一格後 {row['widen_count']}"
+            )
 
 
 if __name__ == "__main__":
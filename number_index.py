@@ -0,0 +1,224 @@
+"""
+號碼反向索引
+每個號碼 1~39 對應包含它的所有組合排名 (遞增排列)，建立一次後存成 .npy 並以
+記憶體映射讀取 (無法寫入時改用記憶體中的索引)。號碼池較短時，把池中各號碼的排名列表逐一累加到全部組合的計數陣列，
+即可得到每個組合的命中數，不必對全部組合逐一比對；每條條件行依估計成本選擇
+索引或逐列比對
+"""
+
+import os
+import tempfile
+from functools import lru_cache
+from math import comb
+from typing import List, Optional, Union
+
+import numpy as np
+from utils import AllCombinations, CombinationRank
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".number_index.npy")
+POSTING_LENGTH = comb(38, 4)  # 包含某一個號碼的組合數
+
+# 成本估計的相對權重 (約略與實測的每筆耗時成正比)
+_DENSE_COST = 20   # 逐列以查表計算一條號碼池的命中數，每列
+_SCATTER_COST = 3  # 排名列表累加到計數陣列，每筆
+_GATHER_COST = 1   # 依排名讀出命中數，每列
+_RANK_COST = 40    # 計算輸入組合的排名 (同一組的所有號碼池共用)，每列
+
+
+def _ComputeNumberIndex() -> np.ndarray:
+    """
+    在記憶體中計算號碼反向索引
+
+    Returns:
+        形狀為 (39, POSTING_LENGTH) 的 uint32 陣列，第 x - 1 列為包含號碼 x 的組合排名
+    """
+    all_combinations = AllCombinations()
+    # 全部組合依字典序排列，列號即為排名，flatnonzero 的結果已遞增
+    index = np.empty((39, POSTING_LENGTH), dtype=np.uint32)
+    for x in range(1, 40):
+        index[x - 1] = np.flatnonzero((all_combinations == x).any(axis=1))
+    return index
+
+
+def _WriteNumberIndex(index: np.ndarray, path: str) -> None:
+    """
+    把索引寫入檔案：先寫入同目錄下名稱不重複的暫存檔再取代，避免中斷時留下不完整的索引，
+    多個行程同時建立時也不會互相覆寫暫存檔
+
+    Raises:
+        OSError: 無法寫入時 (例如唯讀目錄)
+    """
+    temp_file = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=os.path.basename(path) + ".",
+        suffix=".tmp",
+        delete=False
+    )
+    try:
+        with temp_file:
+            np.save(temp_file, index)
+        os.replace(temp_file.name, path)
+    except BaseException:
+        try:
+            os.remove(temp_file.name)
+        except OSError:
+            pass
+        raise
+
+
+def BuildNumberIndex(path: str = DEFAULT_INDEX_PATH) -> np.ndarray:
+    """
+    建立號碼反向索引並寫入檔案
+
+    Args:
+        path: 索引檔路徑
+
+    Returns:
+        形狀為 (39, POSTING_LENGTH) 的 uint32 陣列，第 x - 1 列為包含號碼 x 的組合排名
+
+    Raises:
+        OSError: 無法寫入索引檔時
+    """
+    index = _ComputeNumberIndex()
+    _WriteNumberIndex(index, path)
+    return index
+
+
+@lru_cache(maxsize=4)
+def NumberIndex(path: str = DEFAULT_INDEX_PATH) -> np.ndarray:
+    """
+    讀取號碼反向索引 (記憶體映射，唯讀)，檔案不存在或損壞時重新建立；
+    無法寫入索引檔時 (例如唯讀的安裝目錄) 改用記憶體中的索引
+
+    Args:
+        path: 索引檔路徑
+
+    Returns:
+        形狀為 (39, POSTING_LENGTH) 的唯讀 uint32 陣列
+    """
+    try:
+        index = np.load(path, mmap_mode="r")
+        if index.shape == (39, POSTING_LENGTH) and index.dtype == np.uint32:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    index = _ComputeNumberIndex()
+    try:
+        _WriteNumberIndex(index, path)
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        index.setflags(write=False)
+        return index
+
+
+def _IsUniverse(input_combinations: np.ndarray) -> bool:
+    """輸入是否就是依字典序排列的全部組合 (排名等於列號)，副本、切片或其他型別也適用"""
+    all_combinations = AllCombinations()
+    if input_combinations is all_combinations:
+        return True
+    # 列數或首尾列不同即可排除，其餘情況再完整比對 (約 1 毫秒，遠少於計算排名)
+    return (
+        input_combinations.shape == all_combinations.shape
+        and np.array_equal(input_combinations[[0, -1]], all_combinations[[0, -1]])
+        and np.array_equal(input_combinations, all_combinations)
+    )
+
+
+def ChooseIndexPools(pool_sizes: List[int], row_count: int, universe: bool = False) -> List[bool]:
+    """
+    依估計成本決定每個號碼池走索引或逐列查表
+
+    逐列查表的成本與輸入組合數成正比、與池大小無關；索引的成本與池大小成正比，
+    另外需依排名讀出命中數。輸入不是全部組合時還需先計算一次排名，
+    只有走索引省下的成本足以抵銷時才使用索引
+
+    Args:
+        pool_sizes: 各號碼池內 (不重複、1~39) 的號碼數
+        row_count: 輸入組合數
+        universe: 輸入是否為全部組合 (不需計算排名)
+
+    Returns:
+        與 pool_sizes 等長的布林列表，True 表示該號碼池走索引
+    """
+    dense_cost = _DENSE_COST * row_count
+    savings = [
+        dense_cost - (_SCATTER_COST * pool_size * POSTING_LENGTH + _GATHER_COST * row_count)
+        if pool_size else 0
+        for pool_size in pool_sizes
+    ]
+    use_index = [saving > 0 for saving in savings]
+    if not universe and sum(saving for saving in savings if saving > 0) <= _RANK_COST * row_count:
+        return [False] * len(pool_sizes)
+    return use_index
+
+
+def IndexedCriteriaHits(
+    filters: list,
+    input_combinations: np.ndarray,
+    index_path: str = DEFAULT_INDEX_PATH
+) -> np.ndarray:
+    """
+    計算號碼組命中數，結果與 CriteriaHits 相同
+
+    Args:
+        filters: 條件篩選器資料，包含(範圍, 號碼池)的元組列表
+        input_combinations: 輸入的組合陣列
+        index_path: 索引檔路徑
+
+    Returns:
+        每個組合符合的條件行數
+    """
+    input_combinations = np.atleast_2d(input_combinations)
+    row_count = input_combinations.shape[0]
+    hits = np.zeros(row_count, dtype=int)
+
+    pools = [sorted({x for x in match_pool if 1 <= x <= 39}) for _, match_pool in filters]
+    universe = _IsUniverse(input_combinations)
+    use_index = ChooseIndexPools([len(pool) for pool in pools], row_count, universe)
+
+    if any(use_index):
+        index = NumberIndex(index_path)
+        counts = np.zeros(AllCombinations().shape[0], dtype=np.uint8)
+        ranks = None if universe else CombinationRank(input_combinations)
+    if not all(use_index):
+        lookup_input = input_combinations.astype(np.intp)
+
+    for ((start, end), _), pool, indexed in zip(filters, pools, use_index):
+        if indexed:
+            # 同一號碼的排名不重複，可直接以索引累加
+            counts.fill(0)
+            for x in pool:
+                counts[index[x - 1]] += 1
+            match_count = counts if universe else counts[ranks]
+        else:
+            pool_table = np.zeros(40, dtype=np.uint8)
+            pool_table[pool] = 1
+            match_count = pool_table[lookup_input].sum(axis=1, dtype=np.uint8)
+        hits += (match_count >= start) & (match_count <= end)
+
+    return hits
+
+
+def IndexedFilterByCriteria(
+    filters: list,
+    second_limit: Union[int, range, List[int]],
+    input_combinations: np.ndarray,
+    hit_counts: Optional[list] = None
+) -> np.ndarray:
+    """
+    號碼組合過濾，可直接取代 FilterByCriteria 作為 OuterLayerFilter 的內層篩選函數
+
+    Args:
+        filters: 條件篩選器資料，包含(範圍, 號碼池)的元組列表
+        second_limit: 二次限定值，可以是整數、範圍或列表
+        input_combinations: 輸入的組合陣列
+        hit_counts: 若提供列表，會附加本組命中數 (0~條件行數) 的直方圖
+
+    Returns:
+        布林遮罩陣列，True表示通過篩選的組合
+    """
+    hits = IndexedCriteriaHits(filters, input_combinations)
+    if hit_counts is not None:
+        hit_counts.append(np.bincount(hits, minlength=len(filters) + 1))
+    return np.isin(hits, second_limit)
@@ -0,0 +1,355 @@
+"""
+二次限定即時預覽
+先以一次基準計算保存每一組在全部組合上的命中數，之後調整二次限定時只需查表與
+重新統計直方圖，不必重新執行篩選器
+"""
+
+import numpy as np
+from typing import Callable, List, Optional, Union
+from filters_function import PositionHits, BuildLimitTable
+from number_index import IndexedCriteriaHits
+from utils import AllCombinations
+
+
+class StageHits:
+    """單一篩選階段 (位置組或號碼組) 在全部組合上的命中數快取"""
+
+    def __init__(self, filters_set: list, InnerLayerHits: Callable, max_inner_hits: Callable):
+        """
+        Args:
+            filters_set: 已解析的篩選器集合列表
+            InnerLayerHits: 內層命中數函數 (PositionHits 或 IndexedCriteriaHits)
+            max_inner_hits: 依篩選器資料回傳該組命中數上限的函數
+        """
+        self.filters_set = filters_set
+        self.InnerLayerHits = InnerLayerHits
+        self.group_max_hits = [max_inner_hits(filters) if filters else 0 for filters in filters_set]
+        self.group_filled = [bool(filters) for filters in filters_set]
+        # 各組命中數在第一次需要時才計算，停用的階段與未設定內層限定的組別不必計算
+        self._group_hits: List[Optional[np.ndarray]] = [None] * len(filters_set)
+
+        self.outer_hits = np.zeros(AllCombinations().shape[0], dtype=np.uint16)
+        self._inner_limits: List[Optional[list]] = [None] * len(filters_set)
+        self._group_masks: List[Optional[np.ndarray]] = [None] * len(filters_set)
+        self.version = 0
+
+    @property
+    def group_count(self) -> int:
+        """篩選器組數"""
+        return len(self.filters_set)
+
+    def hits(self, i: int) -> np.ndarray:
+        """
+        第 i 組在全部組合上的命中數，第一次呼叫時計算並保存
+
+        Args:
+            i: 組別索引
+
+        Returns:
+            對應 AllCombinations() 的命中數陣列，沒有篩選器的組別全為 0
+
+        Raises:
+            IndexError: 位置篩選器不足 5 行時 (同 PositionHits)
+        """
+        if self._group_hits[i] is None:
+            all_combinations = AllCombinations()
+            dtype = np.uint8 if self.group_max_hits[i] < 256 else np.uint16
+            if self.filters_set[i]:
+                self._group_hits[i] = self.InnerLayerHits(self.filters_set[i], all_combinations).astype(dtype)
+            else:
+                self._group_hits[i] = np.zeros(all_combinations.shape[0], dtype=dtype)
+        return self._group_hits[i]
+
+    def set_inner_limits(self, inner_limits: list) -> None:
+        """
+        更新內層二次限定，只重新計算有變動的組別
+
+        Args:
+            inner_limits: 內部二次限定值列表，空值表示略過該組 (同 OuterLayerFilter)
+        """
+        # OuterLayerFilter 以 zip 對齊，超出長度的組別視為略過
+        inner_limits = list(inner_limits[:self.group_count])
+        inner_limits += [None] * (self.group_count - len(inner_limits))
+
+        for i, inner_2lim in enumerate(inner_limits):
+            inner_2lim = list(inner_2lim) if inner_2lim else None
+            if inner_2lim == self._inner_limits[i]:
+                continue
+
+            old_mask = self._group_masks[i]
+            if old_mask is not None:
+                self.outer_hits -= old_mask
+
+            new_mask = None
+            if inner_2lim:
+                table = BuildLimitTable(inner_2lim, self.group_max_hits[i])
+                new_mask = table[self.hits(i)]
+                self.outer_hits += new_mask
+
+            self._inner_limits[i] = inner_2lim
+            self._group_masks[i] = new_mask
+            self.version += 1
+
+    def outer_histogram(self) -> np.ndarray:
+        """
+        外層命中數直方圖
+
+        Returns:
+            長度為 組數 + 1 的陣列，第 h 格為外層命中 h 組的組合數
+        """
+        return np.bincount(self.outer_hits, minlength=self.group_count + 1)
+
+
+def _DropLimit(second_limit: Union[int, range, List[int], None], remaining: int) -> list:
+    """
+    移除一組後的外層限定：超過剩餘組數的值改為剩餘組數，
+    因此 "a" (全部組別，解析為 [組數]) 移除一組後仍表示剩下的全部組別
+
+    Args:
+        second_limit: 外層二次限定值
+        remaining: 移除後有篩選器的組數 (與 ParseTextToList 解析 "a" 的組數相同)
+
+    Returns:
+        移除後的外層限定值列表
+    """
+    if second_limit is None:
+        return []
+    if isinstance(second_limit, (int, np.integer)):
+        second_limit = [second_limit]
+    return sorted({min(int(value), remaining) for value in second_limit})
+
+
+def _WidenLimit(inner_2lim: list) -> list:
+    """內層限定往兩側各放寬一格"""
+    return sorted(set(inner_2lim) | {min(inner_2lim) - 1, max(inner_2lim) + 1})
+
+
+class LimitPreview:
+    """位置組與號碼組二次限定的通過組合數預覽"""
+
+    def __init__(self, positional_filter_data: list, criteria_filter_data: list):
+        """
+        Args:
+            positional_filter_data: 已解析的位置篩選器資料
+            criteria_filter_data: 已解析的條件篩選器資料
+        """
+        self.positional_filter_data = positional_filter_data
+        self.criteria_filter_data = criteria_filter_data
+        self.positional = StageHits(
+            filters_set=positional_filter_data,
+            InnerLayerHits=PositionHits,
+            max_inner_hits=lambda filters: 5
+        )
+        self.criteria = StageHits(
+            filters_set=criteria_filter_data,
+            InnerLayerHits=IndexedCriteriaHits,
+            max_inner_hits=len
+        )
+        self._joint_histogram: Optional[np.ndarray] = None
+        self._joint_version = (-1, -1)
+
+    def joint_histogram(self) -> np.ndarray:
+        """
+        兩階段外層命中數的聯合直方圖，只在內層限定改變時重算
+
+        Returns:
+            形狀為 (位置組數 + 1, 號碼組數 + 1) 的陣列
+        """
+        version = (self.positional.version, self.criteria.version)
+        if version != self._joint_version:
+            width = self.criteria.group_count + 1
+            flat_index = self.positional.outer_hits.astype(np.intp) * width + self.criteria.outer_hits
+            self._joint_histogram = np.bincount(
+                flat_index,
+                minlength=(self.positional.group_count + 1) * width
+            ).reshape(-1, width)
+            self._joint_version = version
+        return self._joint_histogram
+
+    def pass_count(
+        self,
+        use_position_filter: bool,
+        use_criteria_filter: bool,
+        positional_second_limit: Union[int, range, List[int], None],
+        criteria_second_limit: Union[int, range, List[int], None],
+        inner_positional_2lim: list,
+        inner_criteria_2lim: list
+    ) -> int:
+        """
+        計算目前二次限定下的通過組合數，結果與 CoreFunction 的 valid_count 相同
+
+        Args:
+            use_position_filter: 是否使用位置篩選器
+            use_criteria_filter: 是否使用條件篩選器
+            positional_second_limit: 位置篩選器二次限定值
+            criteria_second_limit: 條件篩選器二次限定值
+            inner_positional_2lim: 內部位置二次限定值列表
+            inner_criteria_2lim: 內部條件二次限定值列表
+
+        Returns:
+            通過組合數
+        """
+        self._set_inner_limits(use_position_filter, use_criteria_filter, inner_positional_2lim, inner_criteria_2lim)
+        joint = self.joint_histogram()
+        positional_table, criteria_table = self._outer_tables(
+            use_position_filter, use_criteria_filter, positional_second_limit, criteria_second_limit
+        )
+        return int(joint[positional_table][:, criteria_table].sum())
+
+    def pass_mask(
+        self,
+        use_position_filter: bool,
+        use_criteria_filter: bool,
+        positional_second_limit: Union[int, range, List[int], None],
+        criteria_second_limit: Union[int, range, List[int], None],
+        inner_positional_2lim: list,
+        inner_criteria_2lim: list
+    ) -> np.ndarray:
+        """
+        由保存的命中數直接算出通過遮罩，參數同 pass_count
+
+        Returns:
+            對應 AllCombinations() 的布林遮罩陣列
+        """
+        self._set_inner_limits(use_position_filter, use_criteria_filter, inner_positional_2lim, inner_criteria_2lim)
+        positional_table, criteria_table = self._outer_tables(
+            use_position_filter, use_criteria_filter, positional_second_limit, criteria_second_limit
+        )
+        return positional_table[self.positional.outer_hits] & criteria_table[self.criteria.outer_hits]
+
+    def _set_inner_limits(
+        self,
+        use_position_filter: bool,
+        use_criteria_filter: bool,
+        inner_positional_2lim: list,
+        inner_criteria_2lim: list
+    ) -> None:
+        """
+        只更新使用中階段的內層限定；未使用的階段外層查表全部通過，
+        其外層命中數不影響結果，因此不必計算 (同 CoreFunction 不執行該階段)
+        """
+        if use_position_filter:
+            self.positional.set_inner_limits(inner_positional_2lim)
+        if use_criteria_filter:
+            self.criteria.set_inner_limits(inner_criteria_2lim)
+
+    def _outer_tables(
+        self,
+        use_position_filter: bool,
+        use_criteria_filter: bool,
+        positional_second_limit: Union[int, range, List[int], None],
+        criteria_second_limit: Union[int, range, List[int], None]
+    ) -> tuple:
+        """兩階段外層限定查表，未使用的階段全部通過"""
+        positional_table = (
+            BuildLimitTable(positional_second_limit, self.positional.group_count)
+            if use_position_filter else np.ones(self.positional.group_count + 1, dtype=bool)
+        )
+        criteria_table = (
+            BuildLimitTable(criteria_second_limit, self.criteria.group_count)
+            if use_criteria_filter else np.ones(self.criteria.group_count + 1, dtype=bool)
+        )
+        return positional_table, criteria_table
+
+    def sensitivity(
+        self,
+        use_position_filter: bool,
+        use_criteria_filter: bool,
+        positional_second_limit: Union[int, range, List[int], None],
+        criteria_second_limit: Union[int, range, List[int], None],
+        inner_positional_2lim: list,
+        inner_criteria_2lim: list,
+        chunk_groups: int = 32
+    ) -> tuple:
+        """
+        逐組敏感度分析：移除該組、或把該組內層限定放寬一格 (加入最小值 - 1 與最大值 + 1)
+        之後的通過組合數，參數同 pass_count
+
+        移除一組等同於以少一組的設定重新執行：外層限定依 _DropLimit 調整為剩餘組數
+        ("a" 變為剩下的全部組別，超過剩餘組數的數值改為剩餘組數)，結果與移除該組後
+        重新解析限定並執行 CoreFunction 相同。外層命中數 H 只會因該組遮罩 M 改變一格，因此
+        移除後通過數 = sum(O & T'[H]) + M · (O & T'[H - 1] - O & T'[H])，
+        放寬後通過數 = 基準 + A · (O & T[H + 1] - O & T[H])，
+        其中 O 為另一階段通過遮罩、T 為外層限定查表、T' 為移除後的外層限定查表、
+        A 為放寬後新增的通過遮罩；多組遮罩疊成矩陣後以一次矩陣乘法算出
+
+        Args:
+            chunk_groups: 每次疊成矩陣的組數，用來限制記憶體
+
+        Returns:
+            (基準通過組合數, 依影響程度排序的列表，每筆為
+             {"stage", "group", "drop_count", "widen_count"})
+        """
+        baseline = self.pass_count(
+            use_position_filter, use_criteria_filter,
+            positional_second_limit, criteria_second_limit,
+            inner_positional_2lim, inner_criteria_2lim
+        )
+        positional_table, criteria_table = self._outer_tables(
+            use_position_filter, use_criteria_filter, positional_second_limit, criteria_second_limit
+        )
+        positional_pass = positional_table[self.positional.outer_hits]
+        criteria_pass = criteria_table[self.criteria.outer_hits]
+
+        stages = []
+        if use_position_filter:
+            stages.append(("position", self.positional, positional_second_limit, criteria_pass))
+        if use_criteria_filter:
+            stages.append(("criteria", self.criteria, criteria_second_limit, positional_pass))
+
+        report = []
+        for stage_name, stage, second_limit, other_pass in stages:
+            # 外層限定查表往兩側各多一格，T[H - 1] 以 shifted[H] 取得
+            hits = stage.outer_hits
+            table = BuildLimitTable(second_limit, stage.group_count + 1)
+            current = other_pass & table[hits]
+            widen_change = (other_pass & table[hits + 1]).astype(np.float32) - current
+
+            # 移除的組別有無篩選器會影響剩餘組數，各自建立移除後的查表
+            filled_count = sum(stage.group_filled)
+            drop_terms = {}
+            for remaining in {filled_count - stage.group_filled[i] for i in range(stage.group_count)}:
+                drop_table = BuildLimitTable(_DropLimit(second_limit, remaining), stage.group_count + 1)
+                drop_shifted = np.concatenate(([False], drop_table[:-1]))
+                drop_current = other_pass & drop_table[hits]
+                drop_terms[remaining] = (
+                    int(np.count_nonzero(drop_current)),
+                    (other_pass & drop_shifted[hits]).astype(np.float32) - drop_current,
+                )
+
+            active = [i for i in range(stage.group_count) if stage._group_masks[i] is not None]
+            for first in range(0, len(active), chunk_groups):
+                chunk = active[first:first + chunk_groups]
+                masks = np.array([stage._group_masks[i] for i in chunk], dtype=np.float32)
+                added = np.array([
+                    BuildLimitTable(_WidenLimit(stage._inner_limits[i]), stage.group_max_hits[i])[stage.hits(i)]
+                    & ~stage._group_masks[i]
+                    for i in chunk
+                ], dtype=np.float32)
+                widen_delta = added @ widen_change
+                drop_counts = np.zeros(len(chunk), dtype=np.int64)
+                for remaining, (drop_base, drop_change) in drop_terms.items():
+                    rows = [k for k, i in enumerate(chunk) if filled_count - stage.group_filled[i] == remaining]
+                    if rows:
+                        drop_counts[rows] = drop_base + np.rint(masks[rows] @ drop_change).astype(np.int64)
+                for i, drop_count, widen in zip(chunk, drop_counts, widen_delta):
+                    report.append({
+                        "stage": stage_name,
+                        "group": i + 1,
+                        "drop_count": int(drop_count),
+                        "widen_count": baseline + int(round(widen)),
+                    })
+
+        report.sort(key=lambda row: max(abs(row["drop_count"] - baseline), abs(row["widen_count"] - baseline)),
+                    reverse=True)
+        return baseline, report
+
+    @property
+    def nbytes(self) -> int:
+        """目前已計算的命中數陣列佔用的記憶體 (隨使用的組別增加)"""
+        return sum(
+            array.nbytes
+            for stage in (self.positional, self.criteria)
+            for array in stage._group_hits + stage._group_masks + [stage.outer_hits]
+            if array is not None
+        )
@@ -0,0 +1,204 @@
+"""
+組合評分排名
+以各組命中數的加權總和為分數，命中數以號碼查表計算；分段計算後以部分排序
+(np.partition) 保留目前最高的 K 筆，只對最後的 K 筆排序，不需要排序全部分數
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+
+def ParseGroupWeights(weights_str: str, group_count: int) -> List[float]:
+    """
+    解析組別權重 (str -> list)，留白表示全部為 1，單一數值套用到所有組別，
+    逗號分隔時依序對應各組，不足的組別為 1
+
+    Args:
+        weights_str: 權重文字，例如 "2" 或 "1, 0.5, 3"
+        group_count: 組數
+
+    Returns:
+        長度為 group_count 的權重列表
+
+    Raises:
+        ValueError: 當格式錯誤或數量超過組數時
+    """
+    try:
+        weights_str = weights_str.strip()
+        if not weights_str:
+            return [1] * group_count
+        weights = [float(text) if "." in text else int(text) for text in weights_str.split(",")]
+    except Exception as e:
+        raise ValueError(f"權重格式錯誤: {e}")
+
+    if len(weights) == 1:
+        return weights * group_count
+    if len(weights) > group_count:
+        raise ValueError(f"權重數量 ({len(weights)}) 超過組數 ({group_count})")
+    return weights + [1] * (group_count - len(weights))
+
+
+def _ScoreTables(
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    positional_weights: list,
+    criteria_weights: list
+) -> tuple:
+    """
+    把所有組別的權重合併成查表
+
+    位置組分數 = sum_g w_g * sum_i T_g[i, x_i] = sum_i W[i, x_i]，W 為各組位置查表的加權和；
+    號碼組分數 = 各條件行是否成立乘上所屬組別權重的總和，所有號碼池疊成一個指示矩陣
+
+    Returns:
+        (位置權重查表 (5, 40), 號碼池指示矩陣 (40, L), 各行命中範圍 (L, 2), 各行權重 (L,), 分數型別)
+    """
+    position_groups = [
+        (filters, weight)
+        for filters, weight in zip(positional_filter_data, positional_weights)
+        if filters and weight
+    ]
+    criteria_groups = [
+        (filters, weight)
+        for filters, weight in zip(criteria_filter_data, criteria_weights)
+        if filters and weight
+    ]
+
+    # 整數權重時依分數可能的範圍選用最小的整數型別，否則使用 float32
+    weights = [weight for _, weight in position_groups + criteria_groups]
+    if all(isinstance(weight, (int, np.integer)) for weight in weights):
+        bound = sum(abs(weight) * 5 for _, weight in position_groups)
+        bound += sum(abs(weight) * len(filters) for filters, weight in criteria_groups)
+        dtype = next(
+            dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+            if bound <= np.iinfo(dtype).max
+        )
+    else:
+        dtype = np.float32
+
+    position_table = np.zeros((5, 40), dtype=dtype)
+    for filters, weight in position_groups:
+        for i in range(5):
+            position_table[i, [x for x in set(filters[i]) if 0 <= x < 40]] += weight
+
+    lines = [
+        (match_range, match_pool, weight)
+        for filters, weight in criteria_groups
+        for match_range, match_pool in filters
+    ]
+    pool_matrix = np.zeros((40, len(lines)), dtype=np.float32)
+    for line, (_, match_pool, _) in enumerate(lines):
+        pool_matrix[[x for x in match_pool if 0 <= x < 40], line] = 1
+    ranges = np.array([match_range for match_range, _, _ in lines], dtype=np.float32).reshape(-1, 2)
+    line_weights = np.array([weight for _, _, weight in lines], dtype=dtype)
+    return position_table, pool_matrix, ranges, line_weights, dtype
+
+
+def ScoreCombinations(
+    input_combinations: np.ndarray,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    positional_weights: list,
+    criteria_weights: list
+) -> np.ndarray:
+    """
+    計算每個組合的分數 = sum(組別權重 * 該組命中數)
+
+    Args:
+        input_combinations: 形狀為 (N, 5) 的組合陣列
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+        positional_weights: 位置組各組權重
+        criteria_weights: 號碼組各組權重
+
+    Returns:
+        分數陣列 (整數權重時為足以容納的最小整數型別，否則為 float32)
+    """
+    position_table, pool_matrix, ranges, line_weights, dtype = _ScoreTables(
+        positional_filter_data, criteria_filter_data, positional_weights, criteria_weights
+    )
+    input_combinations = np.asarray(input_combinations).reshape(-1, 5).astype(np.intp)
+    scores = position_table[np.arange(5), input_combinations].sum(axis=1, dtype=dtype)
+
+    if line_weights.shape[0]:
+        # 所有號碼池的命中數：(N, 40) @ (40, L)
+        one_hot = np.zeros((input_combinations.shape[0], 40), dtype=np.float32)
+        np.put_along_axis(one_hot, input_combinations, 1, axis=1)
+        match_count = one_hot @ pool_matrix
+        line_pass = (match_count >= ranges[:, 0]) & (match_count <= ranges[:, 1])
+        scores += (line_pass * line_weights).sum(axis=1, dtype=dtype)
+    return scores
+
+
+def TopKCombinations(
+    input_combinations,
+    top_k: int,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    positional_weights: Optional[list] = None,
+    criteria_weights: Optional[list] = None,
+    chunk_rows: int = 65536
+) -> tuple:
+    """
+    分段計算分數並保留最高的 K 筆
+
+    每段分數與目前的前 K 名合併後，以部分排序重新取前 K 名，
+    記憶體只需一段分數加上 K 筆候選
+
+    Args:
+        input_combinations: 要評分的組合列表或陣列 (例如通過組合)
+        top_k: 保留筆數
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+        positional_weights: 位置組各組權重，None 表示全部為 1
+        criteria_weights: 號碼組各組權重，None 表示全部為 1
+        chunk_rows: 每段處理的組合數
+
+    Returns:
+        (前 K 名組合 (K, 5), 對應分數)，依分數由高到低排列，同分時維持輸入順序
+    """
+    input_combinations = np.asarray(input_combinations, dtype=np.uint8).reshape(-1, 5)
+    if positional_weights is None:
+        positional_weights = [1] * len(positional_filter_data)
+    if criteria_weights is None:
+        criteria_weights = [1] * len(criteria_filter_data)
+    top_k = min(top_k, input_combinations.shape[0])
+    if top_k <= 0:
+        return input_combinations[:0], np.zeros(0)
+
+    best_index = np.zeros(0, dtype=np.intp)
+    best_scores = None
+    for first in range(0, input_combinations.shape[0], chunk_rows):
+        block_scores = ScoreCombinations(
+            input_combinations[first:first + chunk_rows],
+            positional_filter_data, criteria_filter_data,
+            positional_weights, criteria_weights
+        )
+        # 候選索引維持遞增，同分時取較前面的組合
+        best_index = np.concatenate((best_index, first + np.arange(block_scores.shape[0])))
+        best_scores = block_scores if best_scores is None else np.concatenate((best_scores, block_scores))
+        if best_scores.shape[0] > top_k:
+            keep = _TopKIndex(best_scores, top_k)
+            best_index, best_scores = best_index[keep], best_scores[keep]
+
+    # 只排序最後的 K 筆：分數由高到低，同分依輸入順序
+    order = np.lexsort((best_index, -best_scores.astype(np.float64)))
+    return input_combinations[best_index[order]], best_scores[order]
+
+
+def _TopKIndex(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    前 K 大分數的位置 (遞增排列)，第 K 名同分時取位置較前者
+
+    Args:
+        scores: 分數陣列
+        top_k: 保留筆數，須小於分數數量
+
+    Returns:
+        遞增排列的位置陣列
+    """
+    kth = np.partition(scores, scores.shape[0] - top_k)[scores.shape[0] - top_k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:top_k - above.shape[0]]
+    return np.sort(np.concatenate((above, ties)))
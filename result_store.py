@@ -0,0 +1,367 @@
+"""
+分析結果的磁碟快取
+以正規化後的篩選設定計算鍵值，保存通過組合 (排名或位元圖，取較小者) 與
+各組中獎號碼的獎金統計 (熱門號碼讀取時以 bincount 重新計算，不另外保存)，重新執行相同設定時可直接讀取。總大小超過上限時淘汰
+最久未使用的結果
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import IO, Callable, List, Optional, Union
+
+import numpy as np
+from utils import AllCombinations, CombinationRank
+
+# 遊戲規格 (號碼總數, 每注號碼數)，不同遊戲的結果不可共用
+GAME = (39, 5)
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".result_store")
+# 專案目錄無法寫入 (例如唯讀安裝) 時改用的目錄，依序嘗試使用者快取目錄與暫存目錄
+FALLBACK_STORE_DIRS = (
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "lottery_project", "result_store"
+    ),
+    os.path.join(tempfile.gettempdir(), "lottery_project_result_store"),
+)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+_INDEX_FILE = "index.json"
+# 命中時距離上次記錄超過此秒數才更新最後使用時間，連續命中不必每次重寫索引
+_TOUCH_INTERVAL = 60.0
+
+
+def _PoolKey(numbers) -> list:
+    """號碼池的正規化形式，忽略順序與重複"""
+    return sorted({int(x) for x in numbers})
+
+
+def _LimitKey(second_limit, inner: bool) -> Optional[list]:
+    """
+    二次限定的正規化形式，與 np.isin 的判斷相同 (整數、範圍與列表皆轉為排序後的列表)
+
+    Args:
+        second_limit: 二次限定值
+        inner: 是否為內層限定；內層限定為空值時該組被略過，以None表示
+
+    Returns:
+        排序後不重複的整數列表，略過的組別為None
+    """
+    if inner and not second_limit:
+        return None
+    if second_limit is None:
+        return []
+    if isinstance(second_limit, (int, np.integer)):
+        return [int(second_limit)]
+    return sorted({int(x) for x in second_limit})
+
+
+def _GroupKey(kind: str, filters: list) -> list:
+    """篩選器組別的正規化形式，各號碼池排序並去除重複"""
+    if kind == "position":
+        return [_PoolKey(numbers) for numbers in filters]
+    return [[[int(start), int(end)], _PoolKey(match_pool)] for (start, end), match_pool in filters]
+
+
+def _StageKey(kind: str, filters_set: list, second_limit_set: list, keep_positions: bool) -> list:
+    """
+    一個篩選階段的正規化形式
+
+    Args:
+        kind: "position" 或 "criteria"
+        filters_set: 篩選器集合列表
+        second_limit_set: 內層二次限定值列表
+        keep_positions: 是否保留全部組別的位置 (篩選式以編號引用組別)；否則與 OuterLayerFilter
+            相同以 zip 對齊並去除略過的組別，不影響結果的組別不列入
+
+    Returns:
+        可序列化的列表
+    """
+    if keep_positions:
+        return [
+            [_GroupKey(kind, filters) for filters in filters_set],
+            [_LimitKey(inner_2lim, inner=True) for inner_2lim in second_limit_set],
+        ]
+    return [
+        [_GroupKey(kind, filters), _LimitKey(inner_2lim, inner=True)]
+        for filters, inner_2lim in zip(filters_set, second_limit_set)
+        if _LimitKey(inner_2lim, inner=True) is not None
+    ]
+
+
+def ConfigurationKey(
+    use_position_filter: bool,
+    use_criteria_filter: bool,
+    positional_second_limit: Union[int, range, List[int], None],
+    criteria_second_limit: Union[int, range, List[int], None],
+    inner_positional_2lim: list,
+    inner_criteria_2lim: list,
+    positional_filter_data: list,
+    criteria_filter_data: list,
+    filter_expression: Optional[str] = None
+) -> str:
+    """
+    計算篩選設定的正規化鍵值，不影響結果的設定 (未使用的階段、略過的組別、計算方式、
+    號碼池內的順序與重複號碼) 不列入
+
+    Args:
+        use_position_filter: 是否使用位置篩選器
+        use_criteria_filter: 是否使用條件篩選器
+        positional_second_limit: 位置篩選器二次限定值
+        criteria_second_limit: 條件篩選器二次限定值
+        inner_positional_2lim: 內部位置二次限定值列表
+        inner_criteria_2lim: 內部條件二次限定值列表
+        positional_filter_data: 位置篩選器資料
+        criteria_filter_data: 條件篩選器資料
+        filter_expression: 篩選式，有值時取代兩階段設定
+
+    Returns:
+        十六進位雜湊字串
+    """
+    if filter_expression and filter_expression.strip():
+        # 篩選式自行指定外層限定，仍會引用各組資料與內層限定
+        stages = {
+            "expression": filter_expression.strip(),
+            "position": _StageKey("position", positional_filter_data, inner_positional_2lim, keep_positions=True),
+            "criteria": _StageKey("criteria", criteria_filter_data, inner_criteria_2lim, keep_positions=True),
+        }
+    else:
+        stages = {
+            "position": [
+                _StageKey("position", positional_filter_data, inner_positional_2lim, keep_positions=False),
+                _LimitKey(positional_second_limit, inner=False),
+            ] if use_position_filter else None,
+            "criteria": [
+                _StageKey("criteria", criteria_filter_data, inner_criteria_2lim, keep_positions=False),
+                _LimitKey(criteria_second_limit, inner=False),
+            ] if use_criteria_filter else None,
+        }
+    text = json.dumps([GAME, stages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _UsableDirectory(directory: str) -> bool:
+    """建立目錄並確認可寫入"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(directory, os.W_OK | os.X_OK)
+
+
+def _AtomicWrite(path: str, write: Callable[[IO], None], binary: bool = True) -> None:
+    """
+    先寫入同目錄下名稱不重複的暫存檔再取代，避免中斷時留下不完整的檔案，
+    多個行程 (例如 GUI 與查詢服務) 同時寫入同一個鍵值時也不會互相覆寫暫存檔
+
+    Args:
+        path: 目標檔案路徑
+        write: 以開啟的暫存檔為參數的寫入函數
+        binary: 是否以二進位模式開啟 (否則為 UTF-8 文字)
+
+    Raises:
+        OSError: 無法寫入時
+    """
+    temp_file = tempfile.NamedTemporaryFile(
+        mode="wb" if binary else "w",
+        encoding=None if binary else "utf-8",
+        dir=os.path.dirname(path),
+        prefix=os.path.basename(path) + ".",
+        suffix=".tmp",
+        delete=False
+    )
+    try:
+        with temp_file:
+            write(temp_file)
+        os.replace(temp_file.name, path)
+    except BaseException:
+        try:
+            os.remove(temp_file.name)
+        except OSError:
+            pass
+        raise
+
+
+def _WinningKey(winning_numbers: list) -> str:
+    """中獎號碼的鍵值，與輸入順序無關"""
+    return ",".join(str(int(num)) for num in sorted(winning_numbers))
+
+
+class ResultStore:
+    """以目錄保存的結果快取，索引記錄大小、最後使用時間與小型統計資料"""
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: 快取目錄，不存在時自動建立；預設目錄無法寫入時改用 FALLBACK_STORE_DIRS，
+                全部無法使用時停用快取 (directory 為None，讀取一律未命中、保存不做任何事)
+            max_bytes: 通過組合檔案的總大小上限
+        """
+        candidates = [directory]
+        if directory == DEFAULT_STORE_DIR:
+            candidates.extend(FALLBACK_STORE_DIRS)
+        self.directory = next((candidate for candidate in candidates if _UsableDirectory(candidate)), None)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """快取目錄是否可用"""
+        return self.directory is not None
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        讀取快取結果
+
+        Args:
+            key: ConfigurationKey 的結果
+
+        Returns:
+            {"valid combinations": (N, 5) 陣列, "prizes": {中獎號碼鍵值: 獎金統計}}，不存在時為None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            index = self._read_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            try:
+                with np.load(self._path(key)) as data:
+                    if "bitmap" in data:
+                        bits = np.unpackbits(data["bitmap"], count=AllCombinations().shape[0])
+                        passed = AllCombinations()[bits.astype(bool)]
+                    else:
+                        passed = AllCombinations()[data["ranks"]]
+            except (OSError, ValueError, KeyError):
+                # 檔案遺失或損毀時視為未快取
+                del index[key]
+                self._try_write_index(index)
+                return None
+
+            now = time.time()
+            if now - entry["last_used"] >= _TOUCH_INTERVAL:
+                entry["last_used"] = now
+                self._try_write_index(index)
+
+        return {
+            "valid combinations": passed,
+            "prizes": entry["prizes"],
+        }
+
+    def prize(self, stored: dict, winning_numbers: list) -> Optional[dict]:
+        """
+        取得快取中此組中獎號碼的獎金統計
+
+        Args:
+            stored: get 的結果
+            winning_numbers: 中獎號碼列表
+
+        Returns:
+            獎金統計，未保存時為None
+        """
+        return stored["prizes"].get(_WinningKey(winning_numbers))
+
+    def put(
+        self,
+        key: str,
+        passed_combinations,
+        winning_numbers: Optional[list] = None,
+        prize_info: Optional[dict] = None
+    ) -> None:
+        """
+        保存結果，並依大小上限淘汰最久未使用的結果
+
+        Args:
+            key: ConfigurationKey 的結果
+            passed_combinations: 通過篩選的組合 (字典序排列)
+            winning_numbers: 中獎號碼列表
+            prize_info: 對應的獎金統計
+        """
+        if not self.enabled:
+            return
+        passed = np.asarray(passed_combinations, dtype=np.uint8).reshape(-1, 5)
+        ranks = CombinationRank(passed, n=GAME[0]).astype(np.uint32)
+        bitmap_bytes = (AllCombinations().shape[0] + 7) // 8
+
+        # 通過組合少時保存排名，多時保存位元圖
+        path = self._path(key)
+        if ranks.nbytes < bitmap_bytes:
+            arrays = {"ranks": ranks}
+        else:
+            bits = np.zeros(AllCombinations().shape[0], dtype=bool)
+            bits[ranks] = True
+            arrays = {"bitmap": np.packbits(bits)}
+        _AtomicWrite(path, lambda f: np.savez(f, **arrays))
+
+        with self._lock:
+            index = self._read_index()
+            prizes = index.get(key, {}).get("prizes", {})
+            if winning_numbers and prize_info is not None:
+                prizes[_WinningKey(winning_numbers)] = prize_info
+            index[key] = {
+                "bytes": os.path.getsize(path),
+                "last_used": time.time(),
+                "valid_count": int(passed.shape[0]),
+                "prizes": prizes,
+            }
+            self._evict(index, keep=key)
+            self._write_index(index)
+
+    def put_prize(self, key: str, winning_numbers: list, prize_info: dict) -> None:
+        """替已快取的結果補上另一組中獎號碼的獎金統計"""
+        if not self.enabled:
+            return
+        with self._lock:
+            index = self._read_index()
+            if key in index:
+                index[key]["prizes"][_WinningKey(winning_numbers)] = prize_info
+                self._write_index(index)
+
+    @property
+    def total_bytes(self) -> int:
+        """目前快取的通過組合檔案總大小"""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._read_index().values())
+
+    def _evict(self, index: dict, keep: str) -> None:
+        """依最後使用時間淘汰，直到總大小不超過上限 (剛保存的結果保留)"""
+        total = sum(entry["bytes"] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= index.pop(key)["bytes"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, _INDEX_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _try_write_index(self, index: dict) -> None:
+        """讀取時順便更新的索引，寫入失敗不影響讀取結果"""
+        try:
+            self._write_index(index)
+        except OSError:
+            pass
+
+    def _write_index(self, index: dict) -> None:
+        _AtomicWrite(
+            os.path.join(self.directory, _INDEX_FILE),
+            lambda f: json.dump(index, f, ensure_ascii=False),
+            binary=False
+        )
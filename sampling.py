@@ -0,0 +1,106 @@
+"""
+通過組合的可重現抽樣
+均勻或加權的不放回抽樣，加權時使用 Efraimidis–Spirakis 方法：每注產生鍵值
+log(u) / w，取鍵值最大的 k 注即為依權重不放回抽出的結果，全程向量化計算
+"""
+
+from typing import Optional
+
+import numpy as np
+from utils import CombinationRank
+
+# 權重方式：均勻、熱門號碼 (各號碼在通過組合中的出現次數總和)、命中分數 (各組命中數總和)
+SAMPLE_WEIGHTINGS = ("uniform", "hot", "score")
+
+
+def HotWeights(passed_combinations: np.ndarray) -> np.ndarray:
+    """
+    以號碼熱度計算每注權重，與 CountElement 的次數相同
+
+    Args:
+        passed_combinations: 形狀為 (N, 5) 的通過組合陣列
+
+    Returns:
+        每注五個號碼出現次數的總和
+    """
+    counts = np.bincount(passed_combinations.ravel(), minlength=40)
+    return counts[passed_combinations].sum(axis=1, dtype=np.float64)
+
+
+def HitScores(limit_preview, passed_combinations: np.ndarray) -> np.ndarray:
+    """
+    以 LimitPreview 保存的各組命中數計算每注分數
+
+    Args:
+        limit_preview: 同一組篩選器建立的 LimitPreview
+        passed_combinations: 形狀為 (N, 5) 的通過組合陣列
+
+    Returns:
+        每注在位置組與號碼組所有組別的命中數總和
+    """
+    ranks = CombinationRank(passed_combinations)
+    scores = np.zeros(ranks.shape[0], dtype=np.float64)
+    for stage in (limit_preview.positional, limit_preview.criteria):
+        for i in range(stage.group_count):
+            if stage.group_filled[i]:
+                scores += stage.hits(i)[ranks]
+    return scores
+
+
+def SampleTickets(
+    passed_combinations,
+    sample_size: int,
+    weights: Optional[np.ndarray] = None,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    從通過組合中不放回抽出指定注數，相同種子得到相同結果
+
+    Args:
+        passed_combinations: 通過篩選的組合列表或陣列
+        sample_size: 抽樣注數，超過通過組合數時全部抽出
+        weights: 每注權重 (非負)，None 表示均勻抽樣；權重為 0 的組合只在其餘組合不足時抽出
+        seed: 亂數種子
+
+    Returns:
+        形狀為 (k, 5) 的抽樣結果，依鍵值由大到小排列 (即抽出順序)
+
+    Raises:
+        ValueError: 當權重長度不符或含負值時
+    """
+    passed = np.asarray(passed_combinations, dtype=np.uint8).reshape(-1, 5)
+    sample_size = min(sample_size, passed.shape[0])
+    if sample_size <= 0:
+        return passed[:0]
+
+    rng = np.random.default_rng(seed)
+    # 以 1 - random() 避免 log(0)
+    keys = np.log1p(-rng.random(passed.shape[0]))
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (passed.shape[0],):
+            raise ValueError("權重長度與通過組合數不符")
+        if (weights < 0).any():
+            raise ValueError("權重不可為負值")
+        positive = np.flatnonzero(weights > 0)
+        if positive.shape[0] < sample_size:
+            # 正權重組合不足時全部抽出，其餘由權重為 0 的組合均勻補足
+            zero = np.flatnonzero(weights == 0)
+            top = np.concatenate((
+                positive[_TopKeys(keys[positive] / weights[positive], positive.shape[0])],
+                zero[_TopKeys(keys[zero], sample_size - positive.shape[0])]
+            ))
+            return passed[top]
+        keys = keys[positive] / weights[positive]
+        return passed[positive[_TopKeys(keys, sample_size)]]
+
+    return passed[_TopKeys(keys, sample_size)]
+
+
+def _TopKeys(keys: np.ndarray, count: int) -> np.ndarray:
+    """取鍵值最大的 count 個索引並依鍵值由大到小排列，只需部分排序"""
+    if count < keys.shape[0]:
+        top = np.argpartition(keys, keys.shape[0] - count)[keys.shape[0] - count:]
+    else:
+        top = np.arange(keys.shape[0])
+    return top[np.argsort(-keys[top], kind="stable")]
@@ -0,0 +1,399 @@
+"""
+本機查詢服務
+常駐保存全部組合、解析後的篩選器與各組命中數快取，以 HTTP/JSON 提供
+與 CoreFunction 相同的計算。只接受本機連線 (127.0.0.1 或 Unix socket)
+
+使用方式:
+    python service.py --port 8765
+    python service.py --unix /tmp/lottery.sock
+
+請求 (POST，JSON 內容與 GUI 欄位相同，未提供的欄位使用預設值):
+    /evaluate  通過組合數、主要輸出、熱門號碼、獎金 (include_combinations 為 true 時附上通過組合)
+    /count     通過組合數
+    /hot       熱門號碼
+    /prize     獎金統計
+    GET /health 服務狀態
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+import numpy as np
+from core import FilterCombinationsArray, FormatMainOutput
+from preview import LimitPreview
+from utils import AllCombinations, CalculatePrize, CountElement, Parse2LimitInput, ParseFiltertstrToList
+
+
+DEFAULT_REQUEST = {
+    "use_position_filter": False,
+    "use_criteria_filter": False,
+    "positional_second_limit": "",
+    "criteria_second_limit": "",
+    "positional_filters": [],
+    "criteria_filters": [],
+    "inner_positional_2lim": [],
+    "inner_criteria_2lim": [],
+    "winning_numbers": "",
+    "filter_expression": "",
+    "backend": "numpy",
+    "include_combinations": False,
+}
+
+
+class LRUCache:
+    """以估計位元組數限制大小的 LRU 快取，可跨執行緒使用"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._pending: "dict[str, Future]" = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: str, create: Callable[[], Any], size_of: Callable[[Any], int]) -> Any:
+        """
+        取得快取項目，不存在時建立並依大小淘汰最久未使用的項目。
+        同一鍵值同時只會建立一次，其他執行緒等待建立結果
+
+        Args:
+            key: 快取鍵值
+            create: 建立項目的函數 (在鎖外執行)
+            size_of: 計算項目位元組數的函數
+
+        Returns:
+            快取項目
+
+        Raises:
+            create 拋出的例外 (等待中的執行緒也會收到)
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key][0]
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = future = Future()
+
+        if pending is not None:
+            # 其他執行緒正在建立同一項目
+            return pending.result()
+
+        try:
+            value = create()
+            size = size_of(value)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._pending[key]
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+        future.set_result(value)
+        return value
+
+    def resize(self, key: str, size: int) -> None:
+        """
+        更新項目的位元組數 (項目建立後仍會成長時使用) 並依新的大小淘汰
+
+        Args:
+            key: 快取鍵值，已被淘汰時不做任何事
+            size: 新的位元組數
+        """
+        with self._lock:
+            if key not in self._items:
+                return
+            value, old_size = self._items[key]
+            self._items[key] = (value, size)
+            self.current_bytes += size - old_size
+            self._evict()
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的項目直到低於上限 (呼叫前需持有鎖)"""
+        while self.current_bytes > self.max_bytes and len(self._items) > 1:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def _Hash(*parts: Any) -> str:
+    """以正規化 JSON 計算鍵值"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class QueryEngine:
+    """常駐查詢引擎，計算結果與 CoreFunction 相同"""
+
+    def __init__(self, max_cache_bytes: int):
+        """
+        Args:
+            max_cache_bytes: 各組命中數與結果快取的記憶體上限
+        """
+        AllCombinations()  # 預先產生全部組合
+        self._parsed = LRUCache(max_bytes=256)  # 解析結果很小，以筆數計 (每筆記為 1)
+        self._previews = LRUCache(max_bytes=max_cache_bytes * 3 // 4)
+        self._results = LRUCache(max_bytes=max_cache_bytes // 4)
+
+    def _parse(self, request: dict) -> tuple:
+        """解析並快取篩選器與二次限定值"""
+        key = _Hash(
+            "parse",
+            request["positional_filters"], request["criteria_filters"],
+            request["positional_second_limit"], request["criteria_second_limit"],
+            request["inner_positional_2lim"], request["inner_criteria_2lim"],
+            request["winning_numbers"]
+        )
+
+        def create() -> tuple:
+            positional_filter_data = ParseFiltertstrToList("position", request["positional_filters"])
+            criteria_filter_data = ParseFiltertstrToList("criteria", request["criteria_filters"])
+            limits = Parse2LimitInput(
+                positional_second_limit_str=request["positional_second_limit"],
+                criteria_second_limit_str=request["criteria_second_limit"],
+                inner_positional_2lim_str=request["inner_positional_2lim"],
+                inner_criteria_2lim_str=request["inner_criteria_2lim"],
+                positional_filters=positional_filter_data,
+                criteria_filters=criteria_filter_data,
+                winning_numbers_str=request["winning_numbers"]
+            )
+            return positional_filter_data, criteria_filter_data, limits
+
+        return self._parsed.get_or_create(key, create, lambda value: 1)
+
+    def _with_preview(self, request: dict, positional_filter_data: list, criteria_filter_data: list,
+                      use: Callable[[LimitPreview], Any]) -> Any:
+        """
+        以同一組篩選器共用的各組命中數快取執行 use，完成後重新計算快取項目大小
+        (set_inner_limits 會建立各組遮罩，建立時的大小不包含這些陣列)
+
+        Args:
+            use: 接收 LimitPreview 的函數，在該快取項目的鎖內執行
+
+        Returns:
+            use 的回傳值
+        """
+        key = _Hash("preview", request["positional_filters"], request["criteria_filters"])
+        preview, lock = self._previews.get_or_create(
+            key,
+            lambda: (LimitPreview(positional_filter_data, criteria_filter_data), threading.Lock()),
+            lambda value: value[0].nbytes
+        )
+        with lock:
+            result = use(preview)
+            self._previews.resize(key, preview.nbytes)
+        return result
+
+    def _settings(self, request: dict) -> tuple:
+        """
+        整理篩選參數
+
+        Returns:
+            (兩階段設定, 位置篩選器資料, 條件篩選器資料, 中獎號碼列表)
+        """
+        positional_filter_data, criteria_filter_data, limits = self._parse(request)
+        (
+            positional_second_limit,
+            criteria_second_limit,
+            inner_positional_2lim,
+            inner_criteria_2lim,
+            winning_numbers
+        ) = limits
+        settings = dict(
+            use_position_filter=bool(request["use_position_filter"]),
+            use_criteria_filter=bool(request["use_criteria_filter"]),
+            positional_second_limit=positional_second_limit,
+            criteria_second_limit=criteria_second_limit,
+            inner_positional_2lim=inner_positional_2lim,
+            inner_criteria_2lim=inner_criteria_2lim
+        )
+        return settings, positional_filter_data, criteria_filter_data, winning_numbers
+
+    def _passed(self, request: dict) -> tuple:
+        """
+        計算通過組合
+
+        Returns:
+            (通過組合陣列, 中獎號碼列表)
+        """
+        settings, positional_filter_data, criteria_filter_data, winning_numbers = self._settings(request)
+
+        if request["filter_expression"].strip():
+            key = _Hash("expression", request)
+
+            def create() -> np.ndarray:
+                return FilterCombinationsArray(
+                    **settings,
+                    positional_filter_data=positional_filter_data,
+                    criteria_filter_data=criteria_filter_data,
+                    backend=request["backend"],
+                    filter_expression=request["filter_expression"]
+                )
+
+            return self._results.get_or_create(key, create, lambda value: value.nbytes), winning_numbers
+
+        # 一般兩階段流程直接由各組命中數快取計算，只有內外層限定改變時不必重跑篩選器
+        valid_mask = self._with_preview(
+            request, positional_filter_data, criteria_filter_data,
+            lambda preview: preview.pass_mask(**settings)
+        )
+        return AllCombinations()[valid_mask], winning_numbers
+
+    def count(self, request: dict) -> dict:
+        """通過組合數，兩階段流程只需查聯合直方圖"""
+        if request["filter_expression"].strip():
+            valid_count = int(self._passed(request)[0].shape[0])
+        else:
+            settings, positional_filter_data, criteria_filter_data, _ = self._settings(request)
+            valid_count = self._with_preview(
+                request, positional_filter_data, criteria_filter_data,
+                lambda preview: preview.pass_count(**settings)
+            )
+        return {"valid_count": valid_count, "filtered_count": 575757 - valid_count}
+
+    def hot_numbers(self, request: dict) -> dict:
+        """熱門號碼"""
+        passed, _ = self._passed(request)
+        return {"hot_numbers": [[k, v] for k, v in CountElement(passed).items()]}
+
+    def prize(self, request: dict) -> dict:
+        """獎金統計"""
+        passed, winning_numbers = self._passed(request)
+        if not winning_numbers:
+            raise ValueError("缺少中獎號碼")
+        return {"prize": CalculatePrize(winning_number=winning_numbers, my_number=passed)}
+
+    def evaluate(self, request: dict) -> dict:
+        """與 CoreFunction 相同的完整結果"""
+        passed, winning_numbers = self._passed(request)
+        prize_info = None
+        if winning_numbers:
+            prize_info = CalculatePrize(winning_number=winning_numbers, my_number=passed)
+
+        response = {
+            "valid_count": int(passed.shape[0]),
+            "filtered_count": 575757 - int(passed.shape[0]),
+            "main_output": FormatMainOutput(int(passed.shape[0]), prize_info),
+            "hot_numbers": [[k, v] for k, v in CountElement(passed).items()],
+            "prize": prize_info,
+        }
+        if request["include_combinations"]:
+            response["combinations"] = passed.tolist()
+        return response
+
+    def status(self) -> dict:
+        """快取狀態"""
+        return {
+            "status": "ok",
+            "cached_configs": len(self._previews),
+            "cached_results": len(self._results),
+            "cache_bytes": self._previews.current_bytes + self._results.current_bytes,
+        }
+
+
+class QueryServer:
+    """以 asyncio 實作的精簡 HTTP/JSON 伺服器"""
+
+    ROUTES = {
+        "/evaluate": "evaluate",
+        "/count": "count",
+        "/hot": "hot_numbers",
+        "/prize": "prize",
+    }
+
+    def __init__(self, engine: QueryEngine, workers: int):
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """處理單一連線，支援 keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self.dispatch(method, path, body)
+                data = json.dumps(payload, ensure_ascii=False).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[str, dict]:
+        """依路徑呼叫查詢引擎，計算在執行緒池中進行"""
+        loop = asyncio.get_running_loop()
+        if method == "GET" and path == "/health":
+            return "200 OK", self.engine.status()
+        if method != "POST" or path not in self.ROUTES:
+            return "404 Not Found", {"error": f"未知的請求: {method} {path}"}
+
+        try:
+            request = dict(DEFAULT_REQUEST)
+            request.update(json.loads(body or b"{}"))
+            handler = getattr(self.engine, self.ROUTES[path])
+            return "200 OK", await loop.run_in_executor(self.executor, handler, request)
+        except Exception as e:
+            return "400 Bad Request", {"error": str(e)}
+
+
+async def Serve(port: int, unix_path: Optional[str], max_cache_mb: int, workers: int):
+    """啟動服務直到被中斷"""
+    server = QueryServer(QueryEngine(max_cache_bytes=max_cache_mb * 1024 * 1024), workers=workers)
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle, path=unix_path)
+        print(f"服務啟動於 unix:{unix_path}")
+    else:
+        listener = await asyncio.start_server(server.handle, host="127.0.0.1", port=port)
+        print(f"服務啟動於 http://127.0.0.1:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    """命令列入口"""
+    parser = argparse.ArgumentParser(description="樂透篩選本機查詢服務")
+    parser.add_argument("--port", type=int, default=8765, help="本機 TCP 連接埠")
+    parser.add_argument("--unix", default=None, help="改用 Unix socket 路徑")
+    parser.add_argument("--max-cache-mb", type=int, default=1024, help="快取記憶體上限 (MB)")
+    parser.add_argument("--workers", type=int, default=4, help="計算執行緒數")
+    args = parser.parse_args()
+    try:
+        asyncio.run(Serve(args.port, args.unix, args.max_cache_mb, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+長期報酬的蒙地卡羅模擬
+每期開出的號碼在 C(39,5) 個組合中均勻分布，因此先算出投注組合對每一種可能開獎結果的
+各獎項中獎注數 (注數少時以號碼位元遮罩交集的 popcount 計算，注數多時以子集合計數
+反推)，模擬時只需以亂數抽出開獎結果的排名再查表。多條資金路徑分成固定大小的工作，
+以 SeedSequence.spawn 分配亂數種子並在多個行程中執行，邊模擬邊累計統計量，
+結果與使用的行程數無關。工作行程以 spawn 啟動，可在有其他執行緒的行程 (例如 GUI) 中使用
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from coverage_analysis import SubsetRanks
+from utils import AllCombinations
+
+# 預設獎金表 (中獎號碼數: 每注獎金)，與 CalculatePrize 相同
+DEFAULT_PRIZE_TABLE = {2: 50, 3: 300, 4: 200000, 5: 8000000}
+DEFAULT_TICKET_COST = 50
+PRIZE_NAMES = {5: "壹等獎", 4: "貳等獎", 3: "參等獎", 2: "肆等獎"}
+
+_BITMASK_MAX_TICKETS = 64  # 注數不超過此值時以位元遮罩逐注計算
+_TASK_PATHS = 64           # 每個工作負責的路徑數，固定大小使結果與行程數無關
+_BLOCK_DRAWS = 1 << 20     # 每次向量化處理的期數 (路徑數 x 期數)
+
+# 工作行程共用的查表，由 _InitWorker 設定
+_WORKER_TABLES = None
+
+
+class SimulationCancelled(Exception):
+    """模擬在完成前被取消"""
+
+
+def NumberMasks(combinations_array: np.ndarray) -> np.ndarray:
+    """
+    組合轉為號碼位元遮罩，第 x 個位元表示包含號碼 x
+
+    Args:
+        combinations_array: 形狀為 (N, 5) 的組合陣列
+
+    Returns:
+        uint64 遮罩陣列
+    """
+    combinations_array = np.asarray(combinations_array).reshape(-1, 5).astype(np.uint64)
+    return np.bitwise_or.reduce(np.left_shift(np.uint64(1), combinations_array), axis=1)
+
+
+def TicketMatchTable(tickets, chunk_rows: int = 65536) -> np.ndarray:
+    """
+    每一種可能的開獎結果下，投注組合中中了 0~5 個號碼的注數
+
+    注數少時直接以位元遮罩交集的 popcount 計算；注數多時先統計投注組合的每個 k 號
+    子集合出現次數，開獎結果 D 的 S_k = sum(C(|t ∩ D|, k)) 為 D 的所有 k 號子集合次數
+    總和，再以 N_m = sum_k (-1)^(k-m) C(k, m) S_k 反推恰好中 m 個號碼的注數
+
+    Args:
+        tickets: 形狀為 (T, 5) 的投注組合，可重複
+        chunk_rows: 分段處理的開獎結果數
+
+    Returns:
+        形狀為 (575757, 6) 的 int64 陣列，列索引為開獎結果的字典序排名
+    """
+    tickets = np.asarray(tickets, dtype=np.uint8).reshape(-1, 5)
+    all_combinations = AllCombinations()
+    table = np.zeros((all_combinations.shape[0], 6), dtype=np.int64)
+    if tickets.shape[0] == 0:
+        return table
+
+    if tickets.shape[0] <= _BITMASK_MAX_TICKETS:
+        ticket_masks = NumberMasks(tickets)
+        for first in range(0, all_combinations.shape[0], chunk_rows):
+            draw_masks = NumberMasks(all_combinations[first:first + chunk_rows])
+            matches = np.bitwise_count(draw_masks[:, None] & ticket_masks[None, :])
+            rows = np.arange(draw_masks.shape[0])[:, None] * 6
+            table[first:first + draw_masks.shape[0]] = np.bincount(
+                (rows + matches).ravel(), minlength=draw_masks.shape[0] * 6
+            ).reshape(-1, 6)
+        return table
+
+    subset_counts = [
+        np.bincount(SubsetRanks(tickets, k).ravel(), minlength=comb(39, k))
+        for k in range(1, 6)
+    ]
+    for first in range(0, all_combinations.shape[0], chunk_rows):
+        block = all_combinations[first:first + chunk_rows]
+        sums = [np.full(block.shape[0], tickets.shape[0], dtype=np.int64)]
+        sums += [counts[SubsetRanks(block, k)].sum(axis=1) for k, counts in enumerate(subset_counts, 1)]
+        for m in range(6):
+            table[first:first + block.shape[0], m] = sum(
+                (-1) ** (k - m) * comb(k, m) * sums[k] for k in range(m, 6)
+            )
+    return table
+
+
+def ParsePrizeTable(prize_table_str: str) -> Dict[int, float]:
+    """
+    解析獎金表 (str -> dict)，格式為「中獎號碼數:獎金」以逗號分隔，留白表示預設獎金表
+
+    Args:
+        prize_table_str: 獎金表文字，例如 "2:50, 3:300, 4:200000, 5:8000000"
+
+    Returns:
+        {中獎號碼數: 每注獎金}
+
+    Raises:
+        ValueError: 當格式錯誤或中獎號碼數不在 0~5 時
+    """
+    prize_table_str = prize_table_str.strip()
+    if not prize_table_str:
+        return dict(DEFAULT_PRIZE_TABLE)
+    try:
+        prize_table = {}
+        for item in prize_table_str.split(","):
+            matches, prize = item.split(":")
+            prize_table[int(matches)] = float(prize) if "." in prize else int(prize)
+    except Exception as e:
+        raise ValueError(f"獎金表格式錯誤: {e}")
+    if any(not 0 <= matches <= 5 for matches in prize_table):
+        raise ValueError("中獎號碼數必須介於 0~5")
+    return prize_table
+
+
+def _InitWorker(tables: tuple) -> None:
+    """工作行程初始化，保存查表"""
+    global _WORKER_TABLES
+    _WORKER_TABLES = tables
+
+
+def _JackpotPayout(
+    rng: np.random.Generator,
+    jackpot_count: np.ndarray,
+    jackpot_prize: float,
+    jackpot_others_mean: Optional[float]
+) -> np.ndarray:
+    """
+    頭獎金額：未設定平分時每注固定獎金；設定時頭獎獎金由所有頭獎注數平分，
+    其他人的頭獎注數為 Poisson(jackpot_others_mean)
+    """
+    payout = jackpot_count * float(jackpot_prize)
+    if jackpot_others_mean is not None:
+        won = np.flatnonzero(jackpot_count)
+        others = rng.poisson(jackpot_others_mean, size=won.shape[0])
+        payout[won] = jackpot_prize * jackpot_count[won] / (jackpot_count[won] + others)
+    return payout
+
+
+def _SimulateTask(task: tuple) -> dict:
+    """
+    模擬一組路徑
+
+    Args:
+        task: (種子 SeedSequence, 路徑數, 每條路徑期數, 每期成本, 起始本金 (None 表示不限),
+               頭獎獎金, 其他頭獎注數期望值)
+
+    Returns:
+        部分統計量
+    """
+    seed_sequence, path_count, horizon, cost, bankroll, jackpot_prize, jackpot_others_mean = task
+    base_payout, jackpot_count = _WORKER_TABLES
+    rng = np.random.default_rng(seed_sequence)
+    outcome_count = base_payout.shape[0]
+
+    start = 0.0 if bankroll is None else float(bankroll)
+    balance = np.full(path_count, start)
+    peak = balance.copy()
+    lowest = balance.copy()
+    max_drawdown = np.zeros(path_count)
+    played = np.zeros(path_count, dtype=np.int64)
+    alive = np.ones(path_count, dtype=bool)
+    outcome_hits = np.zeros(outcome_count, dtype=np.int64)
+    payout_sum = 0.0
+    payout_square_sum = 0.0
+
+    if bankroll is not None and start < cost:
+        alive[:] = False
+
+    step = max(1, _BLOCK_DRAWS // path_count)
+    for first in range(0, horizon, step):
+        rows = np.flatnonzero(alive)
+        if rows.shape[0] == 0:
+            break
+        width = min(step, horizon - first)
+        outcomes = rng.integers(0, outcome_count, size=(rows.shape[0], width))
+        payout = base_payout[outcomes]
+        if jackpot_prize:
+            jackpot = jackpot_count[outcomes]
+            won = jackpot > 0
+            if won.any():
+                payout[won] += _JackpotPayout(rng, jackpot[won], jackpot_prize, jackpot_others_mean)
+
+        # 每期先付成本再領獎金
+        path_balance = balance[rows, None] + np.cumsum(payout - cost, axis=1)
+        path_peak = np.maximum(peak[rows, None], np.maximum.accumulate(path_balance, axis=1))
+        path_lowest = np.minimum(lowest[rows, None], np.minimum.accumulate(path_balance, axis=1))
+        path_drawdown = np.maximum(max_drawdown[rows, None], np.maximum.accumulate(path_peak - path_balance, axis=1))
+
+        # 有本金限制時，餘額不足以購買下一期即停止該路徑
+        last = np.full(rows.shape[0], width - 1)
+        if bankroll is not None:
+            broke = path_balance < cost
+            ruined = broke.any(axis=1)
+            last[ruined] = broke[ruined].argmax(axis=1)
+            alive[rows[ruined]] = False
+
+        # 只統計實際投注的期數
+        if bankroll is not None and ruined.any():
+            played_mask = np.arange(width) <= last[:, None]
+            outcomes, payout = outcomes[played_mask], payout[played_mask]
+        outcome_hits += np.bincount(outcomes.ravel(), minlength=outcome_count)
+        payout_sum += payout.sum()
+        payout_square_sum += np.square(payout).sum()
+
+        index = np.arange(rows.shape[0])
+        balance[rows] = path_balance[index, last]
+        peak[rows] = path_peak[index, last]
+        lowest[rows] = path_lowest[index, last]
+        max_drawdown[rows] = path_drawdown[index, last]
+        played[rows] += last + 1
+
+    return {
+        "outcome_hits": outcome_hits,
+        "payout_sum": payout_sum,
+        "payout_square_sum": payout_square_sum,
+        "final_balance": balance,
+        "lowest_balance": lowest,
+        "max_drawdown": max_drawdown,
+        "played": played,
+        "ruined": ~alive,
+    }
+
+
+def _RunTasks(
+    tasks: list,
+    tables: tuple,
+    workers: int,
+    progress: Optional[Callable[[int, int], None]],
+    cancel: Optional[threading.Event]
+) -> List[dict]:
+    """
+    依序執行模擬工作，每完成一個工作回報進度並檢查是否取消
+
+    Raises:
+        SimulationCancelled: 當 cancel 被設定時 (尚未開始的工作不再執行)
+    """
+    def Completed(done: int) -> None:
+        if cancel is not None and cancel.is_set():
+            raise SimulationCancelled("模擬已取消")
+        if progress is not None:
+            progress(done, len(tasks))
+
+    Completed(0)
+    if workers <= 1:
+        _InitWorker(tables)
+        results = []
+        for task in tasks:
+            results.append(_SimulateTask(task))
+            Completed(len(results))
+        return results
+
+    # fork 有其他執行緒的行程可能死結，工作行程一律以 spawn 啟動
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_InitWorker,
+        initargs=(tables,)
+    )
+    try:
+        futures = [executor.submit(_SimulateTask, task) for task in tasks]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            Completed(len(results))
+        return results
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def SimulateReturns(
+    tickets,
+    paths: int = 1000,
+    horizon: int = 10000,
+    prize_table: Optional[Dict[int, float]] = None,
+    ticket_cost: float = DEFAULT_TICKET_COST,
+    bankroll: Optional[float] = None,
+    jackpot_others_mean: Optional[float] = None,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None
+) -> dict:
+    """
+    模擬以同一組投注組合長期每期投注的報酬
+
+    Args:
+        tickets: 形狀為 (T, 5) 的投注組合 (例如通過組合或抽樣結果)，每期全部投注
+        paths: 模擬的資金路徑數
+        horizon: 每條路徑的期數，總模擬期數為 paths * horizon
+        prize_table: {中獎號碼數: 每注獎金}，None 表示預設獎金表
+        ticket_cost: 每注成本
+        bankroll: 起始本金，餘額不足以購買下一期時該路徑停止；None 表示不限本金
+        jackpot_others_mean: 頭獎平分假設，其他人頭獎注數的期望值 (Poisson)；
+            None 表示頭獎為每注固定獎金
+        seed: 亂數種子，相同種子與參數得到相同結果 (與 workers 無關)
+        workers: 使用的行程數，None 表示全部 CPU，1 表示在目前行程執行
+        progress: 每完成一個工作 (64 條路徑) 呼叫 progress(已完成工作數, 總工作數)
+        cancel: 設定後在下一個工作完成時停止
+
+    Returns:
+        {
+            "tickets": 注數, "draws": 實際投注的總期數, "cost_per_draw": 每期成本,
+            "payout_mean": 每期平均獎金, "payout_std": 每期獎金標準差,
+            "expected_payout": 每期獎金期望值 (精確值), "return_rate": 平均獎金 / 成本,
+            "tier_hits": {中獎號碼數: 模擬期間中獎注數},
+            "final_balance": (平均, 5%, 50%, 95%), "ruin_probability": 停止的路徑比例,
+            "max_drawdown": (中位數, 95%), "played_mean": 每條路徑平均投注期數,
+            "elapsed": 耗時 (秒)
+        }
+
+    Raises:
+        SimulationCancelled: 當 cancel 在模擬完成前被設定時
+    """
+    started = time.perf_counter()
+    tickets = np.asarray(tickets, dtype=np.uint8).reshape(-1, 5)
+    prize_table = dict(DEFAULT_PRIZE_TABLE if prize_table is None else prize_table)
+    cost = float(ticket_cost) * tickets.shape[0]
+
+    match_table = TicketMatchTable(tickets)
+    jackpot_prize = prize_table.pop(5, 0)
+    base_payout = np.zeros(match_table.shape[0])
+    for matches, prize in prize_table.items():
+        base_payout += match_table[:, matches] * float(prize)
+    jackpot_count = match_table[:, 5] if jackpot_prize else np.zeros(match_table.shape[0], dtype=np.int64)
+    tables = (base_payout, jackpot_count)
+
+    children = np.random.SeedSequence(seed).spawn(-(-paths // _TASK_PATHS))
+    tasks = [
+        (child, min(_TASK_PATHS, paths - t * _TASK_PATHS), horizon, cost, bankroll,
+         jackpot_prize, jackpot_others_mean)
+        for t, child in enumerate(children)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    results = _RunTasks(tasks, tables, workers, progress, cancel)
+
+    outcome_hits = sum(result["outcome_hits"] for result in results)
+    draws = int(outcome_hits.sum())
+    payout_mean = sum(result["payout_sum"] for result in results) / max(draws, 1)
+    payout_square_mean = sum(result["payout_square_sum"] for result in results) / max(draws, 1)
+    final_balance = np.concatenate([result["final_balance"] for result in results])
+    max_drawdown = np.concatenate([result["max_drawdown"] for result in results])
+    played = np.concatenate([result["played"] for result in results])
+    ruined = np.concatenate([result["ruined"] for result in results])
+
+    # 每期獎金期望值：開獎結果均勻分布，頭獎平分時對 Poisson 分布取期望值
+    expected_payout = base_payout.mean()
+    if jackpot_prize:
+        jackpot_values, jackpot_draws = np.unique(jackpot_count[jackpot_count > 0], return_counts=True)
+        shares = jackpot_values.astype(np.float64)
+        if jackpot_others_mean is not None:
+            k = np.arange(int(jackpot_others_mean + 10 * np.sqrt(jackpot_others_mean) + 20))
+            log_pmf = k * np.log(max(jackpot_others_mean, 1e-300)) - jackpot_others_mean
+            log_pmf -= np.cumsum(np.log(np.maximum(k, 1)))
+            shares = (np.exp(log_pmf) * jackpot_values[:, None] / (jackpot_values[:, None] + k)).sum(axis=1)
+        expected_payout += jackpot_prize * (shares * jackpot_draws).sum() / match_table.shape[0]
+
+    return {
+        "tickets": int(tickets.shape[0]),
+        "draws": draws,
+        "cost_per_draw": cost,
+        "payout_mean": float(payout_mean),
+        "payout_std": float(np.sqrt(max(payout_square_mean - payout_mean ** 2, 0))),
+        "expected_payout": float(expected_payout),
+        "return_rate": float(payout_mean / cost) if cost else float("nan"),
+        "tier_hits": {
+            matches: int(outcome_hits @ match_table[:, matches])
+            for matches in sorted(set(prize_table) | ({5} if jackpot_prize else set()), reverse=True)
+        },
+        "final_balance": (float(final_balance.mean()), *map(float, np.percentile(final_balance, [5, 50, 95]))),
+        "ruin_probability": float(ruined.mean()),
+        "max_drawdown": tuple(map(float, np.percentile(max_drawdown, [50, 95]))),
+        "played_mean": float(played.mean()),
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def FormatSimulation(result: dict) -> str:
+    """
+    準備模擬結果輸出內容
+
+    Args:
+        result: SimulateReturns 的結果
+
+    Returns:
+        模擬結果文字
+    """
+    mean, low, median, high = result["final_balance"]
+    output_lines = [
+        f"投注注數: {result['tickets']}  每期成本: {result['cost_per_draw']:,.0f}",
+        f"總投注期數: {result['draws']:,}  (耗時 {result['elapsed']:.1f} 秒)",
+        f"每期平均獎金: {result['payout_mean']:,.2f}  (期望值 {result['expected_payout']:,.2f}，"
+        f"標準差 {result['payout_std']:,.2f})",
+        f"報酬率: {result['return_rate']:.2%}",
+        "",
+        "中獎注數:",
+    ]
+    output_lines.extend(
+        f"  {PRIZE_NAMES.get(matches, f'中 {matches} 個號碼')}: {hits:,}"
+        for matches, hits in result["tier_hits"].items()
+    )
+    output_lines.extend([
+        "",
+        f"期末餘額: 平均 {mean:,.0f}  5% {low:,.0f}  中位數 {median:,.0f}  95% {high:,.0f}",
+        f"最大回撤: 中位數 {result['max_drawdown'][0]:,.0f}  95% {result['max_drawdown'][1]:,.0f}",
+        f"破產機率: {result['ruin_probability']:.2%}  (平均投注 {result['played_mean']:,.0f} 期)",
+    ])
+    return "\n".join(output_lines)
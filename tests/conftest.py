@@ -0,0 +1,63 @@
+"""
+測試共用設定
+專案模組放在根目錄，測試時加入 sys.path；範例設定使用 filters_data 的範例篩選器
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import filters_data  # noqa: E402
+from utils import Parse2LimitInput, ParseFiltertstrToList  # noqa: E402
+
+
+def ExampleSettings(
+    positional_second_limit: str = "1",
+    criteria_second_limit: str = "1-2",
+    inner_positional_2lim: tuple = ("3-5", "4-5", "", ""),
+    inner_criteria_2lim: tuple = ("5-7", "10-12", "", "")
+) -> dict:
+    """以範例篩選器解析出 CoreFunction 的篩選參數 (預設設定通過 158129 組)"""
+    positional_filter_data = ParseFiltertstrToList(
+        mode="position",
+        filters_set_str=[
+            filters_data.positional_filter_list_example_1,
+            filters_data.positional_filter_list_example_2,
+            "", ""
+        ]
+    )
+    criteria_filter_data = ParseFiltertstrToList(mode="criteria", filters_set_str=filters_data.criteria_filters_example)
+    (
+        positional_second_limit,
+        criteria_second_limit,
+        inner_positional_2lim,
+        inner_criteria_2lim,
+        _
+    ) = Parse2LimitInput(
+        positional_second_limit_str=positional_second_limit,
+        criteria_second_limit_str=criteria_second_limit,
+        inner_positional_2lim_str=list(inner_positional_2lim),
+        inner_criteria_2lim_str=list(inner_criteria_2lim),
+        positional_filters=positional_filter_data,
+        criteria_filters=criteria_filter_data,
+        winning_numbers_str=""
+    )
+    return {
+        "use_position_filter": True,
+        "use_criteria_filter": True,
+        "positional_second_limit": positional_second_limit,
+        "criteria_second_limit": criteria_second_limit,
+        "inner_positional_2lim": inner_positional_2lim,
+        "inner_criteria_2lim": inner_criteria_2lim,
+        "positional_filter_data": positional_filter_data,
+        "criteria_filter_data": criteria_filter_data,
+    }
+
+
+@pytest.fixture
+def make_settings():
+    """回傳 ExampleSettings，測試可自行指定二次限定"""
+    return ExampleSettings
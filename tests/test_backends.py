@@ -0,0 +1,149 @@
+"""
+各計算方式與依序套用 OuterLayerFilter 的結果比對
+隨機設定包含停用階段、空組別、沒有內層限定的組別及內層限定組數與篩選器組數不一致等邊界情況，
+範例設定則涵蓋只通過部分組合的一般情況
+"""
+
+import numpy as np
+import pytest
+
+import jit_backend
+from conftest import ExampleSettings
+from core import BACKENDS, FilterCombinationsArray
+from expression import FilterPlan, PipelineExpression
+from filters_function import FilterByCriteria, FilterByPositions, OuterLayerFilter
+from utils import AllCombinations
+
+SEED = 0
+TRIALS = 12
+
+
+def _RandomConfig(rng: np.random.Generator) -> dict:
+    """產生隨機的兩階段篩選設定 (FilterCombinationsArray 的篩選參數)"""
+    def Limit(max_hits: int):
+        # 空列表表示略過該組，其餘為隨機的允許命中數
+        if rng.random() < 0.15:
+            return []
+        return sorted(rng.choice(max_hits + 1, size=rng.integers(1, max_hits + 2), replace=False).tolist())
+
+    def Numbers():
+        return sorted(rng.choice(np.arange(1, 40), size=rng.integers(0, 15), replace=False).tolist())
+
+    use_position_filter = bool(rng.random() < 0.8)
+    use_criteria_filter = bool(rng.random() < 0.8)
+
+    positional_filter_data = []
+    for _ in range(rng.integers(0, 4)):
+        # 停用的階段可能含有空組別，基準篩選不會讀取
+        if not use_position_filter and rng.random() < 0.3:
+            positional_filter_data.append([])
+        else:
+            positional_filter_data.append([Numbers() for _ in range(5)])
+
+    criteria_filter_data = []
+    for _ in range(rng.integers(0, 4)):
+        lines = []
+        for _ in range(rng.integers(0, 5)):
+            start = int(rng.integers(0, 6))
+            lines.append(((start, int(rng.integers(start, 6))), Numbers()))
+        criteria_filter_data.append(lines)
+
+    # 內層限定的組數可能與篩選器組數不同 (以 zip 對齊)
+    inner_positional_2lim = [Limit(5) for _ in range(len(positional_filter_data) + rng.integers(-1, 2))]
+    inner_criteria_2lim = [
+        Limit(max((len(lines) for lines in criteria_filter_data), default=0))
+        for _ in range(len(criteria_filter_data) + rng.integers(-1, 2))
+    ]
+    return {
+        "use_position_filter": use_position_filter,
+        "use_criteria_filter": use_criteria_filter,
+        "positional_second_limit": Limit(len(inner_positional_2lim)),
+        "criteria_second_limit": Limit(len(inner_criteria_2lim)),
+        "inner_positional_2lim": inner_positional_2lim,
+        "inner_criteria_2lim": inner_criteria_2lim,
+        "positional_filter_data": positional_filter_data,
+        "criteria_filter_data": criteria_filter_data,
+    }
+
+
+def _Expected(config: dict) -> np.ndarray:
+    """依序套用 OuterLayerFilter 的通過組合"""
+    filtered = AllCombinations()
+    if config["use_position_filter"]:
+        filtered = OuterLayerFilter(
+            filters_set=config["positional_filter_data"],
+            second_limit_set=config["inner_positional_2lim"],
+            second_limit=config["positional_second_limit"],
+            input_combinations=filtered,
+            InnerLayerFilter=FilterByPositions
+        )
+    if config["use_criteria_filter"]:
+        filtered = OuterLayerFilter(
+            filters_set=config["criteria_filter_data"],
+            second_limit_set=config["inner_criteria_2lim"],
+            second_limit=config["criteria_second_limit"],
+            input_combinations=filtered,
+            InnerLayerFilter=FilterByCriteria
+        )
+    return np.asarray(filtered, dtype=np.uint8).reshape(-1, 5)
+
+
+def _Configs() -> list:
+    rng = np.random.default_rng(SEED)
+    examples = [
+        ExampleSettings(),
+        ExampleSettings("a", "a"),
+        ExampleSettings("0-1", "2", inner_positional_2lim=("4-5", "", "", "")),
+    ]
+    return examples + [_RandomConfig(rng) for _ in range(TRIALS)]
+
+
+CONFIGS = _Configs()
+
+
+@pytest.fixture(scope="module")
+def expected() -> list:
+    return [_Expected(config) for config in CONFIGS]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backend_matches_outer_layer_filter(backend, expected):
+    for config, passed in zip(CONFIGS, expected):
+        assert np.array_equal(FilterCombinationsArray(**config, backend=backend), passed), config
+
+
+def test_jit_numpy_fallback_matches_outer_layer_filter(monkeypatch, expected):
+    monkeypatch.setattr(jit_backend, "JIT_AVAILABLE", False)
+    for config, passed in zip(CONFIGS, expected):
+        assert np.array_equal(FilterCombinationsArray(**config, backend="jit"), passed), config
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_diagnostics_mode_keeps_result(backend, expected):
+    for config, passed in zip(CONFIGS[:4], expected):
+        diagnostics = {}
+        assert np.array_equal(FilterCombinationsArray(**config, backend=backend, diagnostics=diagnostics), passed)
+
+
+def test_pipeline_expression_matches_outer_layer_filter(expected):
+    all_combinations = AllCombinations()
+    for config, passed in zip(CONFIGS, expected):
+        valid_mask = FilterPlan(PipelineExpression(**config)).evaluate()
+        assert np.array_equal(all_combinations[valid_mask], passed), config
+
+
+def test_filter_expression_matches_outer_layer_filter(expected):
+    for config, passed in zip(CONFIGS, expected):
+        stages = [
+            (prefix, config[limit_key])
+            for prefix, use_key, limit_key in (
+                ("P", "use_position_filter", "positional_second_limit"),
+                ("C", "use_criteria_filter", "criteria_second_limit"),
+            )
+            if config[use_key]
+        ]
+        # 篩選式的外層限定不能為空，只比對可以寫成篩選式的設定
+        if not stages or any(not second_limit for _, second_limit in stages):
+            continue
+        text = " & ".join(f"{prefix}:{','.join(map(str, second_limit))}" for prefix, second_limit in stages)
+        assert np.array_equal(FilterCombinationsArray(**config, filter_expression=text), passed), text
@@ -0,0 +1,45 @@
+"""CoreFunction 與 FilterResult：陣列結果與原本結果字典相容"""
+
+import numpy as np
+import pytest
+
+from core import CoreFunction, FilterResult, FormatMainOutput
+from result_store import ResultStore
+from utils import CalculatePrize, CountElement
+
+WINNING_NUMBERS = [3, 11, 20, 28, 35]
+
+
+def test_legacy_keys_match_arrays(make_settings):
+    result = CoreFunction(**make_settings(), winning_numbers=WINNING_NUMBERS)
+    passed = result.valid_combinations
+
+    assert result.valid_count == passed.shape[0] == 158129
+    assert result.filtered_count == 575757 - 158129
+    assert result.prize_info == CalculatePrize(winning_number=WINNING_NUMBERS, my_number=passed.tolist())
+    assert result["main window output lines"] == FormatMainOutput(158129, result.prize_info)
+    assert result["valid combinations"] == passed.tolist()
+    assert result["valid combinations output lines"].splitlines()[0] == ", ".join(map(str, passed[0].tolist()))
+    assert result.hot_numbers == CountElement(passed.tolist())
+    assert result["hot numbers output lines"] == "\n".join(
+        f"號碼 {k:<4}-> {v:>3} 次" for k, v in CountElement(passed.tolist()).items()
+    )
+    assert set(result) == set(FilterResult.LEGACY_KEYS)
+    with pytest.raises(KeyError):
+        result["unknown"]
+
+
+def test_result_array_is_read_only():
+    result = FilterResult(np.array([[1, 2, 3, 4, 5]], dtype=np.uint8))
+    with pytest.raises(ValueError):
+        result.valid_combinations[0, 0] = 9
+    assert FilterResult(np.zeros((0, 5), dtype=np.uint8)).hot_numbers == {}
+
+
+def test_stored_result_matches_computed(make_settings, tmp_path):
+    store = ResultStore(str(tmp_path / "store"))
+    computed = CoreFunction(**make_settings(), winning_numbers=WINNING_NUMBERS, result_store=store)
+    stored = CoreFunction(**make_settings(), winning_numbers=WINNING_NUMBERS, result_store=store)
+    assert "filter" not in stored.timings
+    assert np.array_equal(stored.valid_combinations, computed.valid_combinations)
+    assert dict(stored) == dict(computed)
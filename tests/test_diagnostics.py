@@ -0,0 +1,61 @@
+"""診斷模式：各組與外層命中數直方圖"""
+
+import numpy as np
+import pytest
+
+from core import CoreFunction, FilterCombinationsArray, FormatDiagnostics
+from filters_function import CriteriaHits, PositionHits
+from utils import AllCombinations
+
+
+def _Histograms(settings: dict, backend: str) -> dict:
+    diagnostics = {}
+    FilterCombinationsArray(**settings, backend=backend, diagnostics=diagnostics)
+    return diagnostics
+
+
+def test_histograms_match_direct_hit_counts(make_settings):
+    settings = make_settings()
+    diagnostics = _Histograms(settings, "numpy")
+    all_combinations = AllCombinations()
+
+    # 位置組的輸入為全部組合
+    outer = np.zeros(all_combinations.shape[0], dtype=int)
+    for g, (filters, inner_2lim) in enumerate(zip(settings["positional_filter_data"], settings["inner_positional_2lim"])):
+        if not inner_2lim:
+            assert diagnostics["position"]["groups"][g] is None
+            continue
+        hits = PositionHits(filters, all_combinations)
+        assert np.array_equal(diagnostics["position"]["groups"][g], np.bincount(hits, minlength=6))
+        outer += np.isin(hits, inner_2lim)
+    assert np.array_equal(diagnostics["position"]["outer"], np.bincount(outer, minlength=3))
+
+    # 號碼組的輸入為通過位置組的組合
+    passed_position = all_combinations[np.isin(outer, settings["positional_second_limit"])]
+    assert diagnostics["criteria"]["outer"].sum() == passed_position.shape[0]
+    for g, (filters, inner_2lim) in enumerate(zip(settings["criteria_filter_data"], settings["inner_criteria_2lim"])):
+        if inner_2lim:
+            hits = CriteriaHits(filters, passed_position)
+            assert np.array_equal(diagnostics["criteria"]["groups"][g], np.bincount(hits, minlength=len(filters) + 1))
+
+
+@pytest.mark.parametrize("backend", ["batched", "jit", "generate", "bitslice"])
+def test_backends_report_same_histograms(make_settings, backend):
+    settings = make_settings()
+    expected = _Histograms(settings, "numpy")
+    diagnostics = _Histograms(settings, backend)
+    for stage in ("position", "criteria"):
+        assert np.array_equal(diagnostics[stage]["outer"], expected[stage]["outer"])
+        for histogram, expected_histogram in zip(diagnostics[stage]["groups"], expected[stage]["groups"]):
+            if expected_histogram is None:
+                assert histogram is None
+            else:
+                assert np.array_equal(histogram, expected_histogram)
+
+
+def test_core_function_diagnostics_text(make_settings):
+    result = CoreFunction(**make_settings(), winning_numbers=[], diagnostics=True)
+    assert result.valid_count == 158129
+    assert result.diagnostics_text == FormatDiagnostics(result.diagnostics)
+    assert "位置組外層命中組數分布 (輸入 575757 組合)" in result.diagnostics_text
+    assert CoreFunction(**make_settings(), winning_numbers=[]).diagnostics_text == ""
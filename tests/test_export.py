@@ -0,0 +1,65 @@
+"""通過組合匯出：各格式內容、排序、去除重複與 gzip"""
+
+import gzip
+
+import numpy as np
+import pytest
+
+from export import ExportCombinations
+from utils import AllCombinations
+
+COMBINATIONS = AllCombinations()[::997][::-1].copy()
+
+
+def _Lines(path) -> list:
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as f:
+        return f.read().splitlines()
+
+
+@pytest.mark.parametrize("export_format, separator, width", [("csv", ",", None), ("tsv", "\t", None), ("ticket", " ", 2)])
+def test_formats_match_plain_text(tmp_path, export_format, separator, width):
+    path = tmp_path / "out.txt"
+    count = ExportCombinations(COMBINATIONS, str(path), export_format=export_format, chunk_rows=100)
+    lines = _Lines(path)
+    if export_format != "ticket":
+        assert lines[0] == separator.join(f"n{i}" for i in range(1, 6))
+        lines = lines[1:]
+    assert count == len(lines) == COMBINATIONS.shape[0]
+    assert lines == [
+        separator.join(f"{num:0{width}d}" if width else str(num) for num in combination)
+        for combination in COMBINATIONS.tolist()
+    ]
+
+
+def test_sort_orders(tmp_path):
+    path = tmp_path / "out.csv"
+    ExportCombinations(COMBINATIONS, str(path), sort="lex", header=False)
+    assert _Lines(path) == [",".join(map(str, c)) for c in sorted(COMBINATIONS.tolist())]
+
+    ExportCombinations(COMBINATIONS, str(path), sort="sum", header=False)
+    assert _Lines(path) == [",".join(map(str, c)) for c in sorted(COMBINATIONS.tolist(), key=lambda c: (sum(c), c))]
+
+
+def test_seen_skips_previous_exports_and_duplicates(tmp_path):
+    seen_path = str(tmp_path / "seen.npy")
+    first = COMBINATIONS[:300]
+    assert ExportCombinations(np.concatenate((first, first[:10])), str(tmp_path / "a.csv"), seen_path=seen_path) == 300
+    assert ExportCombinations(COMBINATIONS, str(tmp_path / "b.csv"), seen_path=seen_path) == COMBINATIONS.shape[0] - 300
+    assert _Lines(tmp_path / "b.csv")[1:] == [",".join(map(str, c)) for c in COMBINATIONS[300:].tolist()]
+    assert ExportCombinations(COMBINATIONS, str(tmp_path / "c.csv"), seen_path=seen_path) == 0
+
+
+def test_gzip_by_extension(tmp_path):
+    path = tmp_path / "out.csv.gz"
+    ExportCombinations(COMBINATIONS, str(path))
+    with open(path, "rb") as f:
+        assert f.read(2) == b"\x1f\x8b"
+    assert len(_Lines(path)) == COMBINATIONS.shape[0] + 1
+
+
+def test_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        ExportCombinations(COMBINATIONS, str(tmp_path / "out"), export_format="xml")
+    with pytest.raises(ValueError):
+        ExportCombinations(COMBINATIONS, str(tmp_path / "out"), sort="random")
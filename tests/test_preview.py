@@ -0,0 +1,99 @@
+"""二次限定預覽與敏感度分析：與實際執行 CoreFunction 的結果比對"""
+
+import pytest
+
+from core import CoreFunction
+from preview import LimitPreview, _WidenLimit
+from utils import ParseTextToList
+
+LIMIT_CASES = [
+    # (位置組外層, 號碼組外層, 位置組內層, 號碼組內層)
+    ("1", "1-2", ("3-5", "4-5", "", ""), ("5-7", "10-12", "", "")),
+    ("a", "a", ("3-5", "4-5", "", ""), ("5-7", "10-12", "", "")),
+    ("0-1", "2", ("4-5", "", "", ""), ("5-7", "10-12", "", "")),
+]
+
+PREVIEW_KEYS = (
+    "use_position_filter", "use_criteria_filter", "positional_second_limit", "criteria_second_limit",
+    "inner_positional_2lim", "inner_criteria_2lim",
+)
+
+
+def _PreviewArgs(settings: dict) -> dict:
+    return {key: settings[key] for key in PREVIEW_KEYS}
+
+
+def _CoreCount(settings: dict) -> int:
+    return CoreFunction(**settings, winning_numbers=[]).valid_count
+
+
+def _WithoutGroup(settings: dict, limit_text: str, stage: str, group: int) -> dict:
+    """
+    移除一組後的設定：外層限定文字以剩下的組別重新解析 ("a" 為剩下的全部組別)，
+    超過剩餘組數的數值改為剩餘組數
+    """
+    filters_key, inner_key, outer_key = {
+        "position": ("positional_filter_data", "inner_positional_2lim", "positional_second_limit"),
+        "criteria": ("criteria_filter_data", "inner_criteria_2lim", "criteria_second_limit"),
+    }[stage]
+    filters_set = settings[filters_key][:group] + settings[filters_key][group + 1:]
+    filled = [filters for filters in filters_set if filters]
+    outer_limit = sorted({min(value, len(filled)) for value in ParseTextToList(limit_text, filled)})
+    return dict(
+        settings,
+        **{
+            filters_key: filters_set,
+            inner_key: settings[inner_key][:group] + settings[inner_key][group + 1:],
+            outer_key: outer_limit,
+        }
+    )
+
+
+@pytest.mark.parametrize("limits", LIMIT_CASES)
+def test_pass_count_matches_core_function(make_settings, limits):
+    settings = make_settings(*limits)
+    preview = LimitPreview(settings["positional_filter_data"], settings["criteria_filter_data"])
+    assert preview.pass_count(**_PreviewArgs(settings)) == _CoreCount(settings)
+
+
+@pytest.mark.parametrize("limits", LIMIT_CASES)
+def test_sensitivity_matches_core_function(make_settings, limits):
+    settings = make_settings(*limits)
+    preview = LimitPreview(settings["positional_filter_data"], settings["criteria_filter_data"])
+    baseline, report = preview.sensitivity(**_PreviewArgs(settings))
+    assert baseline == _CoreCount(settings)
+    assert report
+
+    limit_texts = {"position": limits[0], "criteria": limits[1]}
+    inner_keys = {"position": "inner_positional_2lim", "criteria": "inner_criteria_2lim"}
+    for row in report:
+        stage, group = row["stage"], row["group"] - 1
+        assert row["drop_count"] == _CoreCount(_WithoutGroup(settings, limit_texts[stage], stage, group))
+
+        widened = list(settings[inner_keys[stage]])
+        widened[group] = _WidenLimit(widened[group])
+        assert row["widen_count"] == _CoreCount(dict(settings, **{inner_keys[stage]: widened}))
+
+
+def test_drop_under_all_groups_limit_is_informative(make_settings):
+    # "a" 移除一組後表示剩下的全部組別，而不是讓所有組合都無法通過
+    settings = make_settings("a", "a")
+    preview = LimitPreview(settings["positional_filter_data"], settings["criteria_filter_data"])
+    baseline, report = preview.sensitivity(**_PreviewArgs(settings))
+    assert all(row["drop_count"] >= baseline for row in report)
+    assert any(row["drop_count"] > baseline for row in report)
+
+
+def test_hits_only_for_enabled_groups_with_limits(make_settings):
+    settings = make_settings()
+    # 第一個位置組只剩 4 行，位置階段停用時不應計算 (CoreFunction 也不會執行)
+    positional_filter_data = [settings["positional_filter_data"][0][:4]] + settings["positional_filter_data"][1:]
+    settings = dict(settings, positional_filter_data=positional_filter_data, use_position_filter=False)
+    preview = LimitPreview(positional_filter_data, settings["criteria_filter_data"])
+
+    assert preview.pass_count(**_PreviewArgs(settings)) == _CoreCount(settings)
+    assert all(hits is None for hits in preview.positional._group_hits)
+    assert [hits is not None for hits in preview.criteria._group_hits] == [True, True, False, False]
+
+    with pytest.raises(IndexError):
+        preview.pass_count(**_PreviewArgs(dict(settings, use_position_filter=True)))
@@ -0,0 +1,68 @@
+"""組合評分排名：分數與前 K 名和逐組計算的結果比對"""
+
+import numpy as np
+import pytest
+
+from filters_function import CriteriaHits, PositionHits
+from ranking import ParseGroupWeights, ScoreCombinations, TopKCombinations
+from utils import AllCombinations
+
+
+def _NaiveScores(combinations: np.ndarray, settings: dict, positional_weights: list, criteria_weights: list):
+    scores = np.zeros(combinations.shape[0], dtype=np.float64)
+    for filters, weight in zip(settings["positional_filter_data"], positional_weights):
+        if filters:
+            scores += weight * PositionHits(filters, combinations)
+    for filters, weight in zip(settings["criteria_filter_data"], criteria_weights):
+        if filters:
+            scores += weight * CriteriaHits(filters, combinations)
+    return scores
+
+
+@pytest.mark.parametrize("positional_weights, criteria_weights", [
+    ([1, 1, 1, 1], [1, 1, 1, 1]),
+    ([2, -1, 1, 1], [0, 3, 1, 1]),
+    ([0.5, 1, 1, 1], [1, 1.5, 1, 1]),
+])
+def test_scores_match_group_hits(make_settings, positional_weights, criteria_weights):
+    settings = make_settings()
+    combinations = AllCombinations()[::13]
+    scores = ScoreCombinations(
+        combinations, settings["positional_filter_data"], settings["criteria_filter_data"],
+        positional_weights, criteria_weights
+    )
+    expected = _NaiveScores(combinations, settings, positional_weights, criteria_weights)
+    assert np.allclose(scores, expected)
+
+
+def test_top_k_matches_full_sort(make_settings):
+    settings = make_settings()
+    combinations = AllCombinations()[::7]
+    weights = ([2, 1, 1, 1], [1, 3, 1, 1])
+    top, top_scores = TopKCombinations(
+        combinations, 500, settings["positional_filter_data"], settings["criteria_filter_data"],
+        *weights, chunk_rows=4096
+    )
+    expected_scores = _NaiveScores(combinations, settings, *weights)
+    # 分數由高到低，同分依輸入順序
+    order = np.lexsort((np.arange(combinations.shape[0]), -expected_scores))[:500]
+    assert np.array_equal(top, combinations[order])
+    assert np.array_equal(top_scores, expected_scores[order])
+
+
+def test_top_k_larger_than_input(make_settings):
+    settings = make_settings()
+    combinations = AllCombinations()[:10]
+    top, scores = TopKCombinations(combinations, 50, settings["positional_filter_data"], settings["criteria_filter_data"])
+    assert top.shape == (10, 5)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_parse_group_weights():
+    assert ParseGroupWeights("", 3) == [1, 1, 1]
+    assert ParseGroupWeights("2", 3) == [2, 2, 2]
+    assert ParseGroupWeights("1, 0.5", 3) == [1, 0.5, 1]
+    with pytest.raises(ValueError):
+        ParseGroupWeights("1, 2, 3, 4", 3)
+    with pytest.raises(ValueError):
+        ParseGroupWeights("x", 3)
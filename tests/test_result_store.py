@@ -0,0 +1,105 @@
+"""結果快取：鍵值正規化、讀寫、目錄與寫入失敗時的處理"""
+
+import os
+
+import numpy as np
+import pytest
+
+import result_store
+from core import CoreFunction
+from result_store import ConfigurationKey, ResultStore
+from utils import AllCombinations
+
+
+def test_key_ignores_pool_order_and_duplicates(make_settings):
+    settings = make_settings()
+    shuffled = make_settings()
+    shuffled["positional_filter_data"] = [
+        [list(reversed(numbers)) + numbers[:1] for numbers in filters]
+        for filters in settings["positional_filter_data"]
+    ]
+    shuffled["criteria_filter_data"] = [
+        [(match_range, list(reversed(match_pool)) + match_pool) for match_range, match_pool in filters]
+        for filters in settings["criteria_filter_data"]
+    ]
+    assert ConfigurationKey(**shuffled) == ConfigurationKey(**settings)
+
+
+def test_key_normalizes_limits_and_skipped_groups(make_settings):
+    settings = make_settings()
+    as_ranges = dict(settings, criteria_second_limit=range(1, 3), inner_criteria_2lim=[
+        range(5, 8), [12, 11, 10, 10], [], None
+    ])
+    assert ConfigurationKey(**as_ranges) == ConfigurationKey(**settings)
+
+    # 略過的組別 (內層限定為空) 的篩選器內容不影響結果
+    changed_skipped = make_settings()
+    changed_skipped["criteria_filter_data"][2] = [((0, 1), [1, 2, 3])]
+    assert ConfigurationKey(**changed_skipped) == ConfigurationKey(**settings)
+
+    different_pool = make_settings()
+    different_pool["criteria_filter_data"][0][0] = ((0, 1), [1, 2, 3])
+    assert ConfigurationKey(**different_pool) != ConfigurationKey(**settings)
+    assert ConfigurationKey(**dict(settings, criteria_second_limit=[1])) != ConfigurationKey(**settings)
+
+
+@pytest.mark.parametrize("step", [2, 997])
+def test_round_trip(tmp_path, step):
+    # 通過組合多時存位元圖，少時存排名
+    store = ResultStore(str(tmp_path))
+    passed = AllCombinations()[::step]
+    store.put("key", passed, [1, 2, 3, 4, 5], {"total": 1})
+    stored = store.get("key")
+    assert np.array_equal(stored["valid combinations"], passed)
+    assert store.prize(stored, [5, 4, 3, 2, 1]) == {"total": 1}
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_hits_do_not_rewrite_index(tmp_path, monkeypatch):
+    store = ResultStore(str(tmp_path))
+    store.put("key", AllCombinations()[:10])
+    writes = []
+    original = store._write_index
+    monkeypatch.setattr(store, "_write_index", lambda index: (writes.append(1), original(index)))
+    for _ in range(5):
+        assert store.get("key") is not None
+    assert writes == []
+
+    monkeypatch.setattr(result_store, "_TOUCH_INTERVAL", 0.0)
+    store.get("key")
+    assert len(writes) == 1
+
+
+def test_unusable_directory_disables_store(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    store = ResultStore(str(blocker / "store"))
+    assert not store.enabled
+    store.put("key", AllCombinations()[:10])
+    assert store.get("key") is None
+    assert store.total_bytes == 0
+
+
+def test_default_directory_falls_back(tmp_path, monkeypatch):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    fallback = str(tmp_path / "fallback")
+    monkeypatch.setattr(result_store, "DEFAULT_STORE_DIR", str(blocker / "default"))
+    monkeypatch.setattr(result_store, "FALLBACK_STORE_DIRS", (str(blocker / "cache"), fallback))
+    assert ResultStore(result_store.DEFAULT_STORE_DIR).directory == fallback
+
+    # 明確指定的目錄不會改用其他目錄
+    assert ResultStore(str(blocker / "explicit")).directory is None
+
+
+def test_core_function_survives_store_write_errors(tmp_path, make_settings):
+    store = ResultStore(str(tmp_path))
+
+    def Fail(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    store.put = Fail
+    store.put_prize = Fail
+    result = CoreFunction(**make_settings(), winning_numbers=[6, 14, 24, 37, 38], result_store=store)
+    assert result.valid_count == 158129
+    assert result.prize_info is not None
@@ -0,0 +1,92 @@
+"""
+查詢服務測試：LRU 快取的單次建立與大小計算、查詢結果與 CoreFunction 一致
+"""
+
+import threading
+import time
+
+import filters_data
+import pytest
+from service import DEFAULT_REQUEST, LRUCache, QueryEngine
+
+
+def _Request(**fields) -> dict:
+    """以範例篩選器組成查詢請求 (預設設定通過 158129 組)"""
+    request = dict(DEFAULT_REQUEST)
+    request.update(
+        use_position_filter=True,
+        use_criteria_filter=True,
+        positional_second_limit="1",
+        criteria_second_limit="1-2",
+        positional_filters=[
+            filters_data.positional_filter_list_example_1,
+            filters_data.positional_filter_list_example_2,
+            "", ""
+        ],
+        criteria_filters=filters_data.criteria_filters_example,
+        inner_positional_2lim=["3-5", "4-5", "", ""],
+        inner_criteria_2lim=["5-7", "10-12", "", ""],
+    )
+    request.update(fields)
+    return request
+
+
+def test_concurrent_misses_create_once():
+    cache = LRUCache(max_bytes=100)
+    calls = []
+    start = threading.Barrier(4)
+
+    def create():
+        calls.append(1)
+        time.sleep(0.2)
+        return "value"
+
+    results = []
+
+    def worker():
+        start.wait()
+        results.append(cache.get_or_create("key", create, lambda value: 1))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 4
+
+
+def test_failed_create_is_not_cached():
+    cache = LRUCache(max_bytes=100)
+
+    def fail():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        cache.get_or_create("key", fail, lambda value: 1)
+    assert cache.get_or_create("key", lambda: "value", lambda value: 1) == "value"
+
+
+def test_resize_evicts_oldest():
+    cache = LRUCache(max_bytes=10)
+    cache.get_or_create("old", lambda: "old", lambda value: 4)
+    cache.get_or_create("new", lambda: "new", lambda value: 4)
+    cache.resize("new", 8)
+    assert len(cache) == 1
+    assert cache.current_bytes == 8
+    cache.resize("missing", 100)
+    assert cache.current_bytes == 8
+
+
+def test_engine_counts_include_group_masks():
+    engine = QueryEngine(max_cache_bytes=64 * 1024 * 1024)
+    request = _Request()
+    assert engine.count(request)["valid_count"] == 158129
+
+    (preview, _), size = next(iter(engine._previews._items.values()))
+    assert size == preview.nbytes == engine._previews.current_bytes
+    assert any(mask is not None for mask in preview.criteria._group_masks)
+
+    evaluated = engine.evaluate(_Request(inner_criteria_2lim=["5-7", "9-12", "", ""]))
+    assert evaluated["valid_count"] == engine.count(_Request(inner_criteria_2lim=["5-7", "9-12", "", ""]))["valid_count"]
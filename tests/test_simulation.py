@@ -0,0 +1,37 @@
+"""報酬模擬：結果與行程數無關、進度回報與取消"""
+
+import threading
+
+import pytest
+
+from simulation import SimulateReturns, SimulationCancelled
+from utils import AllCombinations
+
+
+def test_result_does_not_depend_on_workers():
+    tickets = AllCombinations()[:20]
+    single = SimulateReturns(tickets, paths=130, horizon=500, seed=3, workers=1)
+    pooled = SimulateReturns(tickets, paths=130, horizon=500, seed=3, workers=2)
+    for key in ("draws", "payout_mean", "tier_hits", "final_balance", "max_drawdown"):
+        assert single[key] == pooled[key]
+
+
+def test_progress_reports_each_task():
+    reports = []
+    SimulateReturns(AllCombinations()[:5], paths=130, horizon=100, workers=1,
+                    progress=lambda done, total: reports.append((done, total)))
+    assert reports == [(0, 3), (1, 3), (2, 3), (3, 3)]
+
+
+def test_cancel_stops_simulation():
+    cancel = threading.Event()
+    reports = []
+
+    def progress(done, total):
+        reports.append(done)
+        if done == 1:
+            cancel.set()
+
+    with pytest.raises(SimulationCancelled):
+        SimulateReturns(AllCombinations()[:5], paths=640, horizon=100, workers=1, progress=progress, cancel=cancel)
+    assert reports == [0, 1]
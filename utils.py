@@ -1,6 +1,57 @@
 import numpy as np
 from typing import List, Union, Optional
 from ast import literal_eval
+from functools import lru_cache
+from itertools import chain, combinations
+
+
+@lru_cache(maxsize=1)
+def AllCombinations() -> np.ndarray:
+    """
+    產生所有 C(39,5) 組合，結果會被快取且為唯讀
+    
+    Returns:
+        形狀為 (575757, 5) 的陣列，順序與 itertools.combinations 相同
+    """
+    flat = np.fromiter(
+        chain.from_iterable(combinations(range(1, 40), 5)),
+        dtype=np.uint8,
+        count=575757 * 5
+    )
+    all_combinations = flat.reshape(-1, 5)
+    all_combinations.setflags(write=False)
+    return all_combinations
+
+
+@lru_cache(maxsize=None)
+def _BinomialTable(n: int, k: int) -> np.ndarray:
+    """建立 C(a, b) 查表，a = 0~n、b = 0~k"""
+    table = np.zeros((n + 1, k + 1), dtype=np.int64)
+    table[:, 0] = 1
+    for a in range(1, n + 1):
+        table[a, 1:] = table[a - 1, 1:] + table[a - 1, :-1]
+    return table
+
+
+def CombinationRank(combinations_array: np.ndarray, n: int = 39) -> np.ndarray:
+    """
+    計算組合在字典序中的排名（與 itertools.combinations 的順序相同）
+    
+    Args:
+        combinations_array: 形狀為 (..., k) 的遞增組合陣列，號碼範圍 1~n
+        n: 號碼總數
+        
+    Returns:
+        形狀為 (...) 的 int64 排名陣列，範圍 0 ~ C(n, k) - 1
+    """
+    combinations_array = np.asarray(combinations_array)
+    k = combinations_array.shape[-1]
+    table = _BinomialTable(n, k)
+
+    # rank = C(n, k) - 1 - sum(C(n - x_i, k - i))，x_i 為第 i 個號碼 (1-based)
+    remaining = n - combinations_array.astype(np.intp)
+    sizes = np.arange(k, 0, -1)
+    return int(table[n, k]) - 1 - table[remaining, sizes].sum(axis=-1)
 
 
 def CountElement(passed_combinations: list) -> dict:
@@ -8,17 +59,29 @@ def CountElement(passed_combinations: list) -> dict:
     統計號碼出現次數並排序
     
     Args:
-        passed_combinations: 通過篩選的組合列表
+        passed_combinations: 通過篩選的組合列表或陣列
         
     Returns:
         包含號碼出現次數的字典，按次數降序排列
     """
-    if not passed_combinations:
+    if len(passed_combinations) == 0:
         return {}  # 避免空列表處理錯誤
     
     flat_list = np.ravel(passed_combinations)  # 展平成一維陣列
     count_list = np.bincount(flat_list, minlength=40)  # 忽略0，保留1~39
+    return SortElementCounts(count_list)
+
 
+def SortElementCounts(count_list: np.ndarray) -> dict:
+    """
+    將號碼出現次數陣列轉為排序後的字典
+    
+    Args:
+        count_list: 長度 40 的次數陣列，第 x 個元素為號碼 x 的出現次數
+        
+    Returns:
+        包含號碼出現次數的字典，按次數降序排列 (同次數時號碼小的在前)，不含 0 次的號碼
+    """
     # 找出非0的數字，存於大小剛好的陣列中，倒序是為了最後小的key在前面
     nonzero_key_list = np.nonzero(count_list)[0][::-1]
     values_list = count_list[nonzero_key_list]  # 將其對應值，也存於大小剛好的陣列中